@@ -0,0 +1,156 @@
+import random
+from datetime import date, timedelta
+
+
+# synthetic CampusNexus + Canvas data for the mock upstream, generated deterministically from a seed
+
+SCHOOL_STATUSES = [
+    {"Id": 1, "Code": "A", "Name": "Active"},
+    {"Id": 2, "Code": "L", "Name": "LOA"},
+    {"Id": 3, "Code": "G", "Name": "Graduate"},
+]
+CAMPUSES = ["Online", "Downtown", "Eastside"]
+PROGRAMS = ["MAT Elementary", "MAT Secondary", "MAT Special Education", "MEd Leadership"]
+AREAS_OF_STUDY = ["Mathematics", "English", "Science", "History", "Urban Residency", "Rural Pathway"]
+HOLD_NAMES = ["Academic Graduation", "Register", "Financial"]
+ACADEMIC_STATUSES = ["Good Standing", "Academic Warning", "Academic Probation"]
+FIRST_NAMES = ["Alex", "Sam", "Jordan", "Taylor", "Morgan", "Casey", "Riley", "Jamie", "Avery", "Quinn"]
+LAST_NAMES = ["Garcia", "Smith", "Nguyen", "Johnson", "Brown", "Lee", "Martinez", "Davis", "Lopez", "Wilson"]
+
+CANVAS_ACCOUNT_TERM_ID = 8
+
+
+class Dataset:
+    def __init__(
+        self,
+        number_of_students: int,
+        seed: int = 42,
+        courses_per_enrollment: int = 5,
+        attendance_per_course: int = 2,
+        today: date = None,
+    ):
+        rng = random.Random(seed)
+        today = today or date.today()
+        self.attendance_per_course = attendance_per_course
+        self.today = today
+
+        # the current term covers today, the previous one is only there so term filters have something to skip
+        self.terms = [
+            {
+                "Id": 1,
+                "Code": "PREV",
+                "StartDate": f"{today - timedelta(days=200)}T00:00:00",
+                "EndDate": f"{today - timedelta(days=100)}T00:00:00",
+            },
+            {
+                "Id": 2,
+                "Code": "CURR",
+                "StartDate": f"{today - timedelta(days=50)}T00:00:00",
+                "EndDate": f"{today + timedelta(days=50)}T00:00:00",
+            },
+        ]
+        self.current_term_id = 2
+        self.canvas_terms = [
+            {"id": 7, "sis_term_id": "PREV", "name": "Previous Term"},
+            {"id": CANVAS_ACCOUNT_TERM_ID, "sis_term_id": "CURR", "name": "Current Term"},
+        ]
+
+        self.staff = [{"Id": 500 + i, "FullName": f"Advisor {i}"} for i in range(max(10, number_of_students // 50))]
+        self.agency_branches = {100 + i: f"Agency Branch {i}" for i in range(12)}
+        self.class_section_ids = [1000 + i for i in range(max(20, number_of_students // 10))]
+
+        # the tracked cohort is `number_of_students` active/LOA students, plus as many graduates the pipeline skips
+        self.enrollment_periods = []
+        self.students = {}
+        for i in range(number_of_students * 2):
+            student_id = 10000 + i
+            if i >= number_of_students:
+                school_status = SCHOOL_STATUSES[2]
+            else:
+                school_status = SCHOOL_STATUSES[1] if rng.random() < 0.05 else SCHOOL_STATUSES[0]
+            self.students[student_id] = {
+                "studentNumber": str(900000 + i),
+                "firstName": rng.choice(FIRST_NAMES),
+                "lastName": rng.choice(LAST_NAMES),
+                "emailAddress": f"student{i}@example.edu",
+                # roughly 1 in 10 students don't have a Canvas user yet
+                "canvas_user_id": 70000 + i if rng.random() > 0.1 else None,
+                "holds": [name for name in HOLD_NAMES if rng.random() < 0.05],
+                "academic_statuses": rng.sample(ACADEMIC_STATUSES, rng.randint(1, 3)),
+                "agency_branch_ids": rng.sample(sorted(self.agency_branches), rng.randint(0, 2)),
+            }
+
+            # a few students have two enrollment periods
+            for period in range(2 if rng.random() < 0.03 else 1):
+                self.enrollment_periods.append(
+                    {
+                        "Id": 50000 + i * 2 + period,
+                        "StudentId": student_id,
+                        "SchoolStatusId": school_status["Id"],
+                        "SchoolStatus": {"Name": school_status["Name"]},
+                        "Campus": {"Name": rng.choice(CAMPUSES)},
+                        "ProgramVersionName": rng.choice(PROGRAMS),
+                        "Lda": f"{today - timedelta(days=rng.randint(0, 30))}T00:00:00",
+                        "EnrollmentDate": f"{today - timedelta(days=rng.randint(100, 700))}T00:00:00",
+                        "GraduationDate": None,
+                        "areas_of_study": rng.sample(AREAS_OF_STUDY, rng.randint(1, 3)),
+                        "advisor_staff_id": rng.choice(self.staff)["Id"],
+                    }
+                )
+
+        # courses for both terms, the graduates only have courses in the previous term
+        self.student_courses = []
+        for enrollment_period in self.enrollment_periods:
+            is_graduate = enrollment_period["SchoolStatusId"] == 3
+            for term_id in [1] if is_graduate else [1, 2]:
+                for class_section_id in rng.sample(self.class_section_ids, courses_per_enrollment):
+                    self.student_courses.append(
+                        {
+                            "Id": 200000 + len(self.student_courses),
+                            "StudentId": enrollment_period["StudentId"],
+                            "StudentEnrollmentPeriodId": enrollment_period["Id"],
+                            "ClassSectionId": class_section_id,
+                            "TermId": term_id,
+                            "Status": "C",
+                        }
+                    )
+
+        self.canvas_courses = [
+            {
+                "id": 3000 + class_section_id,
+                "name": f"Course {class_section_id}",
+                "course_code": f"EDU{class_section_id}",
+                "sis_course_id": f"AdClassSched_{class_section_id}",
+                "enrollment_term_id": CANVAS_ACCOUNT_TERM_ID,
+            }
+            for class_section_id in self.class_section_ids
+        ]
+
+        # lookups used by the request handlers
+        self.students_by_number = {
+            int(student["studentNumber"]): student_id for student_id, student in self.students.items()
+        }
+        self.enrollment_periods_by_id = {period["Id"]: period for period in self.enrollment_periods}
+        self.canvas_courses_by_sis_id = {course["sis_course_id"]: course for course in self.canvas_courses}
+        self.student_courses_by_student = {}
+        for student_course in self.student_courses:
+            self.student_courses_by_student.setdefault(student_course["StudentId"], []).append(student_course)
+
+    def attendance(self) -> list[dict]:
+        # generated on demand, storing every attendance row for 50k students isn't worth the memory
+        return [
+            {
+                "Id": student_course["Id"] * 10 + day,
+                "StudentCourseId": student_course["Id"],
+                "AttendanceDate": f"{self.today - timedelta(days=day * 3)}T00:00:00",
+                "Attended": 0 if (student_course["Id"] + day) % 7 == 0 else 60,
+                "Absent": 60 if (student_course["Id"] + day) % 7 == 0 else 0,
+                "IsExcusedAbsence": (student_course["Id"] + day) % 14 == 0,
+            }
+            for student_course in self.student_courses
+            if student_course["TermId"] == self.current_term_id
+            for day in range(self.attendance_per_course)
+        ]
+
+    def cohort_student_ids(self) -> list[int]:
+        return sorted({period["StudentId"] for period in self.enrollment_periods if period["SchoolStatusId"] != 3})
@@ -0,0 +1,129 @@
+import re
+import threading
+import time
+from collections import Counter
+
+
+# an in-memory stand-in for the SQL Server the DB stages write to, so they can be benchmarked + tested without one.
+# FakeDatabase.connect replaces pymssql.connect. It understands the statements this repo sends:
+#   MERGE INTO <table> ... USING (VALUES ...) AS SOURCE (<columns>) ON target.<key> = SOURCE.<key> AND ...
+#       [WHEN MATCHED THEN UPDATE ...] WHEN NOT MATCHED THEN INSERT ...
+#   SELECT ... FROM <table> WHERE <column> IN %s, answered with the whole stored rows
+# anything else (CREATE TABLE, DELETE, ...) is accepted + ignored. Tables are dicts keyed by the MERGE's ON columns
+
+MERGE_PATTERN = re.compile(r"MERGE\s+INTO\s+(\w+)", re.IGNORECASE)
+SOURCE_COLUMNS_PATTERN = re.compile(r"AS\s+SOURCE\s*\(([^)]*)\)", re.IGNORECASE)
+ON_COLUMNS_PATTERN = re.compile(r"target\.(\w+)\s*=\s*SOURCE\.\1", re.IGNORECASE)
+SELECT_PATTERN = re.compile(r"SELECT\s+.*?\s+FROM\s+(\w+)\s+WHERE\s+(\w+)\s+IN\s+%s", re.IGNORECASE | re.DOTALL)
+
+
+class FakeDatabaseError(Exception):
+    pass
+
+
+class FakeDatabase:
+    def __init__(self, row_latency_s: float = 0.0):
+        # table -> {key: row}
+        self.tables = {}
+        # server time per row of an executemany, so writes take time like they do against SQL Server
+        self.row_latency_s = row_latency_s
+        # executemany on these tables raises FakeDatabaseError
+        self.failing_tables = set()
+        # what was sent: rows per table across all executemany calls, + connections opened
+        self.rows_sent = Counter()
+        self.selects = Counter()
+        self.connections_opened = 0
+        self.lock = threading.Lock()
+
+    def connect(self, **database_connector) -> "FakeConnection":
+        with self.lock:
+            self.connections_opened += 1
+        return FakeConnection(self)
+
+    def get_rows(self, table: str) -> list[dict]:
+        with self.lock:
+            return [dict(row) for row in self.tables.get(table, {}).values()]
+
+    def merge(self, sql: str, rows: list[dict]) -> None:
+        table = MERGE_PATTERN.search(sql).group(1)
+        if table in self.failing_tables:
+            raise FakeDatabaseError(f"writing {table} failed")
+
+        source_columns = [column.strip() for column in SOURCE_COLUMNS_PATTERN.search(sql).group(1).split(",")]
+        key_columns = ON_COLUMNS_PATTERN.findall(sql.split("WHEN")[0])
+        updates = re.search(r"WHEN\s+MATCHED", sql, re.IGNORECASE) is not None
+
+        time.sleep(self.row_latency_s * len(rows))
+        with self.lock:
+            self.rows_sent[table] += len(rows)
+            stored = self.tables.setdefault(table, {})
+            for row in rows:
+                row = {column: row[column] for column in source_columns}
+                key = tuple(row[column] for column in key_columns)
+                if key not in stored or updates:
+                    stored[key] = row
+
+    def select(self, sql: str, params: tuple) -> list[dict]:
+        match = SELECT_PATTERN.search(sql)
+        if match is None:
+            return []
+
+        table, column = match.groups()
+        values = set(params[0])
+        with self.lock:
+            self.selects[table] += 1
+            rows = [dict(row) for row in self.tables.get(table, {}).values() if row.get(column) in values]
+        # the enrichment snapshots ask for their age, the fake's rows are always fresh
+        if "age_seconds" in sql:
+            for row in rows:
+                row["age_seconds"] = 0
+        return rows
+
+
+class FakeCursor:
+    def __init__(self, database: FakeDatabase):
+        self.database = database
+        self.results = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        pass
+
+    def execute(self, sql: str, params: tuple = None) -> None:
+        if MERGE_PATTERN.search(sql):
+            self.database.merge(sql, [params])
+        else:
+            self.results = self.database.select(sql, params)
+
+    def executemany(self, sql: str, rows: list[dict]) -> None:
+        self.database.merge(sql, list(rows))
+
+    def fetchall(self) -> list:
+        results, self.results = self.results, []
+        return results
+
+
+class FakeConnection:
+    def __init__(self, database: FakeDatabase):
+        self.database = database
+        self.closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def cursor(self, as_dict: bool = False) -> FakeCursor:
+        return FakeCursor(self.database)
+
+    def commit(self) -> None:
+        pass
+
+    def rollback(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.closed = True
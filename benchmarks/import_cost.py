@@ -0,0 +1,97 @@
+import argparse
+import json
+import re
+import subprocess
+import sys
+from pathlib import Path
+
+
+# measures what a cold start costs per function: importing function_app (what the worker pays to index the app) and
+# then the deferred imports of one function, each in a fresh interpreter so nothing is already in sys.modules
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+MARKER = "--- function imports ---"
+
+# runs in the child process. The function is invoked with an empty body: its deferred imports run first, then
+# decoding the request fails fast with a 400 and no upstream calls are made. pymssql is imported right before the
+# staging inserts, so it's not counted for the Scope2 functions
+CHILD_SCRIPT = """
+import json, sys, time
+sys.path.insert(0, {repo_root!r})
+
+start = time.perf_counter()
+import azure.functions as func
+from function_app import app
+app_import_ms = (time.perf_counter() - start) * 1000
+modules_before = set(sys.modules)
+
+functions = {{function.get_function_name(): function.get_user_function() for function in app.get_functions()}}
+print({marker!r}, file=sys.stderr, flush=True)
+
+start = time.perf_counter()
+if {function_name!r}:
+    functions[{function_name!r}](func.HttpRequest("POST", "/api/benchmark", body=b""))
+function_import_ms = (time.perf_counter() - start) * 1000
+
+print(json.dumps([app_import_ms, function_import_ms, sorted(set(sys.modules) - modules_before), sorted(functions)]))
+"""
+
+IMPORT_TIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def measure(function_name: str = None) -> dict:
+    script = CHILD_SCRIPT.format(repo_root=str(REPO_ROOT), marker=MARKER, function_name=function_name)
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", script], capture_output=True, text=True, check=True
+    )
+    app_import_ms, function_import_ms, new_modules, function_names = json.loads(result.stdout.strip().splitlines()[-1])
+
+    # the function's own imports and their direct dependencies, heaviest first (cumulative time includes everything
+    # they import)
+    heaviest = []
+    function_phase = result.stderr.split(MARKER, 1)[-1]
+    for match in IMPORT_TIME_LINE.finditer(function_phase):
+        _, cumulative_us, indent, module = match.groups()
+        if len(indent) <= 3:
+            heaviest.append((module, round(int(cumulative_us) / 1000, 1)))
+    heaviest.sort(key=lambda item: item[1], reverse=True)
+
+    return {
+        "app_import_ms": round(app_import_ms, 1),
+        "function_import_ms": round(function_import_ms, 1),
+        "new_modules": len(new_modules),
+        "heaviest_imports": dict(heaviest[:5]),
+        "function_names": function_names,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold start import cost per function")
+    parser.add_argument("--functions", nargs="*", help="function names to measure (default: all)")
+    parser.add_argument("--repeat", type=int, default=3, help="fresh interpreters per function, the median is kept")
+    parser.add_argument("--output", help="write the results as JSON")
+    args = parser.parse_args()
+
+    function_names = args.functions or measure()["function_names"]
+
+    results = {}
+    for function_name in function_names:
+        runs = sorted((measure(function_name) for _ in range(args.repeat)), key=lambda run: run["function_import_ms"])
+        result = runs[len(runs) // 2]
+        del result["function_names"]
+        results[function_name] = result
+
+    print(f"{'function':<44}{'app ms':>10}{'function ms':>14}{'modules':>10}  heaviest imports")
+    for function_name, result in results.items():
+        heaviest = ", ".join(f"{module} {ms}ms" for module, ms in result["heaviest_imports"].items())
+        print(
+            f"{function_name:<44}{result['app_import_ms']:>10}{result['function_import_ms']:>14}"
+            f"{result['new_modules']:>10}  {heaviest}"
+        )
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
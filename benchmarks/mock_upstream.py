@@ -0,0 +1,502 @@
+import argparse
+import json
+import math
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlencode, urlsplit
+
+from datasets import SCHOOL_STATUSES, Dataset
+
+
+# local stand-in for the CampusNexus OData/command endpoints and the Canvas REST endpoints the get_* modules call
+
+
+class MockConfig:
+    def __init__(
+        self,
+        students: int = 1000,
+        seed: int = 42,
+        latency_ms: float = 40.0,
+        latency_sigma: float = 0.3,
+        slow_rate: float = 0.0,
+        slow_multiplier: float = 10.0,
+        row_latency_us: float = 20.0,
+        error_rate: float = 0.0,
+        canvas_page_size: int = 100,
+        odata_page_size: int = 0,
+        canvas_rate_limit: float = 0.0,
+        anthology_rate_limit: float = 0.0,
+    ):
+        self.students = students
+        self.seed = seed
+        # per-request latency is lognormal around latency_ms, with `slow_rate` of requests `slow_multiplier` x slower
+        self.latency_ms = latency_ms
+        self.latency_sigma = latency_sigma
+        self.slow_rate = slow_rate
+        self.slow_multiplier = slow_multiplier
+        # extra server time per row returned, so institution-wide pulls cost more than targeted ones
+        self.row_latency_us = row_latency_us
+        # fraction of requests answered with a 503
+        self.error_rate = error_rate
+        # max rows per Canvas page, and per OData page (0 returns OData collections unpaged like CampusNexus does)
+        self.canvas_page_size = canvas_page_size
+        self.odata_page_size = odata_page_size
+        # requests per second before the upstream answers 429 + Retry-After (0 disables the limit)
+        self.canvas_rate_limit = canvas_rate_limit
+        self.anthology_rate_limit = anthology_rate_limit
+
+    @classmethod
+    def add_arguments(cls, parser: argparse.ArgumentParser) -> None:
+        defaults = cls()
+        for name, value in vars(defaults).items():
+            parser.add_argument(f"--{name.replace('_', '-')}", type=type(value), default=value)
+
+    @classmethod
+    def from_arguments(cls, args: argparse.Namespace) -> "MockConfig":
+        return cls(**{name: getattr(args, name) for name in vars(cls())})
+
+
+class RateLimiter:
+    def __init__(self, requests_per_second: float):
+        self.requests_per_second = requests_per_second
+        self.capacity = max(requests_per_second, 1.0)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self) -> tuple[bool, float, float]:
+        # returns (allowed, remaining, retry_after_seconds)
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.requests_per_second)
+            self.updated_at = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True, self.tokens, 0.0
+            return False, self.tokens, (1 - self.tokens) / self.requests_per_second
+
+
+class MockUpstream:
+    def __init__(self, config: MockConfig):
+        self.config = config
+        self.dataset = Dataset(config.students, seed=config.seed)
+        self.rng = random.Random(config.seed)
+        self.rng_lock = threading.Lock()
+        self.stats_lock = threading.Lock()
+        self.request_counts = {}
+        self.rate_limiters = {
+            "canvas": RateLimiter(config.canvas_rate_limit) if config.canvas_rate_limit else None,
+            "anthology": RateLimiter(config.anthology_rate_limit) if config.anthology_rate_limit else None,
+        }
+        self.routes = self.get_routes()
+
+    ####################
+    # request plumbing
+    ####################
+
+    def handle(self, method: str, raw_path: str, body: bytes) -> tuple[int, dict, object]:
+        parts = urlsplit(raw_path)
+        path = unquote(parts.path)
+        query = parse_qs(parts.query, keep_blank_values=True)
+
+        if path == "/__health":
+            return 200, {}, {"status": "ok"}
+        if path == "/__stats":
+            with self.stats_lock:
+                return 200, {}, {"requests": dict(self.request_counts)}
+
+        upstream = "canvas" if path.startswith("/api/v1/") else "anthology"
+        route_name = re.sub(r"\([^)]*\)", "()", re.sub(r"(sis_\w+_id):[^/]+", r"\1:{id}", path))
+        with self.stats_lock:
+            self.request_counts[route_name] = self.request_counts.get(route_name, 0) + 1
+
+        headers = {}
+        rate_limiter = self.rate_limiters[upstream]
+        if rate_limiter:
+            allowed, remaining, retry_after = rate_limiter.acquire()
+            headers["X-Rate-Limit-Remaining"] = f"{remaining:.1f}"
+            if not allowed:
+                headers["Retry-After"] = f"{math.ceil(retry_after)}"
+                return 429, headers, {"errors": [{"message": "Rate Limit Exceeded"}]}
+
+        with self.rng_lock:
+            latency = self.config.latency_ms * self.rng.lognormvariate(0, self.config.latency_sigma)
+            if self.rng.random() < self.config.slow_rate:
+                latency *= self.config.slow_multiplier
+            failed = self.rng.random() < self.config.error_rate
+
+        status, extra_headers, payload = self.route(method, path, query, body)
+        headers.update(extra_headers)
+
+        rows = len(payload.get("value", [])) if isinstance(payload, dict) else len(payload)
+        time.sleep((latency + rows * self.config.row_latency_us / 1000) / 1000)
+
+        if failed:
+            return 503, headers, {"errors": [{"message": "Service Unavailable"}]}
+        return status, headers, payload
+
+    def route(self, method: str, path: str, query: dict, body: bytes) -> tuple[int, dict, object]:
+        for pattern, handler in self.routes:
+            match = re.fullmatch(pattern, path)
+            if match:
+                return handler(query, body, *match.groups())
+        return 404, {}, {"errors": [{"message": "The specified resource does not exist."}]}
+
+    def get_routes(self) -> list:
+        return [
+            self.odata("/ds/campusnexus/Terms", lambda: self.dataset.terms),
+            self.odata("/ds/campusnexus/SchoolStatuses", lambda: SCHOOL_STATUSES),
+            self.odata("/ds/campusnexus/StudentEnrollmentPeriods", lambda: self.dataset.enrollment_periods),
+            self.odata("/ds/campusnexus/StudentCourses", lambda: self.dataset.student_courses),
+            self.odata("/ds/campusnexus/Staff", lambda: self.dataset.staff),
+            self.odata("/ds/campusnexus/StudentAdvisors", self.student_advisor_rows),
+            self.odata("/ds/campusnexus/StudentAgencyBranches", self.student_agency_branch_rows),
+            self.odata("/ds/campusnexus/AgencyBranches", self.agency_branch_rows),
+            self.odata("/ds/campusnexus/Attendance", self.dataset.attendance),
+            self.odata("/ds/campusnexus/ClassSections", self.class_section_rows),
+            (
+                r"/ds/campusnexus/StudentEnrollmentAreaOfStudyLists/"
+                r"CampusNexus\.GetSavedProgramVersionAreaOfStudyConfig\(studentenrollmentperiodid=(\d+)\)",
+                self.area_of_study,
+            ),
+            (
+                r"/ds/campusnexus/StudentGroupMembers/CampusNexus\.CheckStudentHoldGroup\(studentId=(\d+)\)",
+                self.holds,
+            ),
+            (
+                r"/ds/campusnexus/StudentAcademicStatusHistory/"
+                r"CampusNexus\.GetStudentAcademicStatusChangesList\(studentId\s*=\s*(\d+)\)",
+                self.academic_status,
+            ),
+            (r"/api/commands/Common/Student/get", self.student_command),
+            (r"/api/v1/accounts/1/terms", self.canvas_terms),
+            (r"/api/v1/users/sis_user_id:(\d+)", self.canvas_user),
+            (r"/api/v1/users/sis_user_id:(\d+)/enrollments", self.canvas_enrollments),
+            (r"/api/v1/accounts/11/courses/?", self.canvas_courses),
+            (r"/api/v1/accounts/11/courses/sis_course_id:([^/]+)", self.canvas_course),
+        ]
+
+    ###############
+    # Anthology
+    ###############
+
+    def odata(self, path: str, get_rows) -> tuple:
+        def handler(query: dict, body: bytes):
+            rows = get_rows()
+
+            odata_filter = first(query, "$filter")
+            if odata_filter:
+                clauses = parse_odata_filter(odata_filter)
+                rows = [row for row in rows if all(clause(row) for clause in clauses)]
+
+            expand = first(query, "$expand") or ""
+            select = [field.strip() for field in (first(query, "$select") or "").split(",") if field.strip()]
+            expanded = {name for name in re.findall(r"(\w+)(?:\([^)]*\))?", expand)}
+            if select:
+                rows = [
+                    {field: row.get(field) for field in [*select, *expanded] if field in row or field in expanded}
+                    for row in rows
+                ]
+
+            # server-driven paging, only when configured or asked for with $top
+            skip = int(first(query, "$skip") or 0)
+            top = int(first(query, "$top") or 0)
+            page_size = min(filter(None, [top, self.config.odata_page_size]), default=0)
+            payload = {"@odata.context": "$metadata", "value": rows[skip : skip + page_size] if page_size else rows}
+            if page_size and skip + page_size < len(rows) and not top:
+                next_query = {key: values[0] for key, values in query.items()}
+                next_query["$skip"] = skip + page_size
+                payload["@odata.nextLink"] = f"{self.base_url}{path}?{urlencode(next_query)}"
+            return 200, {}, payload
+
+        return re.escape(path), handler
+
+    def student_advisor_rows(self) -> list[dict]:
+        staff_names = {staff["Id"]: staff["FullName"] for staff in self.dataset.staff}
+        return [
+            {
+                "Id": period["Id"],
+                "StaffId": period["advisor_staff_id"],
+                "StudentEnrollmentPeriodId": period["Id"],
+                "AdvisorModule": "AD",
+                "Staff": {"FullName": staff_names[period["advisor_staff_id"]]},
+            }
+            for period in self.dataset.enrollment_periods
+        ]
+
+    def student_agency_branch_rows(self) -> list[dict]:
+        return [
+            {
+                "StudentId": student_id,
+                "AgencyBranchId": agency_branch_id,
+                "AgencyBranch": {"Name": self.dataset.agency_branches[agency_branch_id]},
+            }
+            for student_id, student in self.dataset.students.items()
+            for agency_branch_id in student["agency_branch_ids"]
+        ]
+
+    def agency_branch_rows(self) -> list[dict]:
+        return [{"Id": branch_id, "Name": name} for branch_id, name in self.dataset.agency_branches.items()]
+
+    def class_section_rows(self) -> list[dict]:
+        return [
+            {"Id": class_section_id, "EnrollmentStatusCreditHours": 0 if class_section_id % 25 == 0 else 3}
+            for class_section_id in self.dataset.class_section_ids
+        ]
+
+    def area_of_study(self, query: dict, body: bytes, enrollment_period_id: str):
+        period = self.dataset.enrollment_periods_by_id.get(int(enrollment_period_id))
+        if period is None:
+            return 200, {}, {"value": []}
+        return 200, {}, {"value": [{"AreaOfStudyName": name} for name in period["areas_of_study"]]}
+
+    def holds(self, query: dict, body: bytes, student_id: str):
+        student = self.dataset.students.get(int(student_id)) or {"holds": []}
+        return 200, {}, {"value": [{"Name": name} for name in student["holds"]]}
+
+    def academic_status(self, query: dict, body: bytes, student_id: str):
+        student = self.dataset.students.get(int(student_id)) or {"academic_statuses": []}
+        return 200, {}, {
+            "value": [
+                {"NewStatusName": name, "CreatedDateTime": f"2024-0{index + 1}-01T00:00:00"}
+                for index, name in reversed(list(enumerate(student["academic_statuses"])))
+            ]
+        }
+
+    def student_command(self, query: dict, body: bytes):
+        student_id = int(json.loads(body or b"{}").get("payload", {}).get("id", 0))
+        student = self.dataset.students.get(student_id)
+        if student is None:
+            return 200, {}, {"payload": {"data": None}, "hasError": True}
+        return 200, {}, {
+            "payload": {
+                "data": {
+                    "id": student_id,
+                    "studentNumber": student["studentNumber"],
+                    "firstName": student["firstName"],
+                    "lastName": student["lastName"],
+                    "emailAddress": student["emailAddress"],
+                }
+            },
+            "hasError": False,
+        }
+
+    ###############
+    # Canvas
+    ###############
+
+    def canvas_terms(self, query: dict, body: bytes):
+        rows, headers = self.canvas_page(self.dataset.canvas_terms, query, "/api/v1/accounts/1/terms")
+        return 200, headers, {"enrollment_terms": rows}
+
+    def canvas_user(self, query: dict, body: bytes, student_number: str):
+        student_id = self.dataset.students_by_number.get(int(student_number))
+        canvas_user_id = self.dataset.students[student_id]["canvas_user_id"] if student_id else None
+        if canvas_user_id is None:
+            return 404, {}, {"errors": [{"message": "The specified resource does not exist."}]}
+        return 200, {}, {"id": canvas_user_id, "sis_user_id": student_number, "name": f"User {student_number}"}
+
+    def canvas_enrollments(self, query: dict, body: bytes, student_number: str):
+        student_id = self.dataset.students_by_number.get(int(student_number))
+        if student_id is None or self.dataset.students[student_id]["canvas_user_id"] is None:
+            return 404, {}, {"errors": [{"message": "The specified resource does not exist."}]}
+
+        requested_sis_course_ids = set(query.get("sis_course_id[]", []))
+        enrollments = []
+        for student_course in self.dataset.student_courses_by_student.get(student_id, []):
+            sis_course_id = f"AdClassSched_{student_course['ClassSectionId']}"
+            if student_course["TermId"] != self.dataset.current_term_id:
+                continue
+            if requested_sis_course_ids and sis_course_id not in requested_sis_course_ids:
+                continue
+
+            current_score = (student_id * 7 + student_course["ClassSectionId"]) % 41 + 60
+            enrollments.append(
+                {
+                    "sis_course_id": sis_course_id,
+                    "sis_user_id": student_number,
+                    "grades": {
+                        "html_url": f"/courses/{3000 + student_course['ClassSectionId']}/grades/{student_id}",
+                        "current_score": current_score,
+                        "current_grade": "A" if current_score >= 90 else "B" if current_score >= 80 else "C",
+                    },
+                }
+            )
+
+        rows, headers = self.canvas_page(enrollments, query, f"/api/v1/users/sis_user_id:{student_number}/enrollments")
+        return 200, headers, rows
+
+    def canvas_courses(self, query: dict, body: bytes):
+        term_id = first(query, "enrollment_term_id")
+        courses = [
+            course
+            for course in self.dataset.canvas_courses
+            if not term_id or str(course["enrollment_term_id"]) == term_id
+        ]
+        rows, headers = self.canvas_page(courses, query, "/api/v1/accounts/11/courses")
+        return 200, headers, rows
+
+    def canvas_course(self, query: dict, body: bytes, sis_course_id: str):
+        course = self.dataset.canvas_courses_by_sis_id.get(sis_course_id)
+        if course is None:
+            return 404, {}, {"errors": [{"message": "The specified resource does not exist."}]}
+        return 200, {}, course
+
+    def canvas_page(self, rows: list, query: dict, path: str) -> tuple[list, dict]:
+        # Canvas-style pagination: page/per_page params and a Link header with current/next/first/last
+        per_page = min(int(first(query, "per_page") or 10), self.config.canvas_page_size)
+        page = int(first(query, "page") or 1)
+        last_page = max(1, math.ceil(len(rows) / per_page))
+
+        def link(page_number: int, rel: str) -> str:
+            link_query = {key: values[0] for key, values in query.items() if not key.endswith("[]")}
+            link_query.update({"page": page_number, "per_page": per_page})
+            array_params = "".join(
+                f"&{key}={value}" for key, values in query.items() if key.endswith("[]") for value in values
+            )
+            return f'<{self.base_url}{path}?{urlencode(link_query)}{array_params}>; rel="{rel}"'
+
+        links = [link(page, "current"), link(1, "first"), link(last_page, "last")]
+        if page < last_page:
+            links.insert(1, link(page + 1, "next"))
+        if page > 1:
+            links.insert(1, link(page - 1, "prev"))
+
+        return rows[(page - 1) * per_page : page * per_page], {"Link": ",".join(links)}
+
+
+def first(query: dict, key: str) -> str:
+    values = query.get(key)
+    return values[0] if values else None
+
+
+def parse_odata_filter(odata_filter: str) -> list:
+    # supports the subset the get_* modules send: `and`-joined eq/ne/ge/gt/le/lt comparisons and `in (...)` lists
+    clauses = []
+    for clause in re.split(r"\s+and\s+", unwrap(odata_filter)):
+        clause = unwrap(clause)
+        in_match = re.fullmatch(r"(\w+)\s+in\s+\((.*)\)", clause)
+        if in_match:
+            field, values = in_match.groups()
+            value_set = {parse_odata_value(value) for value in values.split(",") if value.strip()}
+            clauses.append(lambda row, field=field, value_set=value_set: row.get(field) in value_set)
+            continue
+
+        comparison_match = re.fullmatch(r"(\w+)\s+(eq|ne|ge|gt|le|lt)\s+(.+)", clause)
+        if not comparison_match:
+            raise ValueError(f"unsupported $filter clause: {clause}")
+        field, operator, value = comparison_match.groups()
+        clauses.append(
+            lambda row, field=field, operator=operator, value=parse_odata_value(value): compare(
+                row.get(field), operator, value
+            )
+        )
+
+    return clauses
+
+
+def unwrap(clause: str) -> str:
+    # strips parentheses wrapping the whole clause, eg "(StudentId in (1, 2))" -> "StudentId in (1, 2)"
+    clause = clause.strip()
+    while clause.startswith("(") and clause.endswith(")"):
+        depth = 0
+        for index, character in enumerate(clause):
+            depth += {"(": 1, ")": -1}.get(character, 0)
+            if depth == 0 and index < len(clause) - 1:
+                return clause
+        clause = clause[1:-1].strip()
+    return clause
+
+
+def parse_odata_value(value: str):
+    value = value.strip()
+    if value.startswith("'") and value.endswith("'"):
+        return value[1:-1]
+    if re.fullmatch(r"-?\d+", value):
+        return int(value)
+    return value
+
+
+def compare(row_value, operator: str, value) -> bool:
+    if operator == "eq":
+        return row_value == value
+    if operator == "ne":
+        return row_value != value
+    if row_value is None:
+        return False
+    # datetimes are compared on their ISO string prefix
+    if isinstance(value, str):
+        row_value, value = str(row_value)[: len(value.rstrip("Z"))], value.rstrip("Z")
+    return {"ge": row_value >= value, "gt": row_value > value, "le": row_value <= value, "lt": row_value < value}[
+        operator
+    ]
+
+
+def make_request_handler(upstream: MockUpstream):
+    class RequestHandler(BaseHTTPRequestHandler):
+        # keep-alive, so client connection reuse behaves like it does against the real upstreams
+        protocol_version = "HTTP/1.1"
+        # write headers + body in one segment, otherwise Nagle + delayed ACKs add ~40ms to every keep-alive request
+        wbufsize = -1
+        disable_nagle_algorithm = True
+
+        def do_GET(self):
+            self.respond("GET")
+
+        def do_POST(self):
+            self.respond("POST")
+
+        def respond(self, method: str):
+            body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+            status, headers, payload = upstream.handle(method, self.path, body)
+
+            content = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(content)))
+            for key, value in headers.items():
+                self.send_header(key, value)
+            self.end_headers()
+            self.wfile.write(content)
+
+        def log_message(self, format, *args):
+            pass
+
+    return RequestHandler
+
+
+class MockServer(ThreadingHTTPServer):
+    # the default listen backlog of 5 drops connections when a fan-out opens dozens at once
+    request_queue_size = 256
+    daemon_threads = True
+
+
+def start_server(config: MockConfig, host: str = "127.0.0.1", port: int = 0) -> tuple[MockServer, str]:
+    upstream = MockUpstream(config)
+    server = MockServer((host, port), make_request_handler(upstream))
+    upstream.base_url = f"http://{host}:{server.server_address[1]}"
+
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, upstream.base_url
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock Anthology (CampusNexus) + Canvas upstream")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    MockConfig.add_arguments(parser)
+    args = parser.parse_args()
+
+    server, base_url = start_server(MockConfig.from_arguments(args), args.host, args.port)
+    print(f"mock upstream listening on {base_url}", flush=True)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
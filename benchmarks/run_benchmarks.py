@@ -0,0 +1,352 @@
+import argparse
+import json
+import socket
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import date, timedelta
+from pathlib import Path
+
+import httpx
+
+from fake_database import FakeDatabase
+from mock_upstream import MockConfig
+
+# the function app lives in the repository root
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+
+import azure.functions as func  # noqa: E402
+from codec import encode_json  # noqa: E402
+from function_app import app  # noqa: E402
+
+
+# drives each function_app.py handler against the mock upstream, chaining each stage's output into the next like
+# the orchestrator does, and reports wall time, throughput, upstream request counts/latency and peak memory
+
+DATABASE_STAGES = {
+    "GetCanvasStudentId",
+    "GetCourseScoreGradeLink",
+    "GetAttendanceData",
+    "CalculateAndInsertMasterStudentTrackerData",
+}
+CURR_AMERICORP_AGENCY_BRANCH_IDS = [100, 101]
+PREV_AMERICORP_AGENCY_BRANCH_IDS = [102]
+# the columns a baseline comparison fails on, upstream latency comes from the mock so it's only reported
+GATED_COLUMNS = {"wall_p50_s", "throughput_rows_per_s", "upstream_requests", "peak_memory_mb"}
+
+
+def get_stages(context: dict) -> list[tuple]:
+    # (function name, request payload builder, key of the rows in the response, what to keep for later stages)
+    anthology = {"anthology_api_key": "benchmark", "anthology_base_url": context["base_url"]}
+    canvas = {"canvas_bearer_token": "benchmark", "canvas_base_url": context["base_url"]}
+    database = {"database_connector": context["database_connector"]}
+    americorp = {
+        "curr_americorp_agency_branch_ids": CURR_AMERICORP_AGENCY_BRANCH_IDS,
+        "prev_americorp_agency_branch_ids": PREV_AMERICORP_AGENCY_BRANCH_IDS,
+    }
+
+    # the course stages pass {"student_courses": [...]}, or {"students": [...], "courses": [...]} with --normalized
+    courses_key = "courses" if context["normalized"] else "student_courses"
+
+    def keep_courses(response: dict) -> None:
+        if context["normalized"]:
+            context.update(courses={"students": response["students"], "courses": response["courses"]})
+        else:
+            context.update(courses={"student_courses": response["student_courses"]})
+
+    return [
+        (
+            "GetAnthologyAndCanvasTermIds",
+            lambda: {
+                **anthology,
+                **canvas,
+                "curr_date": f"{date.today()}T00:00:00",
+                "exclude_anthology_term_ids": [],
+            },
+            None,
+            lambda response: context.update(term_id=response["anthology_term_id"][0]),
+        ),
+        (
+            "GetListOfStudents",
+            lambda: {**anthology, "school_status_codes": ["A", "L"]},
+            "students",
+            lambda response: context.update(students=response["students"]),
+        ),
+        (
+            "GetStudentNumberEmailFirstLastNames",
+            lambda: {**anthology, "students": context["students"]},
+            "students",
+            lambda response: context.update(students=response["students"], base_students=response["students"]),
+        ),
+        (
+            "GetCanvasStudentId",
+            lambda: {**canvas, **database, "students": context["students"]},
+            "students",
+            lambda response: context.update(students=response["students"]),
+        ),
+        (
+            "GetAOSResidency",
+            lambda: {**anthology, "students": context["students"]},
+            "students",
+            lambda response: context.update(students=response["students"]),
+        ),
+        (
+            "GetPrepProgram",
+            lambda: {**anthology, **americorp, "students": context["students"]},
+            "students",
+            lambda response: context.update(students=response["students"]),
+        ),
+        (
+            "GetAcademicGraduationHoldRegistrationHold",
+            lambda: {**anthology, "students": context["students"]},
+            "students",
+            lambda response: context.update(students=response["students"]),
+        ),
+        (
+            "GetAcademicStatus",
+            lambda: {**anthology, "students": context["students"]},
+            "students",
+            lambda response: context.update(students=response["students"]),
+        ),
+        (
+            # same work as the four stages above, run concurrently
+            "GetStudentEnrichment",
+            lambda: {**anthology, **americorp, "students": context["base_students"]},
+            "students",
+            None,
+        ),
+        (
+            "GetSisCourseIdsEnrollmentId",
+            lambda: {
+                **anthology,
+                "term_id": context["term_id"],
+                "students": context["students"],
+                "normalized": context["normalized"],
+            },
+            courses_key,
+            keep_courses,
+        ),
+        (
+            "GetStudentsAcademicAdvisor",
+            lambda: {**anthology, **context["courses"]},
+            courses_key,
+            keep_courses,
+        ),
+        (
+            "GetCanvasCourseName",
+            lambda: {**canvas, **context["courses"]},
+            courses_key,
+            keep_courses,
+        ),
+        (
+            "GetCourseScoreGradeLink",
+            lambda: {**canvas, **database, **context["courses"]},
+            courses_key,
+            keep_courses,
+        ),
+        (
+            "GetAttendanceData",
+            lambda: {
+                **anthology,
+                **database,
+                "thirty_days_ago_datetime": f"{date.today() - timedelta(days=30)}T00:00:00Z",
+                **context["courses"],
+            },
+            "student_attendance_data",
+            None,
+        ),
+        (
+            "CalculateAndInsertMasterStudentTrackerData",
+            lambda: {**database, **context["courses"]},
+            "master_student_tracker_data",
+            None,
+        ),
+    ]
+
+
+def invoke(function, name: str, payload: dict, track_memory: bool) -> tuple[dict, float, float]:
+    req = func.HttpRequest(
+        "POST",
+        f"/api/{name}",
+        body=encode_json(payload),
+        headers={"Content-Type": "application/json", "X-Include-Metrics": "true"},
+    )
+
+    if track_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    response = function(req)
+    elapsed = time.perf_counter() - start
+    peak_memory = tracemalloc.get_traced_memory()[1] if track_memory else 0
+    if track_memory:
+        tracemalloc.stop()
+
+    if response.status_code != 200:
+        raise RuntimeError(f"{name} returned {response.status_code}: {response.get_body().decode()[-2000:]}")
+
+    return json.loads(response.get_body()), elapsed, peak_memory
+
+
+def run(args: argparse.Namespace, base_url: str) -> dict:
+    functions = {function.get_function_name(): function.get_user_function() for function in app.get_functions()}
+    context = {
+        "base_url": base_url,
+        "database_connector": json.loads(args.database_connector) if args.database_connector else {},
+        "normalized": args.normalized,
+    }
+
+    results = {}
+    for name, build_payload, rows_key, keep in get_stages(context):
+        if name in DATABASE_STAGES and not args.database_connector:
+            print(f"skipping {name}: needs --database-connector", file=sys.stderr)
+            if name == "GetCanvasStudentId":
+                context["students"] = [{**student, "canvas_student_id": None} for student in context["students"]]
+            continue
+
+        if args.stages and name not in args.stages:
+            if keep:
+                # still run the stage once so later stages get their input
+                response, _, _ = invoke(functions[name], name, build_payload(), False)
+                keep(response)
+            continue
+
+        payload = build_payload()
+        wall_times = []
+        for _ in range(args.repeat):
+            response, elapsed, peak_memory = invoke(functions[name], name, payload, not args.no_memory)
+            wall_times.append(elapsed)
+
+        if keep:
+            keep(response)
+
+        rows = len(response[rows_key]) if rows_key else 1
+        endpoints = response.get("metrics", {}).get("endpoints", {})
+        busiest = max(endpoints.values(), key=lambda endpoint: endpoint["requests"], default=None)
+        wall_times.sort()
+        results[name] = {
+            "rows": rows,
+            "wall_p50_s": round(wall_times[len(wall_times) // 2], 3),
+            "wall_p99_s": round(wall_times[min(len(wall_times) - 1, int(len(wall_times) * 0.99))], 3),
+            "throughput_rows_per_s": round(rows / wall_times[len(wall_times) // 2], 1),
+            "upstream_requests": sum(endpoint["requests"] for endpoint in endpoints.values()),
+            "upstream_retries": sum(endpoint["retries"] for endpoint in endpoints.values()),
+            "upstream_p50_ms": busiest["latency_ms"]["p50"] if busiest else None,
+            "upstream_p99_ms": busiest["latency_ms"]["p99"] if busiest else None,
+            "peak_memory_mb": round(peak_memory / 2**20, 1),
+            "endpoints": endpoints,
+        }
+        print(f"{name}: {results[name]['wall_p50_s']}s for {rows} rows", file=sys.stderr)
+
+    return results
+
+
+def print_report(results: dict, baseline: dict = None, threshold: float = 0.1) -> list[str]:
+    columns = [
+        ("wall_p50_s", "p50 s"),
+        ("wall_p99_s", "p99 s"),
+        ("throughput_rows_per_s", "rows/s"),
+        ("upstream_requests", "requests"),
+        ("upstream_p50_ms", "up p50 ms"),
+        ("upstream_p99_ms", "up p99 ms"),
+        ("peak_memory_mb", "peak MB"),
+    ]
+    print(f"{'stage':<44}{'rows':>8}" + "".join(f"{title:>12}" for _, title in columns))
+
+    regressions = []
+    for name, result in results.items():
+        print(f"{name:<44}{result['rows']:>8}" + "".join(f"{str(result[key]):>12}" for key, _ in columns))
+
+        previous = (baseline or {}).get(name)
+        if not previous:
+            continue
+
+        deltas = []
+        for key, title in columns:
+            if not previous.get(key) or result[key] is None:
+                continue
+            change = (result[key] - previous[key]) / previous[key]
+            deltas.append(f"{title} {change:+.0%}")
+            # higher is better for throughput, lower is better for everything else
+            worse = -change if key == "throughput_rows_per_s" else change
+            if key in GATED_COLUMNS and worse > threshold:
+                regressions.append(f"{name} {title} {change:+.0%}")
+        print(f"{'':<44}{'vs baseline':>8}  " + ", ".join(deltas))
+
+    return regressions
+
+
+def start_mock_upstream(args: argparse.Namespace) -> tuple[subprocess.Popen, str]:
+    # separate process, so the upstream's own CPU + memory don't skew the handler measurements
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+
+    mock_arguments = [
+        f"--{name.replace('_', '-')}={getattr(args, name)}" for name in vars(MockConfig()) if hasattr(args, name)
+    ]
+    process = subprocess.Popen(
+        [sys.executable, str(Path(__file__).parent / "mock_upstream.py"), f"--port={port}", *mock_arguments]
+    )
+
+    base_url = f"http://127.0.0.1:{port}"
+    for _ in range(600):
+        try:
+            httpx.get(f"{base_url}/__health", timeout=1.0).raise_for_status()
+            return process, base_url
+        except httpx.HTTPError:
+            if process.poll() is not None:
+                raise RuntimeError("mock upstream exited during startup")
+            time.sleep(0.1)
+
+    process.kill()
+    raise RuntimeError("mock upstream did not start")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-stage benchmarks against the mock upstream")
+    parser.add_argument("--stages", nargs="*", help="function names to benchmark (default: all)")
+    parser.add_argument("--repeat", type=int, default=1, help="invocations per stage")
+    parser.add_argument("--database-connector", help="pymssql.connect kwargs as JSON, enables the DB stages")
+    parser.add_argument(
+        "--fake-database", action="store_true", help="run the DB stages against the in-memory fake_database.py"
+    )
+    parser.add_argument("--no-memory", action="store_true", help="skip tracemalloc (it slows the handlers down)")
+    parser.add_argument(
+        "--normalized", action="store_true", help="pass the course stages students + courses instead of student_courses"
+    )
+    parser.add_argument("--output", help="write the results as JSON")
+    parser.add_argument("--save-baseline", help="write the results as the baseline for later comparisons")
+    parser.add_argument("--baseline", help="compare against a stored baseline")
+    parser.add_argument("--regression-threshold", type=float, default=0.1)
+    MockConfig.add_arguments(parser)
+    args = parser.parse_args()
+
+    if args.fake_database:
+        import pymssql
+
+        pymssql.connect = FakeDatabase().connect
+        args.database_connector = args.database_connector or '{"server": "fake"}'
+
+    process, base_url = start_mock_upstream(args)
+    try:
+        results = run(args, base_url)
+    finally:
+        process.terminate()
+
+    baseline = json.loads(Path(args.baseline).read_text())["results"] if args.baseline else None
+    regressions = print_report(results, baseline, args.regression_threshold)
+
+    report = {"config": {key: value for key, value in vars(args).items() if key != "database_connector"}}
+    report["results"] = results
+    for path in filter(None, [args.output, args.save_baseline]):
+        Path(path).write_text(json.dumps(report, indent=2))
+
+    if regressions:
+        print("regressions: " + "; ".join(regressions), file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
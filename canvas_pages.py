@@ -0,0 +1,72 @@
+import asyncio
+import httpx
+
+from retry_policy import send_with_retries_asynchronously
+
+
+# pages of one list requested at once, Canvas throttles by request cost so this keeps a listing from draining the
+# token's quota (429s are still retried with their Retry-After)
+CANVAS_PAGE_CONCURRENCY = 4
+
+
+async def get_canvas_pages(
+    client: httpx.AsyncClient, url: str, headers: dict, params: dict = None, get_rows=None, timeout: float = 30.0
+):
+    # yields the rows of each page of a Canvas list endpoint, in page order. When the first page's Link header has a
+    # numbered rel="last", the remaining pages are fetched concurrently, otherwise rel="next" is followed one page at
+    # a time. get_rows(results) picks the rows out of endpoints that wrap them, e.g. {"enrollment_terms": [...]}
+    async def get_page(page_url: str, page_params: dict = None) -> httpx.Response:
+        return await send_with_retries_asynchronously(
+            lambda: client.get(url=page_url, headers=headers, params=page_params, timeout=timeout), page_url
+        )
+
+    response = await get_page(url, params)
+    yield get_rows(response.json()) if get_rows else response.json()
+
+    page_urls = get_remaining_page_urls(response)
+    if page_urls is not None:
+        semaphore = asyncio.Semaphore(CANVAS_PAGE_CONCURRENCY)
+
+        async def get_page_concurrently(page_url: str) -> httpx.Response:
+            async with semaphore:
+                return await get_page(page_url)
+
+        tasks = [asyncio.create_task(get_page_concurrently(page_url)) for page_url in page_urls]
+        try:
+            for task in tasks:
+                results = (await task).json()
+                yield get_rows(results) if get_rows else results
+        finally:
+            # the consumer stopped early or a page failed: the prefetched pages are cancelled + awaited, so none is
+            # left running or fails unretrieved
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        return
+
+    # the next link already carries the whole query
+    next_url = response.links.get("next", {}).get("url")
+    while next_url:
+        response = await get_page(next_url)
+        yield get_rows(response.json()) if get_rows else response.json()
+        next_url = response.links.get("next", {}).get("url")
+
+
+def get_remaining_page_urls(response: httpx.Response) -> list:
+    # the URLs of pages 2..last, or None when they can't be derived (no rel="last", or an opaque bookmark page)
+    next_link = response.links.get("next", {}).get("url")
+    if not next_link:
+        return []
+
+    last_link = response.links.get("last", {}).get("url")
+    if not last_link:
+        return None
+
+    next_url = httpx.URL(next_link)
+    try:
+        next_page = int(next_url.params.get("page"))
+        last_page = int(httpx.URL(last_link).params.get("page"))
+    except (TypeError, ValueError):
+        return None
+
+    return [str(next_url.copy_set_param("page", page)) for page in range(next_page, last_page + 1)]
@@ -0,0 +1,342 @@
+import asyncio
+import base64
+import json
+import logging
+import os
+import re
+import struct
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+
+from codec import convert, decode_msgpack, encode_msgpack
+from http_metrics import get_current_metrics
+from payloads import get_response
+
+
+# app settings. CHECKPOINT_STORE is "sql" or "file", checkpointing (and stopping at the deadline) is off when unset
+CHECKPOINT_STORE_SETTING = "CHECKPOINT_STORE"
+# the file store's directory, defaults to the temp directory
+CHECKPOINT_DIRECTORY_SETTING = "CHECKPOINT_DIRECTORY"
+# pymssql.connect kwargs as JSON for the SQL store, defaults to the request's database_connector
+CHECKPOINT_DATABASE_CONNECTOR_SETTING = "CHECKPOINT_DATABASE_CONNECTOR"
+# the host's execution timeout. HTTP triggers get 230s (the load balancer's idle timeout) whatever functionTimeout says
+FUNCTION_TIMEOUT_SECONDS_SETTING = "FUNCTION_TIMEOUT_SECONDS"
+# no new chunk is started this close to the timeout, leaving time for the chunk in flight, the inserts + the response
+DEADLINE_MARGIN_SECONDS_SETTING = "CHECKPOINT_DEADLINE_MARGIN_SECONDS"
+# checkpoints of runs nobody continued (the orchestrator gave up, or never got the token) are deleted after this long
+CHECKPOINT_TTL_HOURS_SETTING = "CHECKPOINT_TTL_HOURS"
+CHECKPOINT_TTL_HOURS = 24.0
+# how often a worker looks for expired checkpoints
+EXPIRY_INTERVAL_SECONDS = 3600.0
+
+CHECKPOINT_TABLE = "stage_checkpoints"
+
+# one row per finished chunk, created on first use
+SQL_CREATE_CHECKPOINT_TABLE = f"""
+    IF OBJECT_ID(N'{CHECKPOINT_TABLE}', N'U') IS NULL
+    CREATE TABLE {CHECKPOINT_TABLE} (
+        id BIGINT IDENTITY PRIMARY KEY,
+        run_id NVARCHAR(100) NOT NULL,
+        stage NVARCHAR(100) NOT NULL,
+        results VARBINARY(MAX) NOT NULL,
+        created_at DATETIME2 NOT NULL DEFAULT SYSUTCDATETIME(),
+        INDEX ix_{CHECKPOINT_TABLE}_run_id_stage (run_id, stage)
+    );
+"""
+
+# frames of the file store: a 4-byte length, then the msgpack encoded chunk
+FRAME_HEADER = struct.Struct(">I")
+
+# time.monotonic() of this worker's last expire_checkpoints()
+last_expired_at = None
+
+
+class FileCheckpointStore:
+    def __init__(self, directory: str):
+        self.directory = Path(directory)
+
+    def get_path(self, run_id: str, stage: str) -> Path:
+        return self.directory / f"{stage}-{re.sub(r'[^A-Za-z0-9_.-]', '_', run_id)}.checkpoint"
+
+    def load(self, run_id: str, stage: str) -> list:
+        path = self.get_path(run_id, stage)
+        if not path.exists():
+            return []
+
+        data = path.read_bytes()
+        results = []
+        offset = 0
+        while offset + FRAME_HEADER.size <= len(data):
+            (size,) = FRAME_HEADER.unpack_from(data, offset)
+            offset += FRAME_HEADER.size
+            if offset + size > len(data):
+                # a chunk the previous invocation was killed while writing, its students are fetched again
+                break
+            results.extend(decode_msgpack(data[offset : offset + size]))
+            offset += size
+        return results
+
+    def save(self, run_id: str, stage: str, results: list) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        data = encode_msgpack(results)
+        with open(self.get_path(run_id, stage), "ab") as file:
+            file.write(FRAME_HEADER.pack(len(data)) + data)
+
+    def delete(self, run_id: str, stage: str) -> None:
+        self.get_path(run_id, stage).unlink(missing_ok=True)
+
+    def expire(self, max_age_seconds: float) -> int:
+        expired = 0
+        for path in self.directory.glob("*.checkpoint"):
+            try:
+                if time.time() - path.stat().st_mtime > max_age_seconds:
+                    path.unlink()
+                    expired += 1
+            except FileNotFoundError:
+                # deleted by another worker sharing the directory
+                pass
+        return expired
+
+    def close(self) -> None:
+        pass
+
+
+class SqlCheckpointStore:
+    table_created = False
+
+    def __init__(self, database_connector: dict):
+        self.database_connector = database_connector
+        # one connection for the whole invocation, only ever used by one thread at a time
+        self.conn = None
+
+    def get_connection(self):
+        import pymssql
+
+        if self.conn is None:
+            self.conn = pymssql.connect(**self.database_connector)
+            if not SqlCheckpointStore.table_created:
+                with self.conn.cursor() as cursor:
+                    cursor.execute(SQL_CREATE_CHECKPOINT_TABLE)
+                self.conn.commit()
+                SqlCheckpointStore.table_created = True
+        return self.conn
+
+    def load(self, run_id: str, stage: str) -> list:
+        conn = self.get_connection()
+        with conn.cursor() as cursor:
+            cursor.execute(
+                f"SELECT results FROM {CHECKPOINT_TABLE} WHERE run_id = %s AND stage = %s ORDER BY id", (run_id, stage)
+            )
+            rows = cursor.fetchall()
+        return [result for (results,) in rows for result in decode_msgpack(results)]
+
+    def save(self, run_id: str, stage: str, results: list) -> None:
+        conn = self.get_connection()
+        with conn.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {CHECKPOINT_TABLE} (run_id, stage, results) VALUES (%s, %s, %s)",
+                (run_id, stage, encode_msgpack(results)),
+            )
+        conn.commit()
+
+    def delete(self, run_id: str, stage: str) -> None:
+        conn = self.get_connection()
+        with conn.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {CHECKPOINT_TABLE} WHERE run_id = %s AND stage = %s", (run_id, stage))
+        conn.commit()
+
+    def expire(self, max_age_seconds: float) -> int:
+        conn = self.get_connection()
+        with conn.cursor() as cursor:
+            cursor.execute(
+                f"DELETE FROM {CHECKPOINT_TABLE} WHERE created_at < DATEADD(SECOND, -%d, SYSUTCDATETIME())",
+                (int(max_age_seconds),),
+            )
+            expired = cursor.rowcount
+        conn.commit()
+        return expired
+
+    def close(self) -> None:
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+
+class Checkpoint:
+    def __init__(
+        self, store, run_id: str, stage: str, deadline: float, result_type: type = None, resumable: bool = True
+    ):
+        self.store = store
+        self.run_id = run_id
+        self.stage = stage
+        # whether the caller knows the run id: it passed one, or a continuation token. A generated run id is only
+        # handed out with a 202
+        self.resumable = resumable
+        # time.perf_counter() after which fan_out() starts no new chunks
+        self.deadline = deadline
+        # item id -> result, of this and the earlier invocations of the run. The stored results come back as plain
+        # msgpack maps, result_type (eg StudentRecord) turns them back into what the stage returns
+        self.completed = dict(store.load(run_id, stage))
+        if result_type is not None:
+            self.completed = {id: convert(result, result_type) for id, result in self.completed.items()}
+        self.stopped = False
+        self.lock = threading.Lock()
+        if self.completed:
+            logging.info(f"resuming {stage} run {run_id}: {len(self.completed)} items already completed")
+
+    def deadline_reached(self) -> bool:
+        if time.perf_counter() >= self.deadline:
+            self.stopped = True
+        return self.stopped
+
+    async def save(self, results: list) -> None:
+        # results: (item id, result) pairs of a finished chunk
+        if not results:
+            return
+        self.completed.update(results)
+        # pymssql + file writes block, keep them off the event loop
+        await asyncio.to_thread(self.locked_save, results)
+
+    def locked_save(self, results: list) -> None:
+        with self.lock:
+            self.store.save(self.run_id, self.stage, results)
+
+    def get_continuation(self, total: int) -> dict:
+        # the body of a response that stopped at the deadline. Calling the function again with the same payload +
+        # this token picks up where it stopped
+        token = {"run_id": self.run_id, "stage": self.stage}
+        return {
+            "continuation_token": base64.urlsafe_b64encode(json.dumps(token).encode()).decode(),
+            "completed": len(self.completed),
+            "remaining": total - len(self.completed),
+        }
+
+    def finish(self) -> None:
+        # the stage's output has been returned in full, so a rerun of the run starts over
+        with self.lock:
+            self.store.delete(self.run_id, self.stage)
+            self.store.close()
+
+    def fail(self) -> None:
+        # the invocation failed. A run the caller can retry keeps its checkpoint, the checkpoint of a generated run id
+        # can never be continued so it's deleted
+        if self.resumable:
+            logging.error(f"{self.stage} run {self.run_id} failed, calling again with its run_id resumes it")
+            return
+        try:
+            with self.lock:
+                self.store.delete(self.run_id, self.stage)
+        except Exception as err:
+            # left to expire_checkpoints(), the invocation's own error is the one to report
+            logging.warning(f"deleting the checkpoint of {self.stage} run {self.run_id} failed: {err!r}")
+
+    def close(self) -> None:
+        # called once the handler is done however the invocation ended, see checkpointed(). finish() already did
+        with self.lock:
+            self.store.close()
+
+
+class CheckpointedRun:
+    # what `with checkpointed(...) as run` hands a handler: run.checkpoint (None when checkpointing is off) for its
+    # fan-out, run.get_response() for its answer
+    def __init__(self, checkpoint: Checkpoint):
+        self.checkpoint = checkpoint
+
+    @property
+    def stopped(self) -> bool:
+        return self.checkpoint is not None and self.checkpoint.stopped
+
+    def get_response(self, payload: dict, total: int, req, errors: list = None):
+        # total: the items the fan-out was given. Out of time, a 202 with the continuation token: the caller calls
+        # again with the same payload + the token. Otherwise the stage's output, and the run's checkpoint is done with
+        if self.stopped:
+            return get_response(self.checkpoint.get_continuation(total), req, status_code=202, errors=errors)
+        if self.checkpoint is not None:
+            self.checkpoint.finish()
+        return get_response(payload, req, errors=errors)
+
+
+@contextmanager
+def checkpointed(request, result_type: type = None, database_connector: dict = None):
+    # the checkpoint lifecycle of a handler, for a request with run_id + continuation_token. A failed invocation
+    # fails its checkpoint, see Checkpoint.fail(), and the store is closed however the invocation ended
+    checkpoint = get_checkpoint(request.run_id, request.continuation_token, database_connector, result_type)
+    try:
+        yield CheckpointedRun(checkpoint)
+    except Exception:
+        if checkpoint is not None:
+            checkpoint.fail()
+        raise
+    finally:
+        if checkpoint is not None:
+            checkpoint.close()
+
+
+def get_checkpoint_store(database_connector: dict = None):
+    store_type = (os.environ.get(CHECKPOINT_STORE_SETTING) or "").lower()
+    if store_type == "file":
+        return FileCheckpointStore(os.environ.get(CHECKPOINT_DIRECTORY_SETTING) or tempfile.gettempdir())
+    if store_type == "sql":
+        connector_setting = os.environ.get(CHECKPOINT_DATABASE_CONNECTOR_SETTING)
+        database_connector = json.loads(connector_setting) if connector_setting else database_connector
+        if not database_connector:
+            raise ValueError(f"{CHECKPOINT_STORE_SETTING}=sql needs {CHECKPOINT_DATABASE_CONNECTOR_SETTING}")
+        return SqlCheckpointStore(database_connector)
+    if store_type:
+        raise ValueError(f"unknown {CHECKPOINT_STORE_SETTING}: {store_type}")
+    return None
+
+
+def get_checkpoint(
+    run_id: str = None, continuation_token: str = None, database_connector: dict = None, result_type: type = None
+) -> Checkpoint:
+    # the checkpoint of the invoked function for this run, or None when checkpointing is off. A call without a run_id
+    # or continuation token gets a new run id, so it can still stop at the deadline + be continued
+    metrics = get_current_metrics()
+    stage = metrics.function_name
+
+    store = get_checkpoint_store(database_connector)
+    if store is None:
+        if continuation_token:
+            raise ValueError(f"got a continuation_token, but {CHECKPOINT_STORE_SETTING} is not set")
+        return None
+
+    if continuation_token:
+        token = json.loads(base64.urlsafe_b64decode(continuation_token))
+        if token["stage"] != stage:
+            raise ValueError(f"continuation_token is for {token['stage']}, not {stage}")
+        run_id = token["run_id"]
+
+    expire_checkpoints(store)
+
+    timeout = float(os.environ.get(FUNCTION_TIMEOUT_SECONDS_SETTING) or 230.0)
+    margin = float(os.environ.get(DEADLINE_MARGIN_SECONDS_SETTING) or 30.0)
+    return Checkpoint(
+        store,
+        run_id or uuid.uuid4().hex,
+        stage,
+        metrics.started_at + timeout - margin,
+        result_type,
+        resumable=bool(run_id or continuation_token),
+    )
+
+
+def expire_checkpoints(store) -> None:
+    # at most once per EXPIRY_INTERVAL_SECONDS per worker. A failure only means the stale ones stay a while longer
+    global last_expired_at
+    now = time.monotonic()
+    if last_expired_at is not None and now - last_expired_at < EXPIRY_INTERVAL_SECONDS:
+        return
+    last_expired_at = now
+
+    ttl_hours = float(os.environ.get(CHECKPOINT_TTL_HOURS_SETTING) or CHECKPOINT_TTL_HOURS)
+    try:
+        expired = store.expire(ttl_hours * 3600)
+        if expired:
+            logging.info(f"deleted {expired} checkpoints older than {ttl_hours}h")
+    except Exception as err:
+        logging.warning(f"expiring checkpoints failed: {err!r}")
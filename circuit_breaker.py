@@ -0,0 +1,137 @@
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+import httpx
+
+
+# app settings, shared by the breakers of every upstream host
+FAILURE_RATE_SETTING = "CIRCUIT_BREAKER_FAILURE_RATE"
+MIN_REQUESTS_SETTING = "CIRCUIT_BREAKER_MIN_REQUESTS"
+WINDOW_SECONDS_SETTING = "CIRCUIT_BREAKER_WINDOW_SECONDS"
+OPEN_SECONDS_SETTING = "CIRCUIT_BREAKER_OPEN_SECONDS"
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    def __init__(self, host: str, retry_in: float):
+        super().__init__(f"circuit breaker for {host} is open, failing fast (next probe in {retry_in:.1f}s)")
+        self.host = host
+        self.retry_in = retry_in
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        host: str,
+        failure_rate: float = 0.5,
+        min_requests: int = 20,
+        window_seconds: float = 30.0,
+        open_seconds: float = 15.0,
+        half_open_probes: int = 3,
+    ):
+        self.host = host
+        # open once at least min_requests finished in the last window_seconds and this share of them failed
+        self.failure_rate = failure_rate
+        self.min_requests = min_requests
+        self.window_seconds = window_seconds
+        # fail fast for open_seconds, then let half_open_probes requests through to test the upstream
+        self.open_seconds = open_seconds
+        self.half_open_probes = half_open_probes
+
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.probes_in_flight = 0
+        self.probe_successes = 0
+        # (finished at, failed) of the requests in the window
+        self.outcomes = deque()
+        self.failures = 0
+        self.lock = threading.Lock()
+
+    def before_request(self) -> None:
+        # raises CircuitOpenError instead of letting the request through
+        with self.lock:
+            if self.state == OPEN:
+                retry_in = self.opened_at + self.open_seconds - time.monotonic()
+                if retry_in > 0:
+                    raise CircuitOpenError(self.host, retry_in)
+                self.set_state(HALF_OPEN)
+
+            if self.state == HALF_OPEN:
+                if self.probes_in_flight >= self.half_open_probes:
+                    raise CircuitOpenError(self.host, 0.0)
+                self.probes_in_flight += 1
+
+    def record_result(self, failed: bool) -> None:
+        with self.lock:
+            now = time.monotonic()
+
+            if self.state == HALF_OPEN:
+                self.probes_in_flight = max(0, self.probes_in_flight - 1)
+                if failed:
+                    self.open(now)
+                    return
+                self.probe_successes += 1
+                if self.probe_successes >= self.half_open_probes:
+                    self.set_state(CLOSED)
+                return
+
+            if self.state == OPEN:
+                # a request that was already in flight when the breaker opened
+                return
+
+            self.outcomes.append((now, failed))
+            self.failures += failed
+            while self.outcomes[0][0] < now - self.window_seconds:
+                self.failures -= self.outcomes.popleft()[1]
+
+            if len(self.outcomes) >= self.min_requests and self.failures / len(self.outcomes) >= self.failure_rate:
+                self.open(now)
+
+    def record_cancelled(self) -> None:
+        with self.lock:
+            if self.state == HALF_OPEN:
+                self.probes_in_flight = max(0, self.probes_in_flight - 1)
+
+    def open(self, now: float) -> None:
+        self.opened_at = now
+        self.set_state(OPEN)
+
+    def set_state(self, state: str) -> None:
+        logging.warning(f"circuit breaker for {self.host}: {self.state} -> {state}")
+        self.state = state
+        self.probes_in_flight = 0
+        self.probe_successes = 0
+        self.outcomes.clear()
+        self.failures = 0
+
+
+circuit_breakers = {}
+circuit_breakers_lock = threading.Lock()
+
+
+def get_circuit_breaker(host: str) -> CircuitBreaker:
+    # one breaker per upstream host for the whole worker, so every stage + fan-out sees the same upstream health
+    with circuit_breakers_lock:
+        if host not in circuit_breakers:
+            circuit_breakers[host] = CircuitBreaker(
+                host,
+                failure_rate=float(os.environ.get(FAILURE_RATE_SETTING, 0.5)),
+                min_requests=int(os.environ.get(MIN_REQUESTS_SETTING, 20)),
+                window_seconds=float(os.environ.get(WINDOW_SECONDS_SETTING, 30.0)),
+                open_seconds=float(os.environ.get(OPEN_SECONDS_SETTING, 15.0)),
+            )
+        return circuit_breakers[host]
+
+
+def is_upstream_failure(response: httpx.Response = None, error: Exception = None) -> bool:
+    # only failures that say something about the upstream's health. 4xx (including 429, handled by Retry-After) are
+    # answers to our request, not a sign the upstream is down
+    if error is not None:
+        return isinstance(error, httpx.TransportError)
+    return response.status_code >= 500
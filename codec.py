@@ -0,0 +1,189 @@
+import msgspec
+from typing import Any, Generic, Optional, TypeVar, Union
+
+from records import StudentCourseRecord, StudentRecord
+
+
+# the top-level request fields are typed + validated on decode, the students + courses are decoded into the records
+# of records.py
+
+# fields never written to the logs
+SECRET_FIELDS = {"anthology_api_key", "canvas_bearer_token", "database_connector"}
+
+
+class AnthologyRequest(msgspec.Struct, kw_only=True):
+    anthology_api_key: str
+    anthology_base_url: str
+
+
+class CanvasRequest(msgspec.Struct, kw_only=True):
+    canvas_bearer_token: str
+    canvas_base_url: str
+
+
+class TermIdsRequest(AnthologyRequest, kw_only=True):
+    canvas_bearer_token: str
+    canvas_base_url: str
+    curr_date: str
+    exclude_anthology_term_ids: list[int]
+
+
+class ListOfStudentsRequest(AnthologyRequest, kw_only=True):
+    school_status_codes: list[str]
+    check_student_enrollment_ids: Optional[list[int]] = None
+
+
+class StudentListRequest(AnthologyRequest, kw_only=True):
+    # the bulk lookups, a few queries for the whole list whatever its length: there's nothing to retry, skip or
+    # checkpoint per student, a failure fails the invocation
+    students: list[StudentRecord]
+
+
+class StudentsRequest(StudentListRequest, kw_only=True):
+    # the per-student lookups
+    # partial_results: return the rows that succeeded + an "errors" list instead of failing the whole batch.
+    # retry_ids: only process the rows with these ids, e.g. the retryable ids of an earlier partial response
+    partial_results: bool = False
+    retry_ids: Optional[list[Any]] = None
+    # run_id: completed rows are checkpointed under it, so a retried invocation of the run skips them.
+    # continuation_token: from a 202 response that stopped before the host timeout, see checkpoints.py
+    run_id: Optional[str] = None
+    continuation_token: Optional[str] = None
+
+
+class CanvasStudentIdRequest(CanvasRequest, kw_only=True):
+    database_connector: dict[str, Any]
+    students: list[StudentRecord]
+    partial_results: bool = False
+    retry_ids: Optional[list[Any]] = None
+
+
+class PrepProgramRequest(StudentListRequest, kw_only=True):
+    curr_americorp_agency_branch_ids: list[int]
+    prev_americorp_agency_branch_ids: list[int]
+    # look up the students' agency branches by their ids instead of downloading every student's
+    server_side_filter: bool = False
+
+
+class StudentEnrichmentRequest(PrepProgramRequest, kw_only=True):
+    # see StudentsRequest. No run_id: the enrichment snapshots already skip what an earlier run looked up
+    partial_results: bool = False
+    retry_ids: Optional[list[Any]] = None
+    # where the enrichment snapshots live, unless the ENRICHMENT_SNAPSHOT_DATABASE_CONNECTOR app setting is set
+    database_connector: Optional[dict[str, Any]] = None
+
+
+class SisCourseIdsRequest(StudentListRequest, kw_only=True):
+    term_id: int
+    # filter StudentCourses by the students' ids on the server instead of downloading the whole term
+    server_side_filter: bool = False
+    # answer with {"students": [...], "courses": [...]} instead of {"student_courses": [...]}, see normalized_payload.py
+    normalized: bool = False
+
+
+# the course stages take either student_courses, or students + courses (the normalized form of the same rows)
+
+
+class AcademicAdvisorRequest(AnthologyRequest, kw_only=True):
+    student_courses: list[StudentCourseRecord] = []
+    students: Optional[list[StudentRecord]] = None
+    courses: Optional[list[StudentCourseRecord]] = None
+
+
+class CanvasCourseNameRequest(CanvasRequest, kw_only=True):
+    student_courses: list[StudentCourseRecord] = []
+    students: Optional[list[StudentRecord]] = None
+    courses: Optional[list[StudentCourseRecord]] = None
+    partial_results: bool = False
+    retry_ids: Optional[list[Any]] = None
+
+
+class CourseScoreGradeLinkRequest(CanvasRequest, kw_only=True):
+    database_connector: dict[str, Any]
+    student_courses: list[StudentCourseRecord] = []
+    students: Optional[list[StudentRecord]] = None
+    courses: Optional[list[StudentCourseRecord]] = None
+    partial_results: bool = False
+    retry_ids: Optional[list[Any]] = None
+    run_id: Optional[str] = None
+    continuation_token: Optional[str] = None
+
+
+class AttendanceDataRequest(AnthologyRequest, kw_only=True):
+    thirty_days_ago_datetime: str
+    database_connector: dict[str, Any]
+    student_courses: list[StudentCourseRecord] = []
+    students: Optional[list[StudentRecord]] = None
+    courses: Optional[list[StudentCourseRecord]] = None
+
+
+class MasterStudentTrackerRequest(msgspec.Struct, kw_only=True):
+    database_connector: dict[str, Any]
+    student_courses: list[StudentCourseRecord] = []
+    students: Optional[list[StudentRecord]] = None
+    courses: Optional[list[StudentCourseRecord]] = None
+
+
+# the rows of the bulk Anthology pulls, decoded straight from the response body instead of through dicts. Only the
+# $select'ed fields are kept, a term's worth of rows decodes several times faster and takes under half the memory.
+# gc=False as the rows only hold scalars. Like the dicts before them they put up with odd upstream rows: every field
+# may be null or missing (a row with a null id just doesn't join), they're decoded with strict=False so numbers +
+# booleans sent as strings are converted, and a row that still doesn't fit is skipped (see odata.decode_odata_page)
+class StudentCourseRow(msgspec.Struct, gc=False):
+    Id: Optional[int] = None
+    StudentId: Optional[int] = None
+    StudentEnrollmentPeriodId: Optional[int] = None
+    ClassSectionId: Optional[int] = None
+
+
+class AttendanceRow(msgspec.Struct, gc=False):
+    AttendanceDate: Optional[str] = None
+    Attended: Union[int, float, None] = None
+    Absent: Union[int, float, None] = None
+    IsExcusedAbsence: Optional[bool] = None
+    StudentCourseId: Optional[int] = None
+
+
+RowType = TypeVar("RowType")
+
+
+class ODataPage(msgspec.Struct, Generic[RowType]):
+    value: list[RowType]
+    next_link: Optional[str] = msgspec.field(default=None, name="@odata.nextLink")
+
+
+# datetimes, dates, sets and decimals are encoded natively, anything else falls back to str
+json_encoder = msgspec.json.Encoder(enc_hook=str)
+msgpack_encoder = msgspec.msgpack.Encoder(enc_hook=str)
+msgpack_decoder = msgspec.msgpack.Decoder()
+
+# decoders are reused across invocations, one per request type + strictness
+json_decoders = {}
+
+
+def decode_json(body: bytes, request_type: type, strict: bool = True) -> msgspec.Struct:
+    # strict=False converts str -> int/float/bool where the string holds one, for the upstream rows
+    if (request_type, strict) not in json_decoders:
+        json_decoders[(request_type, strict)] = msgspec.json.Decoder(request_type, strict=strict)
+
+    return json_decoders[(request_type, strict)].decode(body)
+
+
+def decode_msgpack(body: bytes) -> dict:
+    return msgpack_decoder.decode(body)
+
+
+def convert(payload: dict, request_type: type, strict: bool = True) -> msgspec.Struct:
+    return msgspec.convert(payload, request_type, strict=strict)
+
+
+def encode_json(payload: Any) -> bytes:
+    return json_encoder.encode(payload)
+
+
+def encode_msgpack(payload: Any) -> bytes:
+    return msgpack_encoder.encode(payload)
+
+
+def loggable(request: msgspec.Struct) -> dict:
+    return {field: value for field, value in msgspec.structs.asdict(request).items() if field not in SECRET_FIELDS}
@@ -0,0 +1,220 @@
+import azure.functions as func
+import logging
+import json
+import traceback
+
+from codec import (
+    AcademicAdvisorRequest,
+    CanvasCourseNameRequest,
+    SisCourseIdsRequest,
+    StudentCourseRow,
+    loggable,
+)
+from payloads import get_request_payload, get_response
+from http_metrics import emit_metrics, start_invocation
+from payload_logging import log_payload
+from records import StudentCourseRecord, StudentRecord
+
+
+bp = func.Blueprint()
+
+# the student fields copied into each of the student's courses
+STUDENT_INFO_FIELDS = (
+    "status",
+    "anthology_student_number",
+    "first_name",
+    "last_name",
+    "sis_link",
+    "email",
+    "program",
+    "area_of_study",
+    "residency",
+    "location",
+    "prep_program",
+    "academic_graduation_hold",
+    "registration_hold",
+    "americorp_status",
+    "academic_status",
+    "canvas_student_id",
+    "last_date_of_attendance",
+    "enrollment_date",
+    "graduation_date",
+)
+
+
+###########################################################
+# Scope1 - Part4 - Get Student Courses And Enrollment Ids
+###########################################################
+
+
+@bp.function_name(name="GetSisCourseIdsEnrollmentId")
+@bp.route(route="", auth_level=func.AuthLevel.FUNCTION)
+def get_sis_course_ids_enrollment_id(req: func.HttpRequest) -> func.HttpResponse:
+    try:
+        start_invocation("GetSisCourseIdsEnrollmentId")
+        from get_students_courses import get_all_students_courses, join_students_courses_asynchronously
+        from http_client import run_async
+
+        request = get_request_payload(req, SisCourseIdsRequest)
+        anthology_api_key = request.anthology_api_key
+        ## logging.info(f"request: {json.dumps(request)}")
+        anthology_base_url = request.anthology_base_url
+        term_id = request.term_id
+        students = request.students
+        # exclude_anthology_course_codes = set(request["exclude_anthology_course_codes"])
+
+        # the students by id, the last enrollment period of a student wins
+        student_info_dict = {int(student.anthology_student_id): student for student in students}
+
+        # for student_courses that match a student in the student_info_dict, add fields
+        def join_student_course(student_course: StudentCourseRow) -> StudentCourseRecord:
+            # skip if the student_id isn't in our working list
+            student = student_info_dict.get(student_course.StudentId)
+            if student is None:
+                return None
+
+            course = StudentCourseRecord(
+                anthology_student_id=student_course.StudentId,
+                sis_course_id=f"AdClassSched_{student_course.ClassSectionId}",
+                class_section_id=student_course.ClassSectionId,
+                student_enrollment_period_id=student_course.StudentEnrollmentPeriodId,
+                anthology_student_course_id=student_course.Id,
+            )
+            # the normalized courses only reference the student, its fields are sent once in `students`
+            if not request.normalized:
+                for field in STUDENT_INFO_FIELDS:
+                    setattr(course, field, getattr(student, field))
+            return course
+
+        if request.server_side_filter:
+            # only the working list's courses are downloaded, in concurrent `StudentId in (...)` chunks
+            student_courses_data = run_async(
+                join_students_courses_asynchronously(
+                    anthology_api_key, anthology_base_url, term_id, list(student_info_dict), join_student_course
+                )
+            )
+        else:
+            # get all student courses from Anthology for the current term
+            student_courses = get_all_students_courses(anthology_api_key, anthology_base_url, term_id)
+            student_courses_data = [
+                student_course_data
+                for student_course_data in map(join_student_course, student_courses)
+                if student_course_data is not None
+            ]
+
+        log_payload("student_courses_data", student_courses_data)
+
+        if request.normalized:
+            # the students that have a course this term, in the order of their first course
+            student_ids = dict.fromkeys(course.anthology_student_id for course in student_courses_data)
+            students_data = [
+                StudentRecord(
+                    anthology_student_id=student_id,
+                    **{field: getattr(student_info_dict[student_id], field) for field in STUDENT_INFO_FIELDS},
+                )
+                for student_id in student_ids
+            ]
+            return get_response({"students": students_data, "courses": student_courses_data}, req)
+
+        return get_response({"student_courses": student_courses_data}, req)
+
+    except Exception as err:
+        logging.exception(err)
+        emit_metrics()
+        return func.HttpResponse(traceback.format_exc(), status_code=400)
+
+
+##################################################
+# Scope1 -Part5 - Get Student's Academic Advisor
+##################################################
+
+
+@bp.function_name(name="GetStudentsAcademicAdvisor")
+@bp.route(route="", auth_level=func.AuthLevel.FUNCTION)
+def get_students_academic_advisor(req: func.HttpRequest) -> func.HttpResponse:
+    try:
+        start_invocation("GetStudentsAcademicAdvisor")
+        from get_students_academic_advisor import get_advisors_info_asynchronously
+        from http_client import run_async
+        from normalized_payload import get_courses, get_courses_payload
+
+        request = get_request_payload(req, AcademicAdvisorRequest)
+        anthology_api_key = request.anthology_api_key
+        log_payload("request", loggable(request))
+        student_courses = get_courses(request)
+        anthology_base_url = request.anthology_base_url
+
+        # get the academic advisor of each enrollment period in the request
+        student_enrollment_period_ids = list({course.student_enrollment_period_id for course in student_courses})
+        advisors_dict = run_async(
+            get_advisors_info_asynchronously(anthology_api_key, anthology_base_url, student_enrollment_period_ids)
+        )
+
+        # finally, add the advisor to each course
+        for course in student_courses:
+            course.advisor_name = advisors_dict.get(course.student_enrollment_period_id, None)
+
+        return get_response(get_courses_payload(request, student_courses), req)
+
+    except Exception as err:
+        logging.exception(err)
+        emit_metrics()
+        return func.HttpResponse(traceback.format_exc(), status_code=400)
+
+
+###############################################
+# Scope1 - Part6 - Get Canvas Course Name
+###############################################
+
+
+@bp.function_name(name="GetCanvasCourseName")
+@bp.route(route="", auth_level=func.AuthLevel.FUNCTION)
+def get_canvas_course_name(req: func.HttpRequest) -> func.HttpResponse:
+    try:
+        start_invocation("GetCanvasCourseName")
+        from get_canvas_course_name import get_canvas_course_name_asynchronously
+        from http_client import run_async
+        from fan_out import filter_retry_ids
+        from normalized_payload import get_courses, get_courses_payload, get_student_lookup
+
+        request = get_request_payload(req, CanvasCourseNameRequest)
+        canvas_bearer_token = request.canvas_bearer_token
+        # logging.info(f"request: {json.dumps(request)}")
+        canvas_base_url = request.canvas_base_url
+        student_courses = filter_retry_ids(get_courses(request), "sis_course_id", request.retry_ids)
+        get_student = get_student_lookup(request)
+        errors = [] if request.partial_results else None
+
+        sis_course_id_list = list({course.sis_course_id for course in student_courses})
+        log_payload("sis_course_id_list", sis_course_id_list)
+
+        course_id_mappings = run_async(
+            get_canvas_course_name_asynchronously(
+                canvas_bearer_token, canvas_base_url, sis_course_id_list, errors=errors
+            )
+        )
+        log_payload("course_id_mappings", course_id_mappings)
+
+        # courses whose Canvas lookup failed have no mapping, their rows are left out
+        modified_student_courses_data = [
+            course for course in student_courses if course.sis_course_id in course_id_mappings
+        ]
+        for course in modified_student_courses_data:
+            course_id_mapping = course_id_mappings[course.sis_course_id]
+            canvas_student_id = get_student(course).canvas_student_id
+            course.course_name = course_id_mapping["canvas_course_name"]
+            course.canvas_course_id = course_id_mapping["canvas_course_id"]
+            # canvas_grade_link = {canvas_base_url}/courses/{canvas_course_id}/grades/{canvas_student_id}
+            course.canvas_grade_link = (
+                f'{canvas_base_url}/courses/{course_id_mapping["canvas_course_id"]}/grades/{canvas_student_id}'
+                if (course_id_mapping["canvas_course_id"] and canvas_student_id)
+                else None
+            )
+        log_payload("modified_student_courses_data", modified_student_courses_data)
+
+        return get_response(get_courses_payload(request, modified_student_courses_data), req, errors=errors)
+
+    except Exception as err:
+        logging.exception(err)
+        emit_metrics()
+        return func.HttpResponse(json.dumps(traceback.format_exc(), default=str), status_code=400)
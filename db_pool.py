@@ -0,0 +1,63 @@
+import contextlib
+import json
+import logging
+import threading
+import time
+
+
+# worker-level pymssql connections, one idle list per database_connector, reused across invocations + by the staging
+# writer's table threads so each load doesn't start with a new login
+MAX_IDLE_CONNECTIONS = 8
+# below the ~4 minute idle timeout of the Azure load balancers, as for the HTTP pools
+IDLE_EXPIRY_SECONDS = 60.0
+
+idle_connections = {}
+idle_connections_lock = threading.Lock()
+
+
+def get_pool_key(database_connector: dict) -> str:
+    return json.dumps(database_connector, sort_keys=True, default=str)
+
+
+@contextlib.contextmanager
+def get_connection(database_connector: dict):
+    # a connection for one thread at a time. It goes back to the pool when the block succeeds, after a failure it's
+    # closed as it may be left mid-transaction
+    import pymssql
+
+    key = get_pool_key(database_connector)
+    conn = take_idle_connection(key) or pymssql.connect(**database_connector)
+    try:
+        yield conn
+    except BaseException:
+        close_connection(conn)
+        raise
+    return_connection(key, conn)
+
+
+def take_idle_connection(key: str):
+    now = time.monotonic()
+    with idle_connections_lock:
+        connections = idle_connections.get(key, [])
+        while connections:
+            conn, returned_at = connections.pop()
+            if now - returned_at < IDLE_EXPIRY_SECONDS:
+                return conn
+            close_connection(conn)
+    return None
+
+
+def return_connection(key: str, conn) -> None:
+    with idle_connections_lock:
+        connections = idle_connections.setdefault(key, [])
+        if len(connections) < MAX_IDLE_CONNECTIONS:
+            connections.append((conn, time.monotonic()))
+            return
+    close_connection(conn)
+
+
+def close_connection(conn) -> None:
+    try:
+        conn.close()
+    except Exception as err:
+        logging.warning(f"closing a database connection failed: {err}")
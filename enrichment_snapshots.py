@@ -0,0 +1,186 @@
+import hashlib
+import json
+import logging
+import os
+
+from records import UNSET, StudentRecord
+
+
+# app settings. Snapshots are used when a database connector is set here or passed in the request, and skipped
+# otherwise
+SNAPSHOT_DATABASE_CONNECTOR_SETTING = "ENRICHMENT_SNAPSHOT_DATABASE_CONNECTOR"
+# per-group overrides of SNAPSHOT_TTL_HOURS, e.g. "holds=12,academic_status=12"
+SNAPSHOT_TTL_HOURS_SETTING = "ENRICHMENT_SNAPSHOT_TTL_HOURS"
+
+# how long each lookup's answer is trusted. Names + AOS rarely change, holds + academic status can change any day
+SNAPSHOT_TTL_HOURS = {
+    "student_data": 168.0,
+    "aos_residency": 168.0,
+    "holds": 24.0,
+    "academic_status": 24.0,
+}
+# looked up per enrollment period, the other groups per student
+ENROLLMENT_GROUPS = {"aos_residency"}
+
+# the StudentEnrollmentPeriods columns (as GetListOfStudents names them) a change to which refetches everything for
+# the student. last_date_of_attendance moves with every class attended, so it's left out
+ENROLLMENT_FINGERPRINT_FIELDS = ("status", "program", "location", "enrollment_date", "graduation_date")
+
+SNAPSHOT_TABLE = "student_enrichment_snapshot"
+
+# one row per enrollment period and lookup, created on first use
+SQL_CREATE_SNAPSHOT_TABLE = f"""
+    IF OBJECT_ID(N'{SNAPSHOT_TABLE}', N'U') IS NULL
+    CREATE TABLE {SNAPSHOT_TABLE} (
+        anthology_student_id INT NOT NULL,
+        student_enrollment_period_id INT NOT NULL,
+        attribute_group NVARCHAR(50) NOT NULL,
+        attributes NVARCHAR(MAX) NOT NULL,
+        enrollment_fingerprint CHAR(64) NOT NULL,
+        fetched_at DATETIME2 NOT NULL,
+        PRIMARY KEY (anthology_student_id, student_enrollment_period_id, attribute_group)
+    );
+"""
+
+sql_statement_merge_snapshot = f"""
+    MERGE INTO {SNAPSHOT_TABLE} AS target
+    USING (VALUES (%(anthology_student_id)d, %(student_enrollment_period_id)d, %(attribute_group)s, %(attributes)s, %(enrollment_fingerprint)s)) AS SOURCE (anthology_student_id, student_enrollment_period_id, attribute_group, attributes, enrollment_fingerprint)
+    ON
+        target.anthology_student_id = SOURCE.anthology_student_id AND
+        target.student_enrollment_period_id = SOURCE.student_enrollment_period_id AND
+        target.attribute_group = SOURCE.attribute_group
+    WHEN MATCHED THEN
+        UPDATE SET
+            target.attributes = SOURCE.attributes,
+            target.enrollment_fingerprint = SOURCE.enrollment_fingerprint,
+            target.fetched_at = SYSUTCDATETIME()
+    WHEN NOT MATCHED THEN
+        INSERT (anthology_student_id, student_enrollment_period_id, attribute_group, attributes, enrollment_fingerprint, fetched_at)
+        VALUES (SOURCE.anthology_student_id, SOURCE.student_enrollment_period_id, SOURCE.attribute_group, SOURCE.attributes, SOURCE.enrollment_fingerprint, SYSUTCDATETIME());
+"""
+
+table_created = False
+
+
+def get_snapshot_database_connector(database_connector: dict = None) -> dict:
+    connector_setting = os.environ.get(SNAPSHOT_DATABASE_CONNECTOR_SETTING)
+    return json.loads(connector_setting) if connector_setting else database_connector
+
+
+def get_ttl_hours() -> dict:
+    ttl_hours = dict(SNAPSHOT_TTL_HOURS)
+    for override in filter(None, os.environ.get(SNAPSHOT_TTL_HOURS_SETTING, "").split(",")):
+        group, hours = override.split("=")
+        ttl_hours[group.strip()] = float(hours)
+    return ttl_hours
+
+
+def get_enrollment_fingerprint(student: StudentRecord) -> str:
+    # an unset field hashes like None, as a missing key did before the records
+    values = [getattr(student, field) for field in ENROLLMENT_FINGERPRINT_FIELDS]
+    values = [str(None if value is UNSET else value) for value in values]
+    return hashlib.sha256("\x1f".join(values).encode()).hexdigest()
+
+
+def get_snapshot_key(student: StudentRecord, group: str) -> int:
+    return student.student_enrollment_period_id if group in ENROLLMENT_GROUPS else student.anthology_student_id
+
+
+def load_snapshots(students: list[StudentRecord], database_connector: dict) -> dict:
+    # (anthology_student_id, student_enrollment_period_id, attribute_group) -> snapshot row, age included
+    global table_created
+    student_ids = tuple({student.anthology_student_id for student in students})
+    if not student_ids:
+        return {}
+
+    import pymssql
+
+    with pymssql.connect(**database_connector) as conn:
+        with conn.cursor(as_dict=True) as cursor:
+            if not table_created:
+                cursor.execute(SQL_CREATE_SNAPSHOT_TABLE)
+                conn.commit()
+                table_created = True
+
+            cursor.execute(
+                f"""
+                SELECT anthology_student_id, student_enrollment_period_id, attribute_group, attributes,
+                    enrollment_fingerprint, DATEDIFF(SECOND, fetched_at, SYSUTCDATETIME()) AS age_seconds
+                FROM {SNAPSHOT_TABLE} WHERE anthology_student_id IN %s
+                """,
+                (student_ids,),
+            )
+            results = cursor.fetchall()
+
+    return {
+        (row["anthology_student_id"], row["student_enrollment_period_id"], row["attribute_group"]): row
+        for row in results
+    }
+
+
+def get_fresh_attributes(students: list[StudentRecord], snapshots: dict) -> dict:
+    # attribute_group -> {student or enrollment id: attributes} of the snapshots that can be used as they are. Anything
+    # else (new students + enrollments, changed enrollments, expired lookups) has to be fetched again
+    ttl_hours = get_ttl_hours()
+    fresh_attributes = {group: {} for group in SNAPSHOT_TTL_HOURS}
+    stale_keys = {group: set() for group in SNAPSHOT_TTL_HOURS}
+
+    for student in students:
+        student_id = student.anthology_student_id
+        enrollment_id = student.student_enrollment_period_id
+        fingerprint = get_enrollment_fingerprint(student)
+
+        for group in SNAPSHOT_TTL_HOURS:
+            snapshot = snapshots.get((student_id, enrollment_id, group))
+            key = get_snapshot_key(student, group)
+            if (
+                snapshot is None
+                or snapshot["enrollment_fingerprint"] != fingerprint
+                or snapshot["age_seconds"] > ttl_hours[group] * 3600
+            ):
+                stale_keys[group].add(key)
+            else:
+                fresh_attributes[group][key] = json.loads(snapshot["attributes"])
+
+    # a student-level lookup is only skipped when it's fresh for every one of the student's enrollment periods
+    for group, keys in stale_keys.items():
+        for key in keys:
+            fresh_attributes[group].pop(key, None)
+
+    logging.info(
+        "enrichment snapshots, fresh: "
+        + ", ".join(f"{group} {len(attributes)}" for group, attributes in fresh_attributes.items())
+    )
+    return fresh_attributes
+
+
+def save_snapshots(snapshot_rows: list[dict], database_connector: dict) -> None:
+    if not snapshot_rows:
+        return
+
+    import pymssql
+
+    with pymssql.connect(**database_connector) as conn:
+        with conn.cursor(as_dict=True) as cursor:
+            cursor.executemany(sql_statement_merge_snapshot, snapshot_rows)
+            conn.commit()
+
+
+def get_snapshot_rows(students: list[StudentRecord], group: str, fetched_attributes: dict) -> list[dict]:
+    # the rows to upsert for one lookup's freshly fetched attributes, keyed like get_fresh_attributes()
+    snapshot_rows = []
+    for student in students:
+        key = get_snapshot_key(student, group)
+        if key not in fetched_attributes:
+            continue
+
+        snapshot_rows.append(
+            {
+                "anthology_student_id": student.anthology_student_id,
+                "student_enrollment_period_id": student.student_enrollment_period_id,
+                "attribute_group": group,
+                "attributes": json.dumps(fetched_attributes[key], default=str),
+                "enrollment_fingerprint": get_enrollment_fingerprint(student),
+            }
+        )
+    return snapshot_rows
@@ -0,0 +1,97 @@
+import asyncio
+import httpx
+import logging
+
+from checkpoints import Checkpoint
+from circuit_breaker import CircuitOpenError
+from retry_policy import get_retry_reason
+
+
+# chunk size of the per-row fan-outs, keeps at most this many requests per stage in flight
+CHUNK_SIZE = 10
+
+
+async def fan_out(
+    fetch,
+    items: list,
+    get_id,
+    errors: list = None,
+    chunk_size: int = CHUNK_SIZE,
+    checkpoint: Checkpoint = None,
+    on_results=None,
+    get_checkpoint_id=None,
+) -> list:
+    # runs fetch(item) over the items, chunk_size at a time. Without an errors list the first failure is raised, like
+    # a plain asyncio.gather. With one, failed items are left out of the results and reported in errors instead.
+    # on_results(results) is handed each chunk's results as it finishes, eg to write them while the next is fetched.
+    # get_id(item) is the id errors report, get_checkpoint_id(item) the one results are checkpointed under when that
+    # isn't unique per item, eg the enrollment period of a student with several
+    get_checkpoint_id = get_checkpoint_id or get_id
+    if checkpoint is not None:
+        # items completed by an earlier invocation of the run aren't fetched again
+        items_to_fetch = [item for item in items if get_checkpoint_id(item) not in checkpoint.completed]
+    else:
+        items_to_fetch = items
+
+    results = []
+    for i in range(0, len(items_to_fetch), chunk_size):
+        # close to the host timeout, stop launching chunks so the finished ones can still be returned
+        if checkpoint is not None and checkpoint.deadline_reached():
+            logging.warning(f"stopping at the deadline with {len(items_to_fetch) - i} items left")
+            break
+
+        chunk = items_to_fetch[i : i + chunk_size]
+        chunk_results = await asyncio.gather(*[fetch(item) for item in chunk], return_exceptions=errors is not None)
+
+        completed = []
+        for item, result in zip(chunk, chunk_results):
+            if isinstance(result, BaseException):
+                errors.append(get_error(get_id(item), result))
+            else:
+                results.append(result)
+                completed.append((get_checkpoint_id(item), result))
+
+        if on_results is not None:
+            on_results([result for _, result in completed])
+
+        if checkpoint is not None:
+            await checkpoint.save(completed)
+
+    if checkpoint is not None:
+        # in input order, including the results of the earlier invocations
+        return [
+            checkpoint.completed[get_checkpoint_id(item)]
+            for item in items
+            if get_checkpoint_id(item) in checkpoint.completed
+        ]
+    return results
+
+
+def get_error(id, err: BaseException) -> dict:
+    # one entry of a stage's `errors` list, the ids can be passed back as `retry_ids`
+    response = err.response if isinstance(err, httpx.HTTPStatusError) else None
+    if response is not None:
+        retry_reason = get_retry_reason(response=response)
+    else:
+        retry_reason = get_retry_reason(error=err)
+
+    return {
+        "id": id,
+        "error": type(err).__name__,
+        "message": str(err)[:500],
+        "status_code": response.status_code if response is not None else None,
+        # worth another call later: the upstream hiccuped, was throttling or its breaker was open, rather than
+        # rejecting this row
+        "retryable": retry_reason is not None or isinstance(err, CircuitOpenError),
+    }
+
+
+def filter_retry_ids(records: list, id_field: str, retry_ids: list, get_record=None) -> list:
+    # the records to (re)process on a call with retry_ids, all of them otherwise. get_record(record) -> the record
+    # holding id_field when it isn't the record itself, eg the student of a normalized course
+    if retry_ids is None:
+        return records
+
+    retry_ids = set(retry_ids)
+    get_record = get_record or (lambda record: record)
+    return [record for record in records if getattr(get_record(record), id_field) in retry_ids]
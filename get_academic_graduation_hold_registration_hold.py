@@ -1,50 +1,48 @@
 import httpx
-import asyncio
 import logging
-import json
 
+from checkpoints import Checkpoint
+from fan_out import fan_out
+from http_client import get_async_client
+from records import StudentRecord
+from retry_policy import send_with_retries_asynchronously
+from payload_logging import log_payload
 
-async def get_graduation_hold_registration_hold_asynchronously(
-    anthology_api_key: str, anthology_base_url: str, students: list[dict]
-) -> list[dict]:
-    size_per_chunk = 10
-    number_of_chunks = len(students) // size_per_chunk + 1
-
-    modified_students = []
-    async with httpx.AsyncClient() as client:
-        for i in range(number_of_chunks):
-            tasks = [
-                get_graduation_and_registration_holds_from_api(anthology_api_key, anthology_base_url, student, client)
-                for student in students[i * size_per_chunk : (i + 1) * size_per_chunk]
-            ]
-
-            res = await asyncio.gather(*tasks)
-            modified_students.extend(res)
 
-    return modified_students
+async def get_graduation_hold_registration_hold_asynchronously(
+    anthology_api_key: str,
+    anthology_base_url: str,
+    students: list[StudentRecord],
+    client: httpx.AsyncClient = None,
+    errors: list = None,
+    checkpoint: Checkpoint = None,
+) -> list[StudentRecord]:
+    # callers running several stages at once pass in a shared client, otherwise use the pooled one
+    client = client or get_async_client(anthology_base_url)
+
+    # with an errors list, failed students are reported there instead of failing the stage
+    return await fan_out(
+        lambda student: get_graduation_and_registration_holds_from_api(
+            anthology_api_key, anthology_base_url, student, client
+        ),
+        students,
+        lambda student: student.anthology_student_id,
+        errors,
+        checkpoint=checkpoint,
+        # a student has a row per enrollment period, each checkpointed on its own
+        get_checkpoint_id=lambda student: student.student_enrollment_period_id,
+    )
 
 
 async def get_graduation_and_registration_holds_from_api(
-    anthology_api_key: str, anthology_base_url: str, student: dict, client: httpx.AsyncClient
-) -> dict:
-    max_retries = 3
-    base_delay = 2
-
-    url = f"{anthology_base_url}/ds/campusnexus/StudentGroupMembers/CampusNexus.CheckStudentHoldGroup(studentId={student['anthology_student_id']})"
+    anthology_api_key: str, anthology_base_url: str, student: StudentRecord, client: httpx.AsyncClient
+) -> StudentRecord:
+    url = f"{anthology_base_url}/ds/campusnexus/StudentGroupMembers/CampusNexus.CheckStudentHoldGroup(studentId={student.anthology_student_id})"
     headers = {"ApiKey": anthology_api_key}
 
-    for attempt in range(max_retries + 1):
-        try:
-            response = await client.get(url=url, headers=headers, timeout=15.0)
-            response.raise_for_status()
-            results = response.json()
-            logging.info(f"{json.dumps(results)}")
-            break
-        except Exception as err:
-            logging.exception(err)
-            if attempt >= max_retries:
-                response.raise_for_status()
-            await asyncio.sleep(base_delay * 2**max_retries)
+    response = await send_with_retries_asynchronously(lambda: client.get(url=url, headers=headers, timeout=15.0), url)
+    results = response.json()
+    log_payload(f"holds for {student.anthology_student_id}", results, level=logging.DEBUG)
 
     # API returned details of all existing holds
     list_of_holds = results.get("value", [])
@@ -53,10 +51,7 @@ async def get_graduation_and_registration_holds_from_api(
     academic_graduation_hold = True if "Academic Graduation" in existing_holds else False
     registration_hold = True if "Register" in existing_holds else False
 
-    modified_student = {
-        **student,
-        "academic_graduation_hold": academic_graduation_hold,
-        "registration_hold": registration_hold,
-    }
+    student.academic_graduation_hold = academic_graduation_hold
+    student.registration_hold = registration_hold
 
-    return modified_student
+    return student
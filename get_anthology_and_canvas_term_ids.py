@@ -1,66 +1,105 @@
-import httpx
+import asyncio
+import bisect
 import json
 import logging
+import time
+from datetime import datetime
 
+from canvas_pages import get_canvas_pages
+from http_client import get_async_client
+from retry_policy import send_with_retries_asynchronously
+from payload_logging import log_payload
 
-def get_anthology_term_info(
+
+# terms only change around their start + end dates, so the index is rebuilt at the next one, or after this long in
+# case a term is added or edited in between
+TERM_INDEX_MAX_AGE_SECONDS = 24 * 3600
+
+# (anthology_base_url, canvas_base_url) -> TermIndex
+term_indexes = {}
+
+
+class TermIndex:
+    def __init__(self, anthology_terms: list[dict], canvas_terms: list[dict]):
+        # Anthology terms sorted by start date, so the terms containing a date are found with a bisect
+        self.anthology_terms = sorted(anthology_terms, key=lambda term: term["StartDate"])
+        self.start_dates = [term["StartDate"] for term in self.anthology_terms]
+        self.canvas_terms = canvas_terms
+
+        # the first start or end date still ahead, in the ISO format the dates are compared in
+        now = datetime.now().strftime("%Y-%m-%dT%H:%M:%S")
+        boundaries = [date for term in anthology_terms for date in (term["StartDate"], term["EndDate"]) if date > now]
+        self.next_boundary = min(boundaries, default=None)
+        self.expires_at = time.monotonic() + TERM_INDEX_MAX_AGE_SECONDS
+
+    def is_current(self) -> bool:
+        if time.monotonic() >= self.expires_at:
+            return False
+        return self.next_boundary is None or datetime.now().strftime("%Y-%m-%dT%H:%M:%S") < self.next_boundary
+
+    def get_term_ids(self, curr_date: str, exclude_anthology_term_ids: list) -> tuple[list, list]:
+        # every term that started by curr_date, then only the ones that haven't ended yet
+        anthology_term_id = []
+        anthology_term_code = set()
+        for term in self.anthology_terms[: bisect.bisect_right(self.start_dates, curr_date)]:
+            if curr_date <= term["EndDate"] and term["Id"] not in exclude_anthology_term_ids:
+                anthology_term_id.append(term["Id"])
+                anthology_term_code.add(term["Code"])
+        logging.info(f"anthology_term_id: {json.dumps(anthology_term_id, default=str)}")
+        logging.info(f"anthology_term_code: {json.dumps(anthology_term_code, default=str)}")
+
+        canvas_term_id = [term["id"] for term in self.canvas_terms if term["sis_term_id"] in anthology_term_code]
+        logging.info(f"canvas_term_id: {json.dumps(canvas_term_id)}")
+
+        return anthology_term_id, canvas_term_id
+
+
+async def get_term_ids_asynchronously(
     anthology_api_key: str,
     anthology_base_url: str,
+    canvas_bearer_token: str,
+    canvas_base_url: str,
     curr_date: str,
     exclude_anthology_term_ids: list,
 ) -> tuple[list, list]:
+    term_index = term_indexes.get((anthology_base_url, canvas_base_url))
+    if term_index is None or not term_index.is_current():
+        # the two term lists don't depend on each other, only the matching does
+        anthology_terms, canvas_terms = await asyncio.gather(
+            get_anthology_terms(anthology_api_key, anthology_base_url),
+            get_canvas_terms(canvas_bearer_token, canvas_base_url),
+        )
+        term_index = TermIndex(anthology_terms, canvas_terms)
+        term_indexes[(anthology_base_url, canvas_base_url)] = term_index
+    else:
+        logging.info(f"term index cached until {term_index.next_boundary}")
+
+    return term_index.get_term_ids(curr_date, exclude_anthology_term_ids)
+
+
+async def get_anthology_terms(anthology_api_key: str, anthology_base_url: str) -> list[dict]:
     url = f"{anthology_base_url}/ds/campusnexus/Terms?$select=Id,Code,StartDate,EndDate"
     headers = {"ApiKey": anthology_api_key}
 
-    transport = httpx.HTTPTransport(retries=3)
-    with httpx.Client(transport=transport) as client:
-        response = client.get(url=url, headers=headers, timeout=30.0)
-        response.raise_for_status()
-
-    results = response.json()
-    list_of_anthology_terms = results["value"]
-    logging.info(
-        f"list_of_anthology_terms: {json.dumps(list_of_anthology_terms, default=str)}"
-    )
-
-    anthology_term_id = [
-        term["Id"]
-        for term in list_of_anthology_terms
-        if term["StartDate"] <= curr_date <= term["EndDate"]
-        and term["Id"] not in exclude_anthology_term_ids
-    ]
-    logging.info(f"anthology_term_id: {json.dumps(anthology_term_id, default=str)}")
+    client = get_async_client(url)
+    response = await send_with_retries_asynchronously(lambda: client.get(url=url, headers=headers, timeout=30.0), url)
 
-    anthology_term_code = {
-        term["Code"]
-        for term in list_of_anthology_terms
-        if term["StartDate"] <= curr_date <= term["EndDate"]
-        and term["Id"] not in exclude_anthology_term_ids
-    }
-    logging.info(f"anthology_term_code: {json.dumps(anthology_term_code, default=str)}")
+    list_of_anthology_terms = response.json()["value"]
+    log_payload("list_of_anthology_terms", list_of_anthology_terms)
 
-    return anthology_term_id, anthology_term_code
+    return list_of_anthology_terms
 
 
-def get_canvas_term_id(
-    canvas_bearer_token: str, canvas_base_url: str, anthology_term_code: list
-) -> list:
+async def get_canvas_terms(canvas_bearer_token: str, canvas_base_url: str) -> list[dict]:
     url = f"{canvas_base_url}/api/v1/accounts/1/terms?per_page=100"
     headers = {"Authorization": f"Bearer {canvas_bearer_token}"}
 
-    transport = httpx.HTTPTransport(retries=3)
-    with httpx.Client(transport=transport) as client:
-        response = client.get(url=url, headers=headers, timeout=30.0)
-    response.raise_for_status()
-
-    results = response.json()
-    list_of_canvas_terms = results["enrollment_terms"]
-
-    canvas_term_id = [
-        term["id"]
-        for term in list_of_canvas_terms
-        if term["sis_term_id"] in anthology_term_code
+    client = get_async_client(url)
+    list_of_canvas_terms = [
+        term
+        async for page in get_canvas_pages(client, url, headers, get_rows=lambda results: results["enrollment_terms"])
+        for term in page
     ]
-    logging.info(f"canvas_term_id: {json.dumps(canvas_term_id)}")
+    log_payload("list_of_canvas_terms", list_of_canvas_terms)
 
-    return canvas_term_id
+    return list_of_canvas_terms
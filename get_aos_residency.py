@@ -1,52 +1,47 @@
 import httpx
-import asyncio
-import logging
 
+from checkpoints import Checkpoint
+from fan_out import fan_out
+from http_client import get_async_client
+from records import StudentRecord
+from retry_policy import send_with_retries_asynchronously
 
-async def get_aos_residency_api_data_asynchronously(
-    anthology_api_key: str, anthology_base_url: str, students: list[dict]
-) -> list[dict]:
-    size_of_chunks = 10
-    number_of_chunks = len(students) // size_of_chunks + 1
-
-    modified_students = []
-    async with httpx.AsyncClient() as client:
-        for i in range(number_of_chunks):
-            tasks = [
-                get_aos_residency_api_data(anthology_api_key, anthology_base_url, student, client)
-                for student in students[i * size_of_chunks : (i + 1) * size_of_chunks]
-            ]
-
-            results = await asyncio.gather(*tasks)
-            modified_students.extend(results)
 
-    return modified_students
+async def get_aos_residency_api_data_asynchronously(
+    anthology_api_key: str,
+    anthology_base_url: str,
+    students: list[StudentRecord],
+    client: httpx.AsyncClient = None,
+    errors: list = None,
+    checkpoint: Checkpoint = None,
+) -> list[StudentRecord]:
+    # callers running several stages at once pass in a shared client, otherwise use the pooled one
+    client = client or get_async_client(anthology_base_url)
+
+    # with an errors list, failed enrollments are reported there instead of failing the stage
+    return await fan_out(
+        lambda student: get_aos_residency_api_data(anthology_api_key, anthology_base_url, student, client),
+        students,
+        lambda student: student.student_enrollment_period_id,
+        errors,
+        checkpoint=checkpoint,
+    )
 
 
 async def get_aos_residency_api_data(
-    anthology_api_key: str, anthology_base_url: str, student: dict, client: httpx.AsyncClient
-) -> dict:
+    anthology_api_key: str, anthology_base_url: str, student: StudentRecord, client: httpx.AsyncClient
+) -> StudentRecord:
     # get data from API
-    enrollment_id = student["student_enrollment_period_id"]
+    enrollment_id = student.student_enrollment_period_id
 
     url = f"{anthology_base_url}/ds/campusnexus/StudentEnrollmentAreaOfStudyLists/CampusNexus.GetSavedProgramVersionAreaOfStudyConfig(studentenrollmentperiodid={enrollment_id})"
     headers = {"ApiKey": anthology_api_key}
     params = {"$select": "AreaOfStudyName"}
 
-    max_retries = 3
-    base_delay = 2
-
-    for attempt in range(max_retries + 1):
-        try:
-            response = await client.get(url=url, headers=headers, params=params, timeout=30.0)
-            response.raise_for_status()
-            results = response.json()
-            break
-        except Exception as err:
-            logging.exception(err)
-            if attempt >= max_retries:
-                response.raise_for_status()
-            await asyncio.sleep(base_delay * 2**attempt)
+    response = await send_with_retries_asynchronously(
+        lambda: client.get(url=url, headers=headers, params=params, timeout=30.0), url
+    )
+    results = response.json()
 
     # prepare AOS and residency data
     modified_student = get_modified_student_data(results, student)
@@ -54,7 +49,7 @@ async def get_aos_residency_api_data(
     return modified_student
 
 
-def get_modified_student_data(results: dict, student) -> dict:
+def get_modified_student_data(results: dict, student: StudentRecord) -> StudentRecord:
     # get the list of AOS + residency data
     AOS_residency_list = results.get("value", [])
 
@@ -74,11 +69,8 @@ def get_modified_student_data(results: dict, student) -> dict:
     ]
     residency = "; ".join(residency_list)
 
-    # generate a new student dictionary with AOS and residency added
-    modified_student = {
-        **student,
-        "area_of_study": AOS if AOS else None,
-        "residency": residency if residency else None,
-    }
+    # add AOS and residency to the student
+    student.area_of_study = AOS if AOS else None
+    student.residency = residency if residency else None
 
-    return modified_student
+    return student
@@ -1,14 +1,13 @@
-import httpx
-import time
-import logging
+from codec import AttendanceRow
+from http_client import get_client
+from odata import decode_odata_page
+from retry_policy import send_with_retries
+from payload_logging import log_payload
 
 
 def get_anthology_attendance_data(
     anthology_api_key: str, anthology_base_url: str, thirty_days_ago_datetime: str
-) -> list[dict]:
-
-    max_retries = 3
-    base_delay = 2
+) -> list[AttendanceRow]:
 
     url = f"{anthology_base_url}/ds/campusnexus/Attendance"
     headers = {"ApiKey": anthology_api_key}
@@ -17,20 +16,11 @@ def get_anthology_attendance_data(
         "$select": "AttendanceDate, Attended, Absent, IsExcusedAbsence, StudentCourseId",
     }
 
-    with httpx.Client() as client:
-        for attempt in range(max_retries):
-            try:
-                response = client.get(url=url, headers=headers, params=params, timeout=120.0)
-                response.raise_for_status()
-                results = response.json()
-                break
-            except Exception as err:
-                logging.exception(err)
-                if attempt >= max_retries:
-                    response.raise_for_status()
-                time.sleep(base_delay * 2**attempt)
+    client = get_client(url)
+    response = send_with_retries(lambda: client.get(url=url, headers=headers, params=params, timeout=120.0), url)
 
-    list_of_attendance_data = results["value"]
-    logging.info(f"list_of_attendance_data: {list_of_attendance_data}")
+    # the whole institution's attendance for the period, only the tracked courses' rows are kept by the caller
+    list_of_attendance_data = decode_odata_page(response.content, AttendanceRow).value
+    log_payload("list_of_attendance_data", list_of_attendance_data)
 
     return list_of_attendance_data
@@ -1,27 +1,25 @@
 import httpx
-import asyncio
-import logging
+
+from fan_out import fan_out
+from http_client import get_async_client
+from retry_policy import send_with_retries_asynchronously
+from payload_logging import log_payload
 
 
 async def get_canvas_course_name_asynchronously(
-    canvas_bearer_token: str, canvas_base_url: str, sis_course_id_list: list[str]
+    canvas_bearer_token: str, canvas_base_url: str, sis_course_id_list: list[str], errors: list = None
 ) -> dict[str, dict]:
-    course_data = []
-
-    chunk_size = 10
-    number_of_chunks = len(sis_course_id_list) // 10 + 1
-
-    async with httpx.AsyncClient() as client:
-        for i in range(number_of_chunks):
-            tasks = [
-                get_canvas_course_name(canvas_bearer_token, canvas_base_url, sis_course_id, client)
-                for sis_course_id in sis_course_id_list[chunk_size * i : chunk_size * (i + 1)]
-            ]
+    client = get_async_client(canvas_base_url)
 
-            course_info = await asyncio.gather(*tasks)
-            course_data.extend(course_info)
+    # with an errors list, failed courses are reported there and left out of the mappings
+    course_data = await fan_out(
+        lambda sis_course_id: get_canvas_course_name(canvas_bearer_token, canvas_base_url, sis_course_id, client),
+        sis_course_id_list,
+        lambda sis_course_id: sis_course_id,
+        errors,
+    )
 
-    logging.info(f"course_data: {course_data}")
+    log_payload("course_data", course_data)
 
     # course_id_mappings = {course["sis_course_id"]: course["canvas_course_name"] for course in course_data}
     course_id_mappings = {
@@ -38,30 +36,20 @@ async def get_canvas_course_name_asynchronously(
 async def get_canvas_course_name(
     canvas_bearer_token: str, canvas_base_url: str, sis_course_id: str, client: httpx.AsyncClient
 ) -> dict:
-    max_retries = 3
-    base_delay = 2
-
     url = f"{canvas_base_url}/api/v1/accounts/11/courses/sis_course_id:{sis_course_id}"
     headers = {"Authorization": f"Bearer {canvas_bearer_token}"}
 
-    for attempt in range(max_retries + 1):
-        try:
-            response = await client.get(url=url, headers=headers, timeout=15.0)
-            response.raise_for_status()
-            results = response.json()
-            break
-        except Exception as err:
-            if response.status_code == 404:
-                return {
-                    "sis_course_id": sis_course_id,
-                    "canvas_course_name": None,
-                    "canvas_course_id": None,
-                }
-
-            logging.exception(err)
-            if attempt >= max_retries:
-                response.raise_for_status()
-            await asyncio.sleep(base_delay * 2**attempt)
+    # a 404 means the course isn't in Canvas, not worth retrying
+    response = await send_with_retries_asynchronously(
+        lambda: client.get(url=url, headers=headers, timeout=15.0), url, ok_status_codes=(404,)
+    )
+    if response.status_code == 404:
+        return {
+            "sis_course_id": sis_course_id,
+            "canvas_course_name": None,
+            "canvas_course_id": None,
+        }
+    results = response.json()
 
     course_info = {
         "sis_course_id": sis_course_id,
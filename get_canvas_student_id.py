@@ -1,9 +1,12 @@
 import pymssql
 import httpx
-import asyncio
-import logging
 import json
 
+from fan_out import fan_out
+from http_client import get_async_client
+from retry_policy import send_with_retries_asynchronously
+from payload_logging import log_payload
+
 
 def get_canvas_student_ids_from_database(anthology_student_numbers: tuple, database_connector: dict) -> dict:
     with pymssql.connect(**database_connector) as conn:
@@ -18,30 +21,26 @@ def get_canvas_student_ids_from_database(anthology_student_numbers: tuple, datab
     canvas_student_ids_from_database = {
         student["anthology_student_number"]: student["canvas_student_id"] for student in results
     }
-    logging.info(f"canvas_student_ids_from_database: {canvas_student_ids_from_database}")
+    log_payload("canvas_student_ids_from_database", canvas_student_ids_from_database)
 
     return canvas_student_ids_from_database
 
 
 async def get_canvas_student_ids_asynchronously(
-    canvas_bearer_token: str, canvas_base_url: str, anthology_student_numbers: list
+    canvas_bearer_token: str, canvas_base_url: str, anthology_student_numbers: list, errors: list = None
 ) -> dict:
-    student_ids_info = []
-
-    amount_per_chunk = 12
-    number_of_chunks = (len(anthology_student_numbers) // amount_per_chunk) + 1
-
-    async with httpx.AsyncClient() as client:
-        for i in range(number_of_chunks):
-            tasks = [
-                get_canvas_student_id(canvas_bearer_token, canvas_base_url, anthology_student_number, client)
-                for anthology_student_number in anthology_student_numbers[
-                    amount_per_chunk * i : amount_per_chunk * (i + 1)
-                ]
-            ]
-
-            results = await asyncio.gather(*tasks)
-            student_ids_info.extend(results)
+    client = get_async_client(canvas_base_url)
+
+    # with an errors list, failed students are reported there and left out of the dictionary
+    student_ids_info = await fan_out(
+        lambda anthology_student_number: get_canvas_student_id(
+            canvas_bearer_token, canvas_base_url, anthology_student_number, client
+        ),
+        anthology_student_numbers,
+        lambda anthology_student_number: anthology_student_number,
+        errors,
+        chunk_size=12,
+    )
 
     # convert the student_ids_info into a dictionary
     student_ids_dict = {
@@ -60,28 +59,12 @@ async def get_canvas_student_id(
     headers = {"Authorization": f"Bearer {canvas_bearer_token}"}
     # params = {"search_term": anthology_student_number}
 
-    max_retries = 3
-    base_delay = 2
-
-    # async with httpx.AsyncClient() as client:
-    for attempt in range(max_retries + 1):
-        try:
-            response = await client.get(url=url, headers=headers, timeout=15.0)
-            results = response.json()
-            break
-
-        except Exception as err:
-            logging.exception(err)
-            if response.status_code == 404:
-                break
-            if attempt >= max_retries:
-                logging.exception(
-                    f"Failed attempt #{attempt}. Status code {response.status_code} for Canvas API /accounts/1/users/."
-                )
-                response.raise_for_status()
-            await asyncio.sleep(base_delay * 2**attempt)
-
-    canvas_student_id = results["id"] if not response.status_code == 404 else None
+    # a 404 means the student has no Canvas user yet
+    response = await send_with_retries_asynchronously(
+        lambda: client.get(url=url, headers=headers, timeout=15.0), url, ok_status_codes=(404,), hedge=True
+    )
+
+    canvas_student_id = response.json()["id"] if not response.status_code == 404 else None
 
     # # retrieve the canvas_student_id of the user matching whose sis_user_id field matches the anthology_student_number value
     # canvas_student_id = results["id"]
@@ -1,29 +1,34 @@
 import httpx
-import asyncio
 import json
-import logging
 
-
-async def get_canvas_enrollments_in_bulk_asynchronously(canvas_bearer_token, canvas_base_url, student_course_dict):
-    student_numbers_list = list(student_course_dict.keys())
-    list_of_canvas_enrollment_data = []
-
-    size_per_chunk = 10
-    number_of_chunks = len(student_numbers_list) // size_per_chunk + 1
-
-    async with httpx.AsyncClient() as client:
-        for i in range(number_of_chunks):
-            tasks = [
-                get_canvas_enrollments(
-                    canvas_bearer_token, canvas_base_url, student_number, student_course_dict, client
-                )
-                for student_number in student_numbers_list[size_per_chunk * i : size_per_chunk * (i + 1)]
-            ]
-
-            response = await asyncio.gather(*tasks)
-            list_of_canvas_enrollment_data.extend(response)
-
-    return list_of_canvas_enrollment_data
+from checkpoints import Checkpoint
+from fan_out import fan_out
+from http_client import get_async_client
+from retry_policy import send_with_retries_asynchronously
+
+
+async def get_canvas_enrollments_in_bulk_asynchronously(
+    canvas_bearer_token,
+    canvas_base_url,
+    student_course_dict,
+    errors: list = None,
+    checkpoint: Checkpoint = None,
+    on_results=None,
+):
+    client = get_async_client(canvas_base_url)
+
+    # with an errors list, failed students are reported there instead of failing the stage. on_results gets the
+    # enrollments of each chunk of students as soon as they're in
+    return await fan_out(
+        lambda student_number: get_canvas_enrollments(
+            canvas_bearer_token, canvas_base_url, student_number, student_course_dict, client
+        ),
+        list(student_course_dict.keys()),
+        lambda student_number: student_number,
+        errors,
+        checkpoint=checkpoint,
+        on_results=on_results,
+    )
 
 
 async def get_canvas_enrollments(
@@ -33,9 +38,6 @@ async def get_canvas_enrollments(
     student_course_dict: dict,
     client: httpx.AsyncClient,
 ) -> dict:
-    max_retries = 3
-    base_delay = 2
-
     url = f"{canvas_base_url}/api/v1/users/sis_user_id:{anthology_student_number}/enrollments?per_page=100"
     for sis_course_id in student_course_dict[anthology_student_number]:
         url += f"&sis_course_id[]={sis_course_id}"
@@ -43,16 +45,13 @@ async def get_canvas_enrollments(
     headers = {"Authorization": f"Bearer {canvas_bearer_token}"}
     params = {"per_page": 100}
 
-    for attempt in range(max_retries + 1):
-        try:
-            response = await client.get(url=url, headers=headers, params=params, timeout=30.0)
-            response.raise_for_status()
-            break
-        except Exception as err:
-            logging.exception(err)
-            if attempt >= max_retries:
-                response.raise_for_status()
-            await asyncio.sleep(base_delay * 2**attempt)
+    # a 404 means the user has no enrollments, get_formatted_results() returns nulls for it
+    response = await send_with_retries_asynchronously(
+        lambda: client.get(url=url, headers=headers, params=params, timeout=30.0),
+        url,
+        ok_status_codes=(404,),
+        hedge=True,
+    )
 
     enrollment_results = get_formatted_results(anthology_student_number, response, student_course_dict)
 
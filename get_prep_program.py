@@ -1,6 +1,22 @@
+import asyncio
 import httpx
 import time
-import logging
+
+from fan_out import fan_out
+from http_client import get_async_client, get_client
+from odata import get_odata_pages
+from retry_policy import send_with_retries, send_with_retries_asynchronously
+from payload_logging import log_payload
+
+
+# StudentId values per `in (...)` clause, and chunks fetched at once
+STUDENT_ID_FILTER_CHUNK_SIZE = 100
+STUDENT_ID_FILTER_CONCURRENCY = 8
+# agency branches are only added or renamed by hand, so each worker keeps the id -> name map this long
+AGENCY_BRANCH_NAMES_TTL_SECONDS = 3600.0
+
+# anthology_base_url -> (time.monotonic() when fetched, {agency branch id: name})
+agency_branch_names_cache = {}
 
 
 def get_prep_program_dict(
@@ -10,41 +26,121 @@ def get_prep_program_dict(
     americorp_agency_branch_ids: set,
 ) -> dict:
 
-    max_retries = 3
-    base_delay = 2
+    url = f"{anthology_base_url}/ds/campusnexus/StudentAgencyBranches"
+    params = {"$expand": "AgencyBranch($select=Name)", "$select": "StudentId,AgencyBranchId"}
+    headers = {"ApiKey": anthology_api_key}
+
+    client = get_client(url)
+    response = send_with_retries(lambda: client.get(url=url, headers=headers, params=params, timeout=60.0), url)
+    results = response.json()
+
+    return build_prep_program_dict(results["value"], curr_americorp_agency_branch_ids, americorp_agency_branch_ids)
+
+
+async def get_prep_program_dict_asynchronously(
+    anthology_api_key: str,
+    anthology_base_url: str,
+    curr_americorp_agency_branch_ids: set,
+    americorp_agency_branch_ids: set,
+    client: httpx.AsyncClient,
+) -> dict:
 
     url = f"{anthology_base_url}/ds/campusnexus/StudentAgencyBranches"
     params = {"$expand": "AgencyBranch($select=Name)", "$select": "StudentId,AgencyBranchId"}
     headers = {"ApiKey": anthology_api_key}
 
-    with httpx.Client() as client:
-        for attempt in range(max_retries + 1):
-            try:
-                response = client.get(url=url, headers=headers, params=params, timeout=60.0)
-                response.raise_for_status()
-                results = response.json()
-                break
-            except Exception as err:
-                logging.exception(err)
-                if attempt >= max_retries:
-                    response.raise_for_status()
-                time.sleep(base_delay * 2**max_retries)
-
-    program_list = results["value"]
-    logging.info(f"{program_list = }")
+    response = await send_with_retries_asynchronously(
+        lambda: client.get(url=url, headers=headers, params=params, timeout=60.0), url
+    )
+    results = response.json()
+
+    return build_prep_program_dict(results["value"], curr_americorp_agency_branch_ids, americorp_agency_branch_ids)
+
+
+async def get_filtered_prep_program_dict_asynchronously(
+    anthology_api_key: str,
+    anthology_base_url: str,
+    student_ids: list[int],
+    curr_americorp_agency_branch_ids: set,
+    americorp_agency_branch_ids: set,
+    client: httpx.AsyncClient = None,
+) -> dict:
+    # only the given students' agency branches, in concurrent `StudentId in (...)` chunks, without the expanded branch
+    # on every row. The branch names come from the cached map instead
+    client = client or get_async_client(anthology_base_url)
+    url = f"{anthology_base_url}/ds/campusnexus/StudentAgencyBranches"
+    headers = {"ApiKey": anthology_api_key}
+
+    async def get_student_agency_branches(chunk: list[int]) -> list[dict]:
+        params = {
+            "$filter": f"StudentId in ({', '.join(str(student_id) for student_id in chunk)})",
+            "$select": "StudentId,AgencyBranchId",
+        }
+        return [program async for page in get_odata_pages(client, url, headers, params) for program in page]
+
+    chunks = [
+        student_ids[i : i + STUDENT_ID_FILTER_CHUNK_SIZE]
+        for i in range(0, len(student_ids), STUDENT_ID_FILTER_CHUNK_SIZE)
+    ]
+    agency_branch_names, program_lists = await asyncio.gather(
+        get_agency_branch_names_asynchronously(anthology_api_key, anthology_base_url, client),
+        fan_out(get_student_agency_branches, chunks, lambda chunk: chunk[0], chunk_size=STUDENT_ID_FILTER_CONCURRENCY),
+    )
+
+    return build_prep_program_dict(
+        [program for program_list in program_lists for program in program_list],
+        curr_americorp_agency_branch_ids,
+        americorp_agency_branch_ids,
+        agency_branch_names,
+    )
+
+
+async def get_agency_branch_names_asynchronously(
+    anthology_api_key: str, anthology_base_url: str, client: httpx.AsyncClient
+) -> dict:
+    fetched_at, agency_branch_names = agency_branch_names_cache.get(anthology_base_url, (0.0, None))
+    if agency_branch_names is not None and time.monotonic() - fetched_at < AGENCY_BRANCH_NAMES_TTL_SECONDS:
+        return agency_branch_names
+
+    url = f"{anthology_base_url}/ds/campusnexus/AgencyBranches"
+    headers = {"ApiKey": anthology_api_key}
+    params = {"$select": "Id,Name"}
+
+    agency_branch_names = {
+        agency_branch["Id"]: agency_branch["Name"]
+        async for page in get_odata_pages(client, url, headers, params, timeout=30.0)
+        for agency_branch in page
+    }
+    agency_branch_names_cache[anthology_base_url] = (time.monotonic(), agency_branch_names)
+
+    return agency_branch_names
+
+
+def build_prep_program_dict(
+    program_list: list[dict],
+    curr_americorp_agency_branch_ids: set,
+    americorp_agency_branch_ids: set,
+    agency_branch_names: dict = None,
+) -> dict:
+    log_payload("program_list", program_list)
 
     # start with a dictionary that appends the programs into a list[str]
     program_dict = {}
     for program in program_list:
         anthology_student_id = program["StudentId"]
+        # the expanded AgencyBranch of the unfiltered pull, or the cached names of the filtered one
+        if agency_branch_names is not None:
+            agency_branch_name = agency_branch_names.get(program["AgencyBranchId"])
+        else:
+            agency_branch_name = (program.get("AgencyBranch") or {}).get("Name")
 
         if program["AgencyBranchId"] in curr_americorp_agency_branch_ids:
             program_dict.setdefault(anthology_student_id, {}).setdefault("americorp_status_list", []).append(
-                (program.get("AgencyBranch") or {}).get("Name")
+                agency_branch_name
             )
         elif program["AgencyBranchId"] not in americorp_agency_branch_ids:
             program_dict.setdefault(anthology_student_id, {}).setdefault("prep_program_list", []).append(
-                (program.get("AgencyBranch") or {}).get("Name")
+                agency_branch_name
             )
 
     # create a new dictionary that takes the list[str] and concatenates the strings
@@ -58,6 +154,6 @@ def get_prep_program_dict(
             "prep_program": prep_program or None,
         }
 
-    logging.info(f"{modified_program_dict = }")
+    log_payload("modified_program_dict", modified_program_dict)
 
     return modified_program_dict
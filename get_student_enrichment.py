@@ -0,0 +1,179 @@
+import asyncio
+import logging
+
+from http_client import get_async_client
+from records import StudentRecord
+from get_student_number_email_first_last_name import get_student_data_asynchronously
+from get_aos_residency import get_aos_residency_api_data_asynchronously
+from get_prep_program import get_filtered_prep_program_dict_asynchronously, get_prep_program_dict_asynchronously
+from get_academic_graduation_hold_registration_hold import get_graduation_hold_registration_hold_asynchronously
+from get_academic_status import get_academic_status_asynchronously
+from enrichment_snapshots import (
+    ENROLLMENT_GROUPS,
+    get_fresh_attributes,
+    get_snapshot_database_connector,
+    get_snapshot_key,
+    get_snapshot_rows,
+    load_snapshots,
+    save_snapshots,
+)
+
+# columns each enrichment stage adds on top of the base student list
+STUDENT_DATA_FIELDS = ("anthology_student_number", "first_name", "last_name", "email")
+AOS_RESIDENCY_FIELDS = ("area_of_study", "residency")
+HOLD_FIELDS = ("academic_graduation_hold", "registration_hold")
+ACADEMIC_STATUS_FIELDS = ("academic_status",)
+
+# the per-student lookups, as reported in the `stage` of an error and stored in the enrichment snapshots
+ENRICHMENT_STAGES = {
+    "student_data": STUDENT_DATA_FIELDS,
+    "aos_residency": AOS_RESIDENCY_FIELDS,
+    "holds": HOLD_FIELDS,
+    "academic_status": ACADEMIC_STATUS_FIELDS,
+}
+
+
+async def get_enriched_students_asynchronously(
+    anthology_api_key: str,
+    anthology_base_url: str,
+    students: list[StudentRecord],
+    curr_americorp_agency_branch_ids: set,
+    americorp_agency_branch_ids: set,
+    errors: list = None,
+    database_connector: dict = None,
+    server_side_filter: bool = False,
+) -> list[StudentRecord]:
+    # student-level lookups only need to run once per student, even when a student has several enrollment periods
+    unique_students = list({student.anthology_student_id: student for student in students}.values())
+
+    # with an errors list, each lookup collects its own failures and students with any failed lookup are left out
+    stage_errors = {stage: [] for stage in ENRICHMENT_STAGES} if errors is not None else {}
+
+    # attributes from the snapshots of earlier runs that are still fresh, only the rest is looked up
+    snapshot_database_connector = get_snapshot_database_connector(database_connector)
+    fresh_attributes = {stage: {} for stage in ENRICHMENT_STAGES}
+    if snapshot_database_connector:
+        try:
+            snapshots = await asyncio.to_thread(load_snapshots, students, snapshot_database_connector)
+            fresh_attributes = get_fresh_attributes(students, snapshots)
+        except Exception as err:
+            logging.warning(f"enrichment snapshots unavailable, looking up every student: {err!r}")
+
+    students_to_fetch = {
+        stage: [
+            student
+            for student in (students if stage in ENROLLMENT_GROUPS else unique_students)
+            if get_snapshot_key(student, stage) not in fresh_attributes[stage]
+        ]
+        for stage in ENRICHMENT_STAGES
+    }
+
+    # every stage only depends on the base student list, so run them all at once. Each keeps its own concurrency (its
+    # fan_out chunks) + its own Anthology connection pool, sharing one pool capped them all at the pool's throughput
+    def get_anthology_client(stage: str):
+        return get_async_client(anthology_base_url, pool=f"enrichment:{stage}")
+
+    if server_side_filter:
+        prep_program_lookup = get_filtered_prep_program_dict_asynchronously(
+            anthology_api_key,
+            anthology_base_url,
+            [student.anthology_student_id for student in unique_students],
+            curr_americorp_agency_branch_ids,
+            americorp_agency_branch_ids,
+            get_anthology_client("prep_program"),
+        )
+    else:
+        prep_program_lookup = get_prep_program_dict_asynchronously(
+            anthology_api_key,
+            anthology_base_url,
+            curr_americorp_agency_branch_ids,
+            americorp_agency_branch_ids,
+            get_anthology_client("prep_program"),
+        )
+    student_data, aos_residency_data, holds_data, academic_status_data, prep_program_dict = await asyncio.gather(
+        get_student_data_asynchronously(
+            anthology_api_key,
+            anthology_base_url,
+            students_to_fetch["student_data"],
+            get_anthology_client("student_data"),
+            stage_errors.get("student_data"),
+        ),
+        get_aos_residency_api_data_asynchronously(
+            anthology_api_key,
+            anthology_base_url,
+            students_to_fetch["aos_residency"],
+            get_anthology_client("aos_residency"),
+            stage_errors.get("aos_residency"),
+        ),
+        get_graduation_hold_registration_hold_asynchronously(
+            anthology_api_key,
+            anthology_base_url,
+            students_to_fetch["holds"],
+            get_anthology_client("holds"),
+            stage_errors.get("holds"),
+        ),
+        get_academic_status_asynchronously(
+            anthology_api_key,
+            anthology_base_url,
+            students_to_fetch["academic_status"],
+            get_anthology_client("academic_status"),
+            stage_errors.get("academic_status"),
+        ),
+        prep_program_lookup,
+    )
+
+    # AOS + residency are tied to the enrollment period, everything else to the student. The lookups fill in the
+    # records they were given, a student with several enrollment periods only got the student-level fields on one of
+    # them, so they're all set from these attributes below
+    fetched_attributes = {}
+    for stage, stage_results in [
+        ("student_data", student_data),
+        ("aos_residency", aos_residency_data),
+        ("holds", holds_data),
+        ("academic_status", academic_status_data),
+    ]:
+        fetched_attributes[stage] = {
+            get_snapshot_key(student, stage): {field: getattr(student, field) for field in ENRICHMENT_STAGES[stage]}
+            for student in stage_results
+        }
+    attributes = {stage: {**fresh_attributes[stage], **fetched_attributes[stage]} for stage in ENRICHMENT_STAGES}
+
+    # report every failure by anthology_student_id, the id GetStudentEnrichment takes as retry_ids
+    student_ids_by_enrollment = {
+        student.student_enrollment_period_id: student.anthology_student_id for student in students
+    }
+    failed_student_ids = set()
+    for stage, failures in stage_errors.items():
+        for error in failures:
+            if stage == "aos_residency":
+                error = {
+                    **error,
+                    "id": student_ids_by_enrollment[error["id"]],
+                    "student_enrollment_period_id": error["id"],
+                }
+            errors.append({**error, "stage": stage})
+            failed_student_ids.add(error["id"])
+
+    enriched_students = [student for student in students if student.anthology_student_id not in failed_student_ids]
+    for student in enriched_students:
+        for stage in ENRICHMENT_STAGES:
+            for field, value in attributes[stage][get_snapshot_key(student, stage)].items():
+                setattr(student, field, value)
+        student.prep_program = prep_program_dict.get(student.anthology_student_id, {}).get("prep_program")
+        student.americorp_status = prep_program_dict.get(student.anthology_student_id, {}).get("americorp_status")
+    logging.info(f"len(enriched_students): {len(enriched_students)}")
+
+    # store what was looked up this run, so the next runs can skip it
+    if snapshot_database_connector:
+        snapshot_rows = [
+            snapshot_row
+            for stage in ENRICHMENT_STAGES
+            for snapshot_row in get_snapshot_rows(students, stage, fetched_attributes[stage])
+            if snapshot_row["anthology_student_id"] not in failed_student_ids
+        ]
+        try:
+            await asyncio.to_thread(save_snapshots, snapshot_rows, snapshot_database_connector)
+        except Exception as err:
+            logging.warning(f"enrichment snapshots not saved: {err!r}")
+
+    return enriched_students
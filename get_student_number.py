@@ -1,9 +1,10 @@
-import httpx
 import json
 from typing import Union
 import asyncio
 import logging
 
+from http_client import get_async_client
+
 
 async def get_student_number_api_modified(
     anthology_api_key: str, anthology_base_url: str, studentId: int
@@ -13,20 +14,19 @@ async def get_student_number_api_modified(
     body = {"payload": {"id": f"{studentId}"}}
     headers = {"ApiKey": anthology_api_key, "Content-Type": "application/json"}
 
-    transport = httpx.AsyncHTTPTransport(retries=3)
-    async with httpx.AsyncClient(transport=transport) as client:
-        response = await client.post(
-            url=url, data=json.dumps(body), headers=headers, timeout=30.0
-        )
-        logging.info(f"Status code {response.status_code}. {response.text}")
+    client = get_async_client(url)
+    response = await client.post(
+        url=url, data=json.dumps(body), headers=headers, timeout=30.0
+    )
+    logging.info(f"Status code {response.status_code}. {response.text}")
 
-        response.raise_for_status()
-        results = response.json()
+    response.raise_for_status()
+    results = response.json()
 
-        studentNumber_str = (
-            results.get("payload", {}).get("data", {}).get("studentNumber")
-        )
-        studentNumber = int(studentNumber_str) if studentNumber_str else None
+    studentNumber_str = (
+        results.get("payload", {}).get("data", {}).get("studentNumber")
+    )
+    studentNumber = int(studentNumber_str) if studentNumber_str else None
 
     return studentNumber
 
@@ -1,63 +1,58 @@
 import httpx
-import asyncio
-import logging
 import json
 
+from checkpoints import Checkpoint
+from fan_out import fan_out
+from http_client import get_async_client
+from records import StudentRecord
+from retry_policy import send_with_retries_asynchronously
+
 
 async def get_student_data(
-    anthology_api_key: str, anthology_base_url: str, student: dict, client: httpx.AsyncClient
-) -> dict:
+    anthology_api_key: str, anthology_base_url: str, student: StudentRecord, client: httpx.AsyncClient
+) -> StudentRecord:
 
-    student_id = student["anthology_student_id"]
+    student_id = student.anthology_student_id
     url = f"{anthology_base_url}/api/commands/Common/Student/get"
     headers = {"ApiKey": anthology_api_key, "Content-Type": "application/json"}
     body = {"payload": {"id": student_id}}
 
-    max_retries = 3
-    base_delay = 2
-
-    for attempt in range(max_retries + 1):
-        try:
-            response = await client.post(url=url, headers=headers, data=json.dumps(body), timeout=15.0)
-            response.raise_for_status()
-            results = response.json()
-            # logging.info(f"results: {results}")
-            break
-        except Exception as err:
-            logging.exception(err)
-            if attempt >= max_retries:
-                raise
-            await asyncio.sleep(base_delay * 2 ** (attempt))
+    # Student/get only reads, so it's safe to hedge
+    response = await send_with_retries_asynchronously(
+        lambda: client.post(url=url, headers=headers, data=json.dumps(body), timeout=15.0), url, hedge=True
+    )
+    results = response.json()
 
     student_api_data = (results.get("payload") or {}).get("data") or {}
 
-    formatted_results = {
-        **student,
-        "anthology_student_number": (
-            int(student_api_data["studentNumber"]) if "studentNumber" in student_api_data else None
-        ),
-        "first_name": student_api_data.get("firstName", None),
-        "last_name": student_api_data.get("lastName", None),
-        "email": student_api_data.get("emailAddress", None),
-    }
-
-    return formatted_results
-
-
-async def get_student_data_asynchronously(anthology_api_key: str, anthology_base_url: str, students: list):
-    student_data = []
-
-    amount_per_chunk = 10
-    number_of_chunks = (len(students) // amount_per_chunk) + 1
-
-    async with httpx.AsyncClient() as client:
-        for i in range(number_of_chunks):
-            tasks = [
-                get_student_data(anthology_api_key, anthology_base_url, student, client)
-                for student in students[amount_per_chunk * i : amount_per_chunk * (i + 1)]
-            ]
-
-            results = await asyncio.gather(*tasks)
-            student_data.extend(results)
-
-    return student_data
+    student.anthology_student_number = (
+        int(student_api_data["studentNumber"]) if "studentNumber" in student_api_data else None
+    )
+    student.first_name = student_api_data.get("firstName", None)
+    student.last_name = student_api_data.get("lastName", None)
+    student.email = student_api_data.get("emailAddress", None)
+
+    return student
+
+
+async def get_student_data_asynchronously(
+    anthology_api_key: str,
+    anthology_base_url: str,
+    students: list[StudentRecord],
+    client: httpx.AsyncClient = None,
+    errors: list = None,
+    checkpoint: Checkpoint = None,
+):
+    # callers running several stages at once pass in a shared client, otherwise use the pooled one
+    client = client or get_async_client(anthology_base_url)
+
+    # with an errors list, failed students are reported there instead of failing the stage
+    return await fan_out(
+        lambda student: get_student_data(anthology_api_key, anthology_base_url, student, client),
+        students,
+        lambda student: student.anthology_student_id,
+        errors,
+        checkpoint=checkpoint,
+        # a student has a row per enrollment period, each checkpointed on its own
+        get_checkpoint_id=lambda student: student.student_enrollment_period_id,
+    )
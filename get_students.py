@@ -1,16 +1,17 @@
-import httpx
 import json
 import logging
 
+from http_client import get_client
+from retry_policy import send_with_retries
+from payload_logging import log_payload
+
 
 def get_school_status_ids(anthology_base_url: str, anthology_api_key: str, school_status_codes: set) -> list:
     url = f"{anthology_base_url}/ds/campusnexus/SchoolStatuses"
     headers = {"ApiKey": anthology_api_key}
 
-    transport = httpx.HTTPTransport(retries=2)
-    with httpx.Client(transport=transport) as client:
-        response = client.get(url=url, headers=headers, timeout=30.0)
-    response.raise_for_status()
+    client = get_client(url)
+    response = send_with_retries(lambda: client.get(url=url, headers=headers, timeout=30.0), url)
 
     results = response.json()
     school_statuses = results["value"]
@@ -25,19 +26,18 @@ def get_students(filtered_school_status_ids: list, anthology_base_url: str, anth
     students = []
     headers = {"ApiKey": anthology_api_key}
 
-    transport = httpx.HTTPTransport(retries=4)
-    with httpx.Client(transport=transport) as client:
-        for school_status_id in filtered_school_status_ids:
-            url = f"{anthology_base_url}/ds/campusnexus/StudentEnrollmentPeriods"
-            params = {
-                "$filter": f"SchoolStatusId eq {school_status_id}",
-                "$expand": "Campus($select=Name),SchoolStatus($select=Name)",
-                "$select": "Id,StudentId,ProgramVersionName,Lda,EnrollmentDate,GraduationDate",
-            }
-            response = client.get(url=url, headers=headers, params=params, timeout=30.0)
+    client = get_client(anthology_base_url)
+    for school_status_id in filtered_school_status_ids:
+        url = f"{anthology_base_url}/ds/campusnexus/StudentEnrollmentPeriods"
+        params = {
+            "$filter": f"SchoolStatusId eq {school_status_id}",
+            "$expand": "Campus($select=Name),SchoolStatus($select=Name)",
+            "$select": "Id,StudentId,ProgramVersionName,Lda,EnrollmentDate,GraduationDate",
+        }
+        response = send_with_retries(lambda: client.get(url=url, headers=headers, params=params, timeout=30.0), url)
 
-            results = response.json()
-            students.extend(results["value"])
+        results = response.json()
+        students.extend(results["value"])
 
     return students
 
@@ -73,6 +73,6 @@ def get_student_ids_for_single_vs_multiple_enrollments(students: list[dict], che
             logging.exception(err)
             raise
 
-    print(json.dumps({"student_ids_and_enrollment_ids_dict": student_ids_and_enrollment_ids_dict}, default=str))
+    log_payload("student_ids_and_enrollment_ids_dict", student_ids_and_enrollment_ids_dict)
 
     return student_ids_and_enrollment_ids_dict
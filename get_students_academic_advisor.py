@@ -1,66 +1,47 @@
-import httpx
-import json
-import logging
-import time
+from fan_out import fan_out
+from http_client import get_async_client
+from odata import get_odata_pages
+from payload_logging import log_payload
 
 
-def get_all_staff_ids(anthology_api_key: str, anthology_base_url: str) -> dict:
-    max_retries = 3
-    base_delay = 2
+# StudentEnrollmentPeriodId values per `in (...)` clause
+ENROLLMENT_ID_FILTER_CHUNK_SIZE = 100
+# chunks fetched at once
+ENROLLMENT_ID_FILTER_CONCURRENCY = 8
 
-    url = f"{anthology_base_url}/ds/campusnexus/Staff"
-    headers = {"ApiKey": anthology_api_key}
-    params = {"$select": "Id, FullName"}
-
-    with httpx.Client() as client:
-        for attempt in range(max_retries + 1):
-            try:
-                response = client.get(url=url, headers=headers, params=params, timeout=30.0)
-                results = response.json()
-                logging.info(f"results: {json.dumps(results, default=str)}")
-                break
-            except Exception as err:
-                logging.exception(err)
-                if attempt >= max_retries:
-                    response.raise_for_status()
-                time.sleep(base_delay * 2**attempt)
-
-    staff_list = results["value"]
-
-    staff_id_dict = {staff["Id"]: staff["FullName"] for staff in staff_list}
-    logging.info(f"staff_id_dict: {staff_id_dict}")
-
-    return staff_id_dict
-
-
-def get_advisors_info(anthology_api_key: str, anthology_base_url: str, staff_id_dict: dict) -> dict:
-    max_retries = 3
-    base_delay = 2
 
+async def get_advisors_info_asynchronously(
+    anthology_api_key: str, anthology_base_url: str, student_enrollment_period_ids: list[int]
+) -> dict:
+    # only the advisors of the given enrollment periods, with the advisor's name expanded inline, so neither the whole
+    # Staff table nor every advisor assignment of the institution is downloaded
     url = f"{anthology_base_url}/ds/campusnexus/StudentAdvisors"
     headers = {"ApiKey": anthology_api_key}
-    params = {"$filter": "AdvisorModule eq 'AD'", "$select": "StaffId, StudentEnrollmentPeriodId"}
-
-    for attempt in range(max_retries + 1):
-        try:
-            with httpx.Client() as client:
-                response = client.get(url=url, headers=headers, params=params)
-                results = response.json()
-                advisors_list = results["value"]
-                logging.info(f"advisors_list: {advisors_list}")
-                break
-        except Exception as err:
-            logging.exception(err)
-            if attempt >= max_retries:
-                response.raise_for_status()
-            time.sleep(base_delay * 2**attempt)
-
-    advisors_dict = {}
-    for advisor in advisors_list:
-        student_enrollment_period_id = advisor["StudentEnrollmentPeriodId"]
-        advisor_id = advisor["StaffId"]
-        advisor_name = staff_id_dict[advisor_id]
-        # add to advisors_dict
-        advisors_dict[student_enrollment_period_id] = advisor_name
+    client = get_async_client(anthology_base_url)
+
+    async def get_advisors(chunk: list[int]) -> list[dict]:
+        params = {
+            "$filter": "AdvisorModule eq 'AD' and StudentEnrollmentPeriodId in "
+            f"({', '.join(str(student_enrollment_period_id) for student_enrollment_period_id in chunk)})",
+            "$select": "StudentEnrollmentPeriodId",
+            "$expand": "Staff($select=FullName)",
+        }
+        return [
+            advisor async for page in get_odata_pages(client, url, headers, params, timeout=30.0) for advisor in page
+        ]
+
+    chunks = [
+        student_enrollment_period_ids[i : i + ENROLLMENT_ID_FILTER_CHUNK_SIZE]
+        for i in range(0, len(student_enrollment_period_ids), ENROLLMENT_ID_FILTER_CHUNK_SIZE)
+    ]
+    advisors_lists = await fan_out(
+        get_advisors, chunks, lambda chunk: chunk[0], chunk_size=ENROLLMENT_ID_FILTER_CONCURRENCY
+    )
+    advisors_list = [advisor for advisors in advisors_lists for advisor in advisors]
+    log_payload("advisors_list", advisors_list)
+
+    advisors_dict = {
+        advisor["StudentEnrollmentPeriodId"]: (advisor.get("Staff") or {}).get("FullName") for advisor in advisors_list
+    }
 
     return advisors_dict
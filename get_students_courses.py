@@ -1,33 +1,110 @@
-import httpx
-import time
-import json
-import logging
+import asyncio
 
+from codec import StudentCourseRow
+from http_client import get_async_client, get_client
+from odata import decode_odata_page, get_odata_pages
+from retry_policy import send_with_retries
+from payload_logging import log_payload
 
-def get_all_students_courses(anthology_api_key: str, anthology_base_url: str, term_id: int) -> list[dict]:
-    max_retries = 3
-    base_delay = 2
 
+# StudentId values per `in (...)` clause, keeps the URLs well under the usual 8KB limit
+STUDENT_ID_FILTER_CHUNK_SIZE = 100
+# chunks fetched at once
+STUDENT_ID_FILTER_CONCURRENCY = 8
+
+STUDENT_COURSES_FILTER = "TermId eq {term_id} and Status ne 'F' and ClassSectionId ne 0"
+STUDENT_COURSES_SELECT = "Id, StudentId, StudentEnrollmentPeriodId, ClassSectionId"
+
+
+def get_all_students_courses(anthology_api_key: str, anthology_base_url: str, term_id: int) -> list[StudentCourseRow]:
     url = f"{anthology_base_url}/ds/campusnexus/StudentCourses"
     headers = {"ApiKey": anthology_api_key}
     params = {
         # pretty sure Status 'F' = ClassSectionId 0, but adding both conditions just in case
-        "$filter": f"TermId eq {term_id} and Status ne 'F' and ClassSectionId ne 0",
-        "$select": "Id, StudentId, StudentEnrollmentPeriodId, ClassSectionId",
+        "$filter": STUDENT_COURSES_FILTER.format(term_id=term_id),
+        "$select": STUDENT_COURSES_SELECT,
     }
 
-    with httpx.Client() as client:
-        for attempt in range(max_retries + 1):
-            try:
-                response = client.get(url=url, headers=headers, params=params, timeout=120.0)
-                results = response.json()
-                logging.info(f"results: {json.dumps(results, default=str)}")
-                student_courses = results["value"]
-                break
-            except Exception as err:
-                logging.exception(err)
-                if attempt >= max_retries:
-                    response.raise_for_status()
-                time.sleep(base_delay * 2**attempt)
+    client = get_client(url)
+    response = send_with_retries(lambda: client.get(url=url, headers=headers, params=params, timeout=120.0), url)
+    # the whole term's courses, most of them are dropped by the join so they're kept as compact rows
+    student_courses = decode_odata_page(response.content, StudentCourseRow).value
+
+    log_payload("student_courses", student_courses)
 
     return student_courses
+
+
+async def get_students_courses_asynchronously(
+    anthology_api_key: str, anthology_base_url: str, term_id: int, student_ids: list[int]
+):
+    # yields the term's courses of the given students only, as the pages arrive. The student filter runs on the server,
+    # so the download scales with the tracked students rather than with every course taken in the term
+    url = f"{anthology_base_url}/ds/campusnexus/StudentCourses"
+    headers = {"ApiKey": anthology_api_key}
+    client = get_async_client(anthology_base_url)
+
+    chunks = [
+        student_ids[i : i + STUDENT_ID_FILTER_CHUNK_SIZE]
+        for i in range(0, len(student_ids), STUDENT_ID_FILTER_CHUNK_SIZE)
+    ]
+    pages = asyncio.Queue()
+
+    async def fetch_chunks(worker_chunks: list) -> None:
+        for chunk in worker_chunks:
+            params = {
+                "$filter": STUDENT_COURSES_FILTER.format(term_id=term_id)
+                + f" and StudentId in ({', '.join(str(student_id) for student_id in chunk)})",
+                "$select": STUDENT_COURSES_SELECT,
+            }
+            async for page in get_odata_pages(client, url, headers, params, timeout=120.0, row_type=StudentCourseRow):
+                await pages.put(page)
+
+    # the chunks are split between the workers up front, each fetches its share one chunk after the other
+    workers = [
+        asyncio.create_task(fetch_chunks(chunks[worker::STUDENT_ID_FILTER_CONCURRENCY]))
+        for worker in range(min(STUDENT_ID_FILTER_CONCURRENCY, len(chunks)))
+    ]
+    if not workers:
+        return
+
+    async def fetch_all_chunks() -> None:
+        try:
+            # every worker finished, or one failed + the rest are cancelled below
+            done, _ = await asyncio.wait(workers, return_when=asyncio.FIRST_EXCEPTION)
+            for worker in done:
+                worker.result()
+        finally:
+            # end of the stream, also when a chunk failed
+            pages.put_nowait(None)
+
+    producer = asyncio.create_task(fetch_all_chunks())
+    try:
+        while (page := await pages.get()) is not None:
+            for student_course in page:
+                yield student_course
+        # raises the error of a failed chunk
+        await producer
+    finally:
+        # after a failed chunk, or the consumer stopping early, nothing is left sending queries on the shared loop
+        for task in (producer, *workers):
+            task.cancel()
+        await asyncio.gather(producer, *workers, return_exceptions=True)
+
+async def join_students_courses_asynchronously(
+    anthology_api_key: str, anthology_base_url: str, term_id: int, student_ids: list[int], join
+) -> list[dict]:
+    # join(student_course: StudentCourseRow) -> the output row, or None to skip it. Each course is joined as it
+    # arrives, the raw StudentCourses rows are never held all at once
+    student_courses_data = []
+    student_courses = get_students_courses_asynchronously(anthology_api_key, anthology_base_url, term_id, student_ids)
+    try:
+        async for student_course in student_courses:
+            student_course_data = join(student_course)
+            if student_course_data is not None:
+                student_courses_data.append(student_course_data)
+    finally:
+        # a failing join() leaves the generator suspended, close it now rather than whenever it's collected
+        await student_courses.aclose()
+
+    return student_courses_data
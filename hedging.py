@@ -0,0 +1,72 @@
+import asyncio
+import logging
+import os
+
+from http_metrics import get_current_metrics, get_endpoint_name, percentile
+
+
+# app settings. Hedging is off unless HEDGED_REQUESTS_PERCENTILE is set, eg HEDGED_REQUESTS_PERCENTILE=95 sends a
+# duplicate of any request still running after the endpoint's p95 latency so far in the invocation
+HEDGE_PERCENTILE_SETTING = "HEDGED_REQUESTS_PERCENTILE"
+# at most this share of the invocation's requests are hedged, so a slow upstream doesn't get twice the load
+HEDGE_MAX_RATE_SETTING = "HEDGED_REQUESTS_MAX_RATE"
+
+# don't hedge until the endpoint has this many latencies to take the percentile from, and only look at the most
+# recent ones so the delay follows the upstream during long runs
+MIN_LATENCY_SAMPLES = 20
+RECENT_LATENCY_SAMPLES = 200
+
+
+async def send_hedged(send, url):
+    # send() returns a coroutine making one attempt, eg lambda: client.get(url, ...). Only for idempotent requests
+    hedge_delay = get_hedge_delay(url)
+    if hedge_delay is None:
+        return await send()
+
+    first = asyncio.ensure_future(send())
+    pending = {first}
+    try:
+        done, _ = await asyncio.wait(pending, timeout=hedge_delay)
+        if done or not consume_hedge_budget(url):
+            return await first
+
+        pending.add(asyncio.ensure_future(send()))
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            # the first response wins, a failure only counts once both attempts failed
+            succeeded = [attempt for attempt in done if attempt.exception() is None]
+            if succeeded:
+                return succeeded[0].result()
+            if not pending:
+                return done.pop().result()
+    finally:
+        # the losers, or every attempt when the caller was cancelled. Wait for them to unwind so their latency so far
+        # is recorded (see http_client), leaving out the slow ones would drift the hedge delay lower
+        cancelled = [attempt for attempt in pending if not attempt.done()]
+        for attempt in cancelled:
+            attempt.cancel()
+        await asyncio.gather(*cancelled, return_exceptions=True)
+
+
+def get_hedge_delay(url) -> float:
+    # seconds to wait before hedging, or None to not hedge
+    target_percentile = float(os.environ.get(HEDGE_PERCENTILE_SETTING) or 0)
+    if not target_percentile:
+        return None
+
+    latencies = get_current_metrics().get_recent_latencies(get_endpoint_name(url), RECENT_LATENCY_SAMPLES)
+    if len(latencies) < MIN_LATENCY_SAMPLES:
+        return None
+
+    return percentile(sorted(latencies), target_percentile) / 1000
+
+
+def consume_hedge_budget(url) -> bool:
+    metrics = get_current_metrics()
+    if metrics.hedges >= float(os.environ.get(HEDGE_MAX_RATE_SETTING) or 0.05) * metrics.requests:
+        return False
+
+    endpoint = get_endpoint_name(url)
+    metrics.record_hedge(endpoint)
+    logging.debug(f"hedging a slow request to {endpoint}")
+    return True
@@ -0,0 +1,187 @@
+import asyncio
+import atexit
+import contextvars
+import httpx
+import threading
+import time
+import weakref
+from urllib.parse import urlsplit
+
+from circuit_breaker import CircuitOpenError, get_circuit_breaker, is_upstream_failure
+from http_metrics import get_current_metrics, get_endpoint_name
+
+
+# drop-in httpx clients that record per-endpoint request counts, latency, bytes + status codes for the invocation, and
+# go through the upstream host's circuit breaker
+
+
+class InstrumentedClient(httpx.Client):
+    def send(self, request: httpx.Request, **kwargs) -> httpx.Response:
+        circuit_breaker = get_circuit_breaker(get_host(request.url))
+        start = time.perf_counter()
+        try:
+            circuit_breaker.before_request()
+            response = super().send(request, **kwargs)
+        except CircuitOpenError:
+            record_response(request, start, "circuit_open")
+            raise
+        except Exception as err:
+            circuit_breaker.record_result(is_upstream_failure(error=err))
+            record_response(request, start, f"error:{type(err).__name__}")
+            raise
+
+        circuit_breaker.record_result(is_upstream_failure(response))
+        record_response(request, start, str(response.status_code), response)
+        return response
+
+
+class InstrumentedAsyncClient(httpx.AsyncClient):
+    async def send(self, request: httpx.Request, **kwargs) -> httpx.Response:
+        circuit_breaker = get_circuit_breaker(get_host(request.url))
+        start = time.perf_counter()
+        try:
+            circuit_breaker.before_request()
+            response = await super().send(request, **kwargs)
+        except CircuitOpenError:
+            record_response(request, start, "circuit_open")
+            raise
+        except asyncio.CancelledError:
+            # says nothing about the upstream, but a half-open probe slot has to be given back. The latency so far is
+            # still recorded, the upstream took at least that long (eg the slow attempt of a hedged request)
+            circuit_breaker.record_cancelled()
+            record_response(request, start, "cancelled")
+            raise
+        except Exception as err:
+            circuit_breaker.record_result(is_upstream_failure(error=err))
+            record_response(request, start, f"error:{type(err).__name__}")
+            raise
+
+        circuit_breaker.record_result(is_upstream_failure(response))
+        record_response(request, start, str(response.status_code), response)
+        return response
+
+
+def record_response(request: httpx.Request, start: float, status: str, response: httpx.Response = None) -> None:
+    latency_ms = (time.perf_counter() - start) * 1000
+    # non-streamed responses are already read by the time send() returns, so this is the full (compressed) body
+    bytes_received = 0
+    if response is not None:
+        try:
+            bytes_received = response.num_bytes_downloaded or len(response.content)
+        except httpx.ResponseNotRead:
+            pass
+
+    get_current_metrics().record_request(get_endpoint_name(request.url), latency_ms, status, bytes_received)
+
+
+# worker-level pools, one client per upstream host, reused across invocations so pages, chunks + retries keep their
+# TCP/TLS connections instead of reconnecting every time
+MAX_CONNECTIONS = 50
+MAX_KEEPALIVE_CONNECTIONS = 20
+# below the ~4 minute idle timeout of the Azure load balancers, so pooled connections aren't silently dropped
+KEEPALIVE_EXPIRY = 60.0
+# connect retries only, request retries stay with the callers
+CONNECT_RETRIES = 3
+
+try:
+    import h2  # noqa: F401
+
+    # multiplex the concurrent chunks over a single connection where the upstream negotiates HTTP/2 over TLS
+    HTTP2 = True
+except ImportError:
+    HTTP2 = False
+
+clients = {}
+async_clients = weakref.WeakKeyDictionary()
+clients_lock = threading.Lock()
+
+background_loop = None
+background_loop_lock = threading.Lock()
+
+
+def get_limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=MAX_CONNECTIONS,
+        max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=KEEPALIVE_EXPIRY,
+    )
+
+
+def get_host(url) -> str:
+    parts = urlsplit(str(url))
+    return f"{parts.scheme}://{parts.netloc}"
+
+
+def get_client(url) -> InstrumentedClient:
+    # httpx.Client is safe to share between the worker's threads, so every sync invocation uses the same pool
+    host = get_host(url)
+    with clients_lock:
+        if host not in clients or clients[host].is_closed:
+            transport = httpx.HTTPTransport(http2=HTTP2, limits=get_limits(), retries=CONNECT_RETRIES)
+            clients[host] = InstrumentedClient(transport=transport)
+        return clients[host]
+
+
+def get_async_client(url, pool: str = None) -> InstrumentedAsyncClient:
+    # async connections belong to the event loop that opened them, so pool per loop. Coroutines run through
+    # run_async() all share the background loop, and therefore its clients. Lookups running side by side against the
+    # same host can each take their own named pool: httpcore's bookkeeping per request grows with the connections +
+    # waiting requests of the pool, one pool serving them all spends more CPU on that than on the requests
+    loop = asyncio.get_running_loop()
+    key = (get_host(url), pool)
+    with clients_lock:
+        loop_clients = async_clients.setdefault(loop, {})
+        if key not in loop_clients or loop_clients[key].is_closed:
+            transport = httpx.AsyncHTTPTransport(http2=HTTP2, limits=get_limits(), retries=CONNECT_RETRIES)
+            loop_clients[key] = InstrumentedAsyncClient(transport=transport)
+        return loop_clients[key]
+
+
+def get_background_loop() -> asyncio.AbstractEventLoop:
+    global background_loop
+    with background_loop_lock:
+        if background_loop is None or background_loop.is_closed():
+            background_loop = asyncio.new_event_loop()
+            threading.Thread(target=background_loop.run_forever, name="http-client-loop", daemon=True).start()
+        return background_loop
+
+
+def run_async(coroutine):
+    # drop-in for asyncio.run() that keeps one long-lived loop per worker, so the async pools outlive invocations.
+    # The invocation's context (metrics, log stage) is carried over to the coroutine
+    loop = get_background_loop()
+    try:
+        running_loop = asyncio.get_running_loop()
+    except RuntimeError:
+        running_loop = None
+    if running_loop is loop:
+        raise RuntimeError("run_async() would deadlock when called from a coroutine on the background loop")
+
+    context = contextvars.copy_context()
+    return asyncio.run_coroutine_threadsafe(run_in_context(coroutine, context), loop).result()
+
+
+async def run_in_context(coroutine, context: contextvars.Context):
+    for var, value in context.items():
+        var.set(value)
+    return await coroutine
+
+
+def close_clients() -> None:
+    with clients_lock:
+        for client in clients.values():
+            client.close()
+        clients.clear()
+
+    if background_loop is not None and not background_loop.is_closed():
+        loop_clients = list(async_clients.get(background_loop, {}).values())
+        if loop_clients:
+            asyncio.run_coroutine_threadsafe(close_async_clients(loop_clients), background_loop).result(timeout=5.0)
+        background_loop.call_soon_threadsafe(background_loop.stop)
+
+
+async def close_async_clients(loop_clients: list) -> None:
+    await asyncio.gather(*[client.aclose() for client in loop_clients], return_exceptions=True)
+
+
+atexit.register(close_clients)
@@ -0,0 +1,180 @@
+import json
+import logging
+import re
+import threading
+import time
+from contextvars import ContextVar
+from urllib.parse import urlsplit
+
+from payload_logging import set_log_stage
+
+
+# upper bounds (ms) of the latency histogram buckets, anything slower lands in the overflow bucket
+LATENCY_BUCKETS_MS = (50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+
+class EndpointMetrics:
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.retries = 0
+        self.retries_denied = 0
+        self.hedges = 0
+        self.bytes_received = 0
+        self.status_codes = {}
+        self.latencies_ms = []
+
+    def summary(self) -> dict:
+        latencies = sorted(self.latencies_ms)
+
+        histogram = {f"<={bucket}": 0 for bucket in LATENCY_BUCKETS_MS}
+        histogram[f">{LATENCY_BUCKETS_MS[-1]}"] = 0
+        for latency in latencies:
+            bucket = next((f"<={bucket}" for bucket in LATENCY_BUCKETS_MS if latency <= bucket), None)
+            histogram[bucket or f">{LATENCY_BUCKETS_MS[-1]}"] += 1
+
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "retries": self.retries,
+            "retries_denied": self.retries_denied,
+            "hedges": self.hedges,
+            "bytes_received": self.bytes_received,
+            "status_codes": dict(self.status_codes),
+            "latency_ms": {
+                "p50": percentile(latencies, 50),
+                "p90": percentile(latencies, 90),
+                "p99": percentile(latencies, 99),
+                "max": round(latencies[-1], 1) if latencies else None,
+                "total": round(sum(latencies), 1),
+                "histogram": histogram,
+            },
+        }
+
+
+class InvocationMetrics:
+    def __init__(self, function_name: str):
+        self.function_name = function_name
+        self.started_at = time.perf_counter()
+        self.endpoints = {}
+        # totals across endpoints, for the retry budget + hedge rate cap
+        self.requests = 0
+        self.retries = 0
+        self.hedges = 0
+        self.lock = threading.Lock()
+
+    def get_endpoint(self, endpoint: str) -> EndpointMetrics:
+        if endpoint not in self.endpoints:
+            self.endpoints[endpoint] = EndpointMetrics()
+        return self.endpoints[endpoint]
+
+    def record_request(self, endpoint: str, latency_ms: float, status: str, bytes_received: int = 0) -> None:
+        with self.lock:
+            self.requests += 1
+            endpoint_metrics = self.get_endpoint(endpoint)
+            endpoint_metrics.requests += 1
+            endpoint_metrics.bytes_received += bytes_received
+            endpoint_metrics.latencies_ms.append(latency_ms)
+            endpoint_metrics.status_codes[status] = endpoint_metrics.status_codes.get(status, 0) + 1
+            # a cancelled request was given up on by the caller, not failed by the upstream
+            if status != "cancelled" and (not status.isdigit() or int(status) >= 400):
+                endpoint_metrics.errors += 1
+
+    def record_retry(self, endpoint: str) -> None:
+        with self.lock:
+            self.retries += 1
+            self.get_endpoint(endpoint).retries += 1
+
+    def record_retry_denied(self, endpoint: str) -> None:
+        with self.lock:
+            self.get_endpoint(endpoint).retries_denied += 1
+
+    def record_hedge(self, endpoint: str) -> None:
+        with self.lock:
+            self.hedges += 1
+            self.get_endpoint(endpoint).hedges += 1
+
+    def get_recent_latencies(self, endpoint: str, count: int) -> list:
+        with self.lock:
+            if endpoint not in self.endpoints:
+                return []
+            return self.endpoints[endpoint].latencies_ms[-count:]
+
+    def summary(self) -> dict:
+        with self.lock:
+            return {
+                "function_name": self.function_name,
+                "duration_ms": round((time.perf_counter() - self.started_at) * 1000, 1),
+                "endpoints": {endpoint: metrics.summary() for endpoint, metrics in sorted(self.endpoints.items())},
+            }
+
+
+current_metrics = ContextVar("current_metrics", default=None)
+
+# callables receiving each invocation's summary dict, see register_exporter
+exporters = []
+
+
+def log_exporter(summary: dict) -> None:
+    logging.info(f"http_metrics: {json.dumps(summary)}")
+
+
+def register_exporter(exporter) -> None:
+    exporters.append(exporter)
+
+
+register_exporter(log_exporter)
+
+
+def start_invocation(function_name: str) -> InvocationMetrics:
+    set_log_stage(function_name)
+    metrics = InvocationMetrics(function_name)
+    current_metrics.set(metrics)
+    return metrics
+
+
+def get_current_metrics() -> InvocationMetrics:
+    metrics = current_metrics.get()
+    if metrics is None:
+        # requests made outside of a function invocation (scripts, benchmarks) are still counted somewhere
+        metrics = start_invocation("unknown")
+    return metrics
+
+
+def emit_metrics() -> dict:
+    metrics = current_metrics.get()
+    if metrics is None:
+        return None
+
+    # only emit once per invocation
+    current_metrics.set(None)
+    summary = metrics.summary()
+    for exporter in exporters:
+        try:
+            exporter(summary)
+        except Exception as err:
+            logging.exception(err)
+
+    return summary
+
+
+def record_retry(url) -> None:
+    get_current_metrics().record_retry(get_endpoint_name(url))
+
+
+def get_endpoint_name(url) -> str:
+    # collapse ids out of the path so every student/course hits the same logical endpoint, eg
+    # /ds/campusnexus/StudentGroupMembers/CampusNexus.CheckStudentHoldGroup(studentId=123) -> ...CheckStudentHoldGroup()
+    # /api/v1/users/sis_user_id:1023/enrollments -> /api/v1/users/sis_user_id:{id}/enrollments
+    parts = urlsplit(str(url))
+    path = re.sub(r"\([^)]*\)", "()", parts.path)
+    path = re.sub(r"(sis_\w+_id):[^/]+", r"\1:{id}", path)
+    path = re.sub(r"/\d+(?=/|$)", "/{id}", path)
+    return f"{parts.hostname}{path.rstrip('/')}"
+
+
+def percentile(sorted_values: list, pct: float) -> float:
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return round(sorted_values[index], 1)
@@ -0,0 +1,44 @@
+from records import StudentCourseRecord, to_row, to_rows
+
+
+# the course stages pass their rows in one of two forms:
+#   denormalized: {"student_courses": [...]}, one row per course with all of the student's fields copied in
+#   normalized:   {"students": [...], "courses": [...]}, each student once keyed by anthology_student_id + slim course
+#                 rows referencing it, so the student fields aren't carried (and re-copied) once per course
+# GetSisCourseIdsEnrollmentId answers in the normalized form when asked to, the later stages answer in the form they
+# were called with and only join the two tables where a staging table needs both
+
+
+def is_normalized(request) -> bool:
+    return request.courses is not None
+
+
+def get_courses(request) -> list[StudentCourseRecord]:
+    return request.courses if is_normalized(request) else request.student_courses
+
+
+def get_student_lookup(request):
+    # course -> the record holding its student's fields, which is the course itself when denormalized
+    if not is_normalized(request):
+        return lambda course: course
+
+    students_by_id = {student.anthology_student_id: student for student in request.students}
+    return lambda course: students_by_id[course.anthology_student_id]
+
+
+def join_students(request, courses: list[StudentCourseRecord], get_student=None) -> list[dict]:
+    # the denormalized rows of the courses as dicts, for the staging tables that take student + course fields together.
+    # Pass get_student (from get_student_lookup) when joining batch by batch, so the lookup is only built once
+    if not is_normalized(request):
+        return to_rows(courses)
+
+    get_student = get_student or get_student_lookup(request)
+    return [{**to_row(get_student(course)), **to_row(course)} for course in courses]
+
+
+def get_courses_payload(request, courses: list[StudentCourseRecord]) -> dict:
+    # the response rows, in the form the stage was called with
+    if is_normalized(request):
+        return {"students": request.students, "courses": courses}
+    return {"student_courses": courses}
+
@@ -0,0 +1,44 @@
+import httpx
+import logging
+import msgspec
+
+from codec import ODataPage, convert, decode_json
+from retry_policy import send_with_retries_asynchronously
+
+
+async def get_odata_pages(
+    client: httpx.AsyncClient, url: str, headers: dict, params: dict, timeout: float = 60.0, row_type: type = None
+):
+    # yields the `value` of each page, following @odata.nextLink when the server pages the collection. With a
+    # row_type (a Struct from codec.py) the rows are decoded straight into it instead of into dicts
+    while url:
+        response = await send_with_retries_asynchronously(
+            lambda: client.get(url=url, headers=headers, params=params, timeout=timeout), url
+        )
+        if row_type is not None:
+            page = decode_odata_page(response.content, row_type)
+            yield page.value
+            url = page.next_link
+        else:
+            results = response.json()
+            yield results["value"]
+            # the next link already carries the whole query
+            url = results.get("@odata.nextLink")
+        params = None
+
+
+def decode_odata_page(body: bytes, row_type: type) -> ODataPage:
+    try:
+        return decode_json(body, ODataPage[row_type], strict=False)
+    except msgspec.ValidationError as err:
+        # one odd row mustn't fail the whole pull: decode the page as dicts + skip the rows that don't fit row_type
+        logging.warning(f"{row_type.__name__} page didn't decode ({err}), converting its rows one by one")
+
+    page = decode_json(body, ODataPage[dict])
+    rows = []
+    for row in page.value:
+        try:
+            rows.append(convert(row, row_type, strict=False))
+        except msgspec.ValidationError as err:
+            logging.warning(f"skipping {row_type.__name__} {str(row)[:200]}: {err}")
+    return ODataPage(value=rows, next_link=page.next_link)
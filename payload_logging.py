@@ -0,0 +1,67 @@
+import json
+import logging
+import msgspec
+import os
+from contextvars import ContextVar
+from itertools import islice
+
+
+# by default only the size of a payload and a short sample are logged
+SAMPLE_SIZE = 3
+SAMPLE_FIELDS = 10
+MAX_SAMPLE_CHARS = 1000
+
+# app setting listing the stages (function names) that log full payloads instead, eg
+# FULL_PAYLOAD_LOG_STAGES="GetSisCourseIdsEnrollmentId,GetAttendanceData" or FULL_PAYLOAD_LOG_STAGES="*"
+FULL_PAYLOAD_LOG_STAGES_SETTING = "FULL_PAYLOAD_LOG_STAGES"
+
+current_stage = ContextVar("current_stage", default=None)
+
+
+def set_log_stage(stage: str) -> None:
+    current_stage.set(stage)
+
+
+def is_full_payload_stage() -> bool:
+    stages = {stage.strip() for stage in os.environ.get(FULL_PAYLOAD_LOG_STAGES_SETTING, "").split(",")}
+    return "*" in stages or current_stage.get() in stages
+
+
+def log_payload(label: str, payload, level: int = logging.INFO) -> None:
+    # check the level first so nothing is formatted for records that would be dropped anyway
+    logger = logging.getLogger()
+    if not logger.isEnabledFor(level):
+        return
+
+    if is_full_payload_stage():
+        logger.log(level, f"{label}: {json.dumps(payload, default=to_loggable)}")
+        return
+
+    sample = json.dumps(get_sample(payload), default=to_loggable)
+    if len(sample) > MAX_SAMPLE_CHARS:
+        sample = sample[:MAX_SAMPLE_CHARS] + "...(truncated)"
+
+    count = len(payload) if hasattr(payload, "__len__") and not isinstance(payload, str) else 1
+    logger.log(level, f"{label}: count={count}, sample={sample}")
+
+
+def to_loggable(value):
+    # the records of records.py are logged with their set fields, anything else json can't encode as its str()
+    if isinstance(value, msgspec.Struct):
+        return msgspec.to_builtins(value, enc_hook=str)
+    return str(value)
+
+
+def get_sample(payload, depth: int = 0):
+    # nested collections (eg the `students` list inside a request) are sampled as well
+    if depth > 2:
+        return payload
+    if isinstance(payload, msgspec.Struct):
+        payload = msgspec.to_builtins(payload, enc_hook=str)
+    if isinstance(payload, dict):
+        return {key: get_sample(value, depth + 1) for key, value in islice(payload.items(), SAMPLE_FIELDS)}
+    if isinstance(payload, (list, tuple)):
+        return [get_sample(value, depth + 1) for value in payload[:SAMPLE_SIZE]]
+    if isinstance(payload, (set, frozenset)):
+        return list(islice(payload, SAMPLE_SIZE))
+    return payload
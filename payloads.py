@@ -0,0 +1,138 @@
+import azure.functions as func
+import gzip
+import logging
+import msgspec
+
+from codec import convert, decode_json, decode_msgpack, encode_json, encode_msgpack
+from http_metrics import emit_metrics
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+JSON_CONTENT_TYPE = "application/json"
+COLUMNAR_CONTENT_TYPE = "application/x-msgpack-columnar"
+INCLUDE_METRICS_HEADER = "X-Include-Metrics"
+
+# the row-oriented tables passed between pipeline stages, which are sent column by column in the columnar format
+TABLE_KEYS = ("students", "student_courses", "courses", "student_attendance_data", "master_student_tracker_data")
+
+
+def get_request_payload(req: func.HttpRequest, request_type: type):
+    body = decompress(req.get_body(), req.headers.get("Content-Encoding"))
+
+    # decodes + validates the body against the endpoint's request struct in one pass
+    content_type = (req.headers.get("Content-Type") or JSON_CONTENT_TYPE).split(";")[0].strip().lower()
+    if content_type == COLUMNAR_CONTENT_TYPE:
+        return convert(from_columnar(decode_msgpack(body)), request_type)
+
+    return decode_json(body, request_type)
+
+
+def get_response(
+    payload: dict, req: func.HttpRequest, status_code: int = 200, errors: list = None
+) -> func.HttpResponse:
+    # the per-record failures of a partial_results call, see fan_out.fan_out()
+    if errors is not None:
+        payload = {**payload, "errors": errors}
+
+    # the invocation's HTTP metrics always go to the registered exporters, and into the body when asked for
+    metrics = emit_metrics()
+    if metrics and (req.headers.get(INCLUDE_METRICS_HEADER) or "").lower() == "true":
+        payload = {**payload, "metrics": metrics}
+
+    # JSON stays the default, the columnar format is only used when the caller asks for it
+    if COLUMNAR_CONTENT_TYPE in (req.headers.get("Accept") or ""):
+        content_type = COLUMNAR_CONTENT_TYPE
+        body = encode_msgpack(to_columnar(payload))
+    else:
+        content_type = JSON_CONTENT_TYPE
+        body = encode_json(payload)
+
+    content_encoding = choose_content_encoding(req.headers.get("Accept-Encoding"))
+    headers = {"Content-Encoding": content_encoding} if content_encoding else {}
+    logging.info(f"response: {len(body)} bytes {content_type}, content encoding {content_encoding or 'identity'}")
+
+    return func.HttpResponse(
+        compress(body, content_encoding), status_code=status_code, headers=headers, mimetype=content_type
+    )
+
+
+def to_columnar(payload: dict) -> dict:
+    # {"students": [{"a": 1, "b": 2}, {"a": 3}]} -> {"students": {"__columns__": {"a": [1, 3], "b": [2, None]},
+    # "__missing__": {"b": [1]}}}. Records only have the columns of their set fields, a row missing a column is sent
+    # as None + listed under __missing__ by its index, so from_columnar() leaves the column out again rather than
+    # setting it to None. Only the sparse columns are listed
+    columnar_payload = {}
+    for key, value in payload.items():
+        if key not in TABLE_KEYS or not isinstance(value, list):
+            columnar_payload[key] = value
+            continue
+
+        value = [msgspec.to_builtins(row) if isinstance(row, msgspec.Struct) else row for row in value]
+        columns = {}
+        for row in value:
+            for column in row:
+                columns.setdefault(column, None)
+        table = {"__columns__": {column: [row.get(column) for row in value] for column in columns}}
+
+        missing = {}
+        for column in columns:
+            indexes = [index for index, row in enumerate(value) if column not in row]
+            if indexes:
+                missing[column] = indexes
+        if missing:
+            table["__missing__"] = missing
+        columnar_payload[key] = table
+
+    return columnar_payload
+
+
+def from_columnar(payload: dict) -> dict:
+    rows_payload = {}
+    for key, value in payload.items():
+        if key not in TABLE_KEYS or not isinstance(value, dict) or "__columns__" not in value:
+            rows_payload[key] = value
+            continue
+
+        columns = value["__columns__"]
+        names = list(columns.keys())
+        rows = [dict(zip(names, row_values)) for row_values in zip(*columns.values())]
+        for column, indexes in (value.get("__missing__") or {}).items():
+            for index in indexes:
+                rows[index].pop(column, None)
+        rows_payload[key] = rows
+
+    return rows_payload
+
+
+def choose_content_encoding(accept_encoding: str) -> str:
+    accepted = {encoding.split(";")[0].strip().lower() for encoding in (accept_encoding or "").split(",")}
+
+    if "zstd" in accepted and zstandard is not None:
+        return "zstd"
+    if "gzip" in accepted:
+        return "gzip"
+    return None
+
+
+def compress(body: bytes, content_encoding: str) -> bytes:
+    if content_encoding == "zstd":
+        return zstandard.ZstdCompressor(level=3).compress(body)
+    if content_encoding == "gzip":
+        return gzip.compress(body, compresslevel=5)
+    return body
+
+
+def decompress(body: bytes, content_encoding: str) -> bytes:
+    content_encoding = (content_encoding or "").strip().lower()
+
+    if content_encoding == "zstd":
+        if zstandard is None:
+            raise ValueError("Content-Encoding zstd requires the zstandard package")
+        return zstandard.ZstdDecompressor().decompressobj().decompress(body)
+    if content_encoding == "gzip":
+        return gzip.decompress(body)
+    return body
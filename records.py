@@ -0,0 +1,79 @@
+import msgspec
+from typing import Any
+
+
+# the students + courses flowing through the stages. The request structs decode them straight from the wire and the
+# get_* modules enrich them in place, instead of every stage rebuilding each row as a dict with {**row, ...}.
+# A field a stage hasn't filled in yet is UNSET and left out of the JSON, exactly like a missing dict key before.
+# The values are kept as the upstream APIs + the orchestrator send them, hence Any. gc=False as they only hold
+# scalars
+UNSET = msgspec.UNSET
+
+
+class StudentRecord(msgspec.Struct, kw_only=True, gc=False):
+    # GetListOfStudents, one record per enrollment period
+    anthology_student_id: Any = UNSET
+    student_enrollment_period_id: Any = UNSET
+    sis_link: Any = UNSET
+    status: Any = UNSET
+    program: Any = UNSET
+    location: Any = UNSET
+    last_date_of_attendance: Any = UNSET
+    enrollment_date: Any = UNSET
+    graduation_date: Any = UNSET
+    # GetStudentNumberEmailFirstLastNames
+    anthology_student_number: Any = UNSET
+    first_name: Any = UNSET
+    last_name: Any = UNSET
+    email: Any = UNSET
+    # GetCanvasStudentId
+    canvas_student_id: Any = UNSET
+    # GetAOSResidency
+    area_of_study: Any = UNSET
+    residency: Any = UNSET
+    # GetPrepProgram
+    prep_program: Any = UNSET
+    americorp_status: Any = UNSET
+    # GetAcademicGraduationHoldRegistrationHold
+    academic_graduation_hold: Any = UNSET
+    registration_hold: Any = UNSET
+    # GetAcademicStatus
+    academic_status: Any = UNSET
+
+
+class StudentCourseRecord(StudentRecord, kw_only=True, gc=False):
+    # a course of the student, with the student's fields copied in (denormalized) or only anthology_student_id set
+    # (a normalized course, see normalized_payload.py)
+    # GetSisCourseIdsEnrollmentId
+    sis_course_id: Any = UNSET
+    class_section_id: Any = UNSET
+    anthology_student_course_id: Any = UNSET
+    # GetStudentsAcademicAdvisor
+    advisor_name: Any = UNSET
+    # GetCanvasCourseName
+    course_name: Any = UNSET
+    canvas_course_id: Any = UNSET
+    canvas_grade_link: Any = UNSET
+    # GetCourseScoreGradeLink
+    current_score: Any = UNSET
+    current_grade: Any = UNSET
+
+
+class AttendanceRecord(msgspec.Struct, kw_only=True, gc=False):
+    # GetAttendanceData
+    attendance_date: Any
+    attended_minutes: Any
+    absent_minutes: Any
+    is_excused_absence: int
+    anthology_student_id: Any
+    course_name: Any
+    class_section_id: Any
+
+
+def to_row(record: msgspec.Struct) -> dict:
+    # the set fields as a dict, for pymssql's %(name)s parameters + the snapshots
+    return msgspec.to_builtins(record)
+
+
+def to_rows(records: list) -> list[dict]:
+    return [msgspec.to_builtins(record) for record in records]
@@ -0,0 +1,152 @@
+import asyncio
+import email.utils
+import httpx
+import itertools
+import logging
+import random
+import time
+
+from hedging import send_hedged
+from http_metrics import get_current_metrics, get_endpoint_name
+
+
+# responses worth another attempt: timeouts, throttling + upstream hiccups. Any other status fails straight away
+RETRYABLE_STATUS_CODES = {408, 425, 429, 500, 502, 503, 504}
+# transport errors worth another attempt, unlike eg an invalid URL or a TLS certificate error
+RETRYABLE_ERRORS = (httpx.TimeoutException, httpx.NetworkError, httpx.RemoteProtocolError)
+
+# retries may add at most this share of the invocation's requests, plus a floor so a small stage can still ride out a
+# hiccup. Once the budget is spent, failures are raised instead of retried, so a degraded upstream isn't hammered
+RETRY_BUDGET_RATIO = 0.1
+MIN_RETRY_BUDGET = 10
+
+
+class RetryPolicy:
+    def __init__(
+        self, max_attempts: int = 4, base_delay: float = 0.05, max_delay: float = 5.0, max_retry_after: float = 60.0
+    ):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        # upper bound on how long a Retry-After header can make us wait
+        self.max_retry_after = max_retry_after
+
+    def get_delay(self, previous_delay: float, response: httpx.Response = None) -> float:
+        # decorrelated jitter, so the requests of a failed chunk don't all retry in lockstep
+        delay = min(self.max_delay, random.uniform(self.base_delay, previous_delay * 3))
+
+        retry_after = get_retry_after(response) if response is not None else None
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.max_retry_after))
+
+        return delay
+
+
+DEFAULT_RETRY_POLICY = RetryPolicy()
+
+
+def send_with_retries(
+    send, url, policy: RetryPolicy = DEFAULT_RETRY_POLICY, ok_status_codes: tuple = ()
+) -> httpx.Response:
+    # send() makes one attempt, eg lambda: client.get(url, ...). Returns the first successful response (or one with
+    # a status in ok_status_codes), raises once the failure isn't retryable, the attempts or the retry budget run out
+    delay = policy.base_delay
+    for attempt in itertools.count(1):
+        try:
+            response = send()
+        except Exception as err:
+            delay = get_next_delay(policy, url, attempt, delay, error=err)
+            if delay is None:
+                raise
+        else:
+            if response.is_success or response.status_code in ok_status_codes:
+                return response
+            delay = get_next_delay(policy, url, attempt, delay, response=response)
+            if delay is None:
+                response.raise_for_status()
+
+        time.sleep(delay)
+
+
+async def send_with_retries_asynchronously(
+    send, url, policy: RetryPolicy = DEFAULT_RETRY_POLICY, ok_status_codes: tuple = (), hedge: bool = False
+) -> httpx.Response:
+    # same as send_with_retries(), for send() returning a coroutine, eg lambda: client.get(url, ...). With hedge=True
+    # each attempt is hedged when HEDGED_REQUESTS_PERCENTILE is set, see hedging.py
+    delay = policy.base_delay
+    for attempt in itertools.count(1):
+        try:
+            response = await (send_hedged(send, url) if hedge else send())
+        except Exception as err:
+            delay = get_next_delay(policy, url, attempt, delay, error=err)
+            if delay is None:
+                raise
+        else:
+            if response.is_success or response.status_code in ok_status_codes:
+                return response
+            delay = get_next_delay(policy, url, attempt, delay, response=response)
+            if delay is None:
+                response.raise_for_status()
+
+        await asyncio.sleep(delay)
+
+
+def get_next_delay(
+    policy: RetryPolicy,
+    url,
+    attempt: int,
+    previous_delay: float,
+    response: httpx.Response = None,
+    error: Exception = None,
+) -> float:
+    # seconds to wait before the next attempt, or None when the caller should give up
+    reason = get_retry_reason(response, error)
+    if reason is None or attempt >= policy.max_attempts:
+        return None
+
+    endpoint = get_endpoint_name(url)
+    if not consume_retry_budget(endpoint):
+        logging.warning(f"retry budget spent, not retrying {endpoint} after {reason}")
+        return None
+
+    delay = policy.get_delay(previous_delay, response)
+    logging.warning(f"attempt {attempt} of {endpoint} failed with {reason}, retrying in {delay:.2f}s")
+
+    return delay
+
+
+def get_retry_reason(response: httpx.Response = None, error: Exception = None) -> str:
+    # why the failed attempt is worth repeating, or None when it isn't
+    if error is not None:
+        return type(error).__name__ if isinstance(error, RETRYABLE_ERRORS) else None
+    if response.status_code in RETRYABLE_STATUS_CODES:
+        return f"status {response.status_code}"
+    return None
+
+
+def consume_retry_budget(endpoint: str) -> bool:
+    metrics = get_current_metrics()
+    if metrics.retries >= max(MIN_RETRY_BUDGET, RETRY_BUDGET_RATIO * metrics.requests):
+        metrics.record_retry_denied(endpoint)
+        return False
+
+    metrics.record_retry(endpoint)
+    return True
+
+
+def get_retry_after(response: httpx.Response) -> float:
+    # Retry-After is either a number of seconds or an HTTP date
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
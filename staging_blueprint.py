@@ -0,0 +1,345 @@
+import azure.functions as func
+import logging
+import json
+import traceback
+
+from codec import (
+    AttendanceDataRequest,
+    CourseScoreGradeLinkRequest,
+    MasterStudentTrackerRequest,
+)
+from payloads import get_request_payload, get_response
+from http_metrics import emit_metrics, start_invocation
+from payload_logging import log_payload
+from records import AttendanceRecord, to_rows
+from staging_writer import StagingTable, StagingWriter
+
+
+bp = func.Blueprint()
+
+
+###############################################
+# Scope2 - Part1a - Get Course Score Grade Link
+###############################################
+
+
+@bp.function_name(name="GetCourseScoreGradeLink")
+@bp.route(route="", auth_level=func.AuthLevel.FUNCTION)
+def get_course_score_grade_link(req: func.HttpRequest) -> func.HttpResponse:
+    try:
+        start_invocation("GetCourseScoreGradeLink")
+        from get_course_score_grade_link import get_canvas_enrollments_in_bulk_asynchronously
+        from http_client import run_async
+        from fan_out import filter_retry_ids
+        from checkpoints import checkpointed
+        from normalized_payload import get_courses, get_courses_payload, get_student_lookup, join_students
+
+        request = get_request_payload(req, CourseScoreGradeLinkRequest)
+        canvas_bearer_token = request.canvas_bearer_token
+        # logging.info(f"request: {json.dumps(request)}")
+        canvas_base_url = request.canvas_base_url
+        get_student = get_student_lookup(request)
+        student_courses = filter_retry_ids(
+            get_courses(request), "anthology_student_number", request.retry_ids, get_record=get_student
+        )
+        database_connector = request.database_connector
+        errors = [] if request.partial_results else None
+
+        # first, generate course_dict to filter Canvas enrollments later
+        student_course_dict = {}
+        for course in student_courses:
+            student_number = get_student(course).anthology_student_number
+            course_id = course.sis_course_id
+            student_course_dict.setdefault(student_number, []).append(course_id)
+        log_payload("student_course_dict", student_course_dict)
+
+        # the courses to merge each student's Canvas enrollments into
+        courses_by_student_number = {}
+        for course in student_courses:
+            # this should only happen in test Canvas
+            if not course.course_name:
+                continue
+            courses_by_student_number.setdefault(get_student(course).anthology_student_number, []).append(course)
+
+        sql_statement_merge_insert_staging_student_course_performance = """
+            MERGE INTO staging_student_course_performance AS target 
+            USING (VALUES (%(anthology_student_id)d, %(course_name)s, %(current_score)d, %(current_grade)s, %(canvas_grade_link)s, %(class_section_id)d)) AS SOURCE (anthology_student_id, course_name, current_score, current_grade, canvas_grade_link, class_section_id)
+            ON 
+                target.anthology_student_id = SOURCE.anthology_student_id AND 
+                target.course_name = SOURCE.course_name
+            WHEN NOT MATCHED THEN 
+                INSERT (anthology_student_id, course_name, current_score, current_grade, canvas_grade_link, class_section_id)
+                VALUES (SOURCE.anthology_student_id, SOURCE.course_name, SOURCE.current_score, SOURCE.current_grade, SOURCE.canvas_grade_link, SOURCE.class_section_id);
+        """
+
+        sql_statement_merge_insert_staging_student_info = """
+            MERGE INTO staging_student_info AS target 
+            USING (VALUES (%(anthology_student_id)d, %(anthology_student_number)d, %(canvas_student_id)d, %(first_name)s, %(last_name)s, %(email)s, %(advisor_name)s)) AS SOURCE (anthology_student_id, anthology_student_number, canvas_student_id, first_name, last_name, email, advisor_name)
+            ON 
+                target.anthology_student_id = SOURCE.anthology_student_id 
+            WHEN MATCHED THEN
+                UPDATE SET 
+                    target.anthology_student_number = SOURCE.anthology_student_number, 
+                    target.canvas_student_id = SOURCE.canvas_student_id, 
+                    target.first_name = SOURCE.first_name, 
+                    target.last_name = SOURCE.last_name, 
+                    target.email = SOURCE.email, 
+                    target.advisor_name = SOURCE.advisor_name
+            WHEN NOT MATCHED THEN 
+                INSERT (anthology_student_id, anthology_student_number, canvas_student_id, first_name, last_name, email, advisor_name)
+                VALUES (SOURCE.anthology_student_id, SOURCE.anthology_student_number, SOURCE.canvas_student_id, SOURCE.first_name, SOURCE.last_name, SOURCE.email, SOURCE.advisor_name);
+        """
+
+        # second, query Canvas API. Each chunk of students is merged + handed to the writer as soon as it's in, so the
+        # staging tables are written while the next chunk is fetched instead of after all of them
+        streamed_student_numbers = set()
+
+        def merge_and_write(list_of_enrollment_data: list) -> None:
+            # the Canvas score, grade + grade link replace the course's. Both tables take student + course fields
+            merged_courses = []
+            for enrollment_data in list_of_enrollment_data:
+                for anthology_student_number, course_data in enrollment_data.items():
+                    streamed_student_numbers.add(anthology_student_number)
+                    for course in courses_by_student_number.get(anthology_student_number, []):
+                        for field, value in course_data[course.sis_course_id].items():
+                            setattr(course, field, value)
+                        merged_courses.append(course)
+            writer.write(join_students(request, merged_courses, get_student))
+
+        # the two tables are loaded side by side. staging_student_info gets a row per course of the student, the
+        # writer only sends the last one + only when it differs from the stored row
+        staging_tables = [
+            StagingTable(
+                "staging_student_course_performance",
+                sql_statement_merge_insert_staging_student_course_performance,
+                key_columns=("anthology_student_id", "course_name"),
+            ),
+            StagingTable(
+                "staging_student_info",
+                sql_statement_merge_insert_staging_student_info,
+                key_columns=("anthology_student_id",),
+                update_columns=(
+                    "anthology_student_number",
+                    "canvas_student_id",
+                    "first_name",
+                    "last_name",
+                    "email",
+                    "advisor_name",
+                ),
+            ),
+        ]
+
+        # the stored rows of every student are read while the first chunks are fetched
+        student_ids = {course.anthology_student_id for course in student_courses}
+        with checkpointed(request, database_connector=database_connector) as run:
+            with StagingWriter(database_connector, staging_tables, student_ids) as writer:
+                list_of_canvas_enrollment_data = run_async(
+                    get_canvas_enrollments_in_bulk_asynchronously(
+                        canvas_bearer_token,
+                        canvas_base_url,
+                        student_course_dict,
+                        errors=errors,
+                        checkpoint=run.checkpoint,
+                        on_results=merge_and_write,
+                    )
+                )
+
+                if run.checkpoint is not None and not run.stopped:
+                    # students completed by an earlier invocation of the run come from the checkpoint. The last
+                    # invocation writes them again in case one was killed before its writer committed them (the
+                    # MERGEs are idempotent)
+                    merge_and_write(
+                        [
+                            enrollment_data
+                            for enrollment_data in list_of_canvas_enrollment_data
+                            if not streamed_student_numbers.issuperset(enrollment_data)
+                        ]
+                    )
+            log_payload("list_of_canvas_enrollment_data", list_of_canvas_enrollment_data)
+
+            # third, the courses of the students whose Canvas lookup succeeded, in their original order. Students
+            # whose lookup failed aren't written to the staging tables. Out of time, the students done so far are
+            # written + the rest are fetched + written by the invocation continuing the run
+            modified_student_courses_data = [
+                course
+                for course in student_courses
+                if course.course_name and get_student(course).anthology_student_number in streamed_student_numbers
+            ]
+
+            return run.get_response(
+                get_courses_payload(request, modified_student_courses_data),
+                len(student_course_dict),
+                req,
+                errors=errors,
+            )
+
+    except Exception as err:
+        logging.exception(err)
+        emit_metrics()
+        return func.HttpResponse(json.dumps(traceback.format_exc(), default=str), status_code=400)
+
+
+########################################
+# Scope2 - Part1b - Get Attendance Data
+########################################
+
+
+@bp.function_name(name="GetAttendanceData")
+@bp.route(route="", auth_level=func.AuthLevel.FUNCTION)
+def get_attendance_data(req: func.HttpRequest) -> func.HttpResponse:
+    try:
+        start_invocation("GetAttendanceData")
+        from get_attendance_data import get_anthology_attendance_data
+        from normalized_payload import get_courses
+
+        request = get_request_payload(req, AttendanceDataRequest)
+        anthology_api_key = request.anthology_api_key
+        # canvas_bearer_token = request.pop("canvas_bearer_token")
+        # logging.info(f"request: {json.dumps(request)}")
+        anthology_base_url = request.anthology_base_url
+        # canvas_base_url = request["canvas_base_url"]
+        thirty_days_ago_datetime = request.thirty_days_ago_datetime
+        database_connector = request.database_connector
+        # only course fields are used, so the normalized courses are taken as they are
+        student_courses = get_courses(request)
+
+        # first, get list of student course ids
+        # student_course_id_set = {course["anthology_student_course_id"] for course in student_courses}
+        student_course_id_dict = {course.anthology_student_course_id: course for course in student_courses}
+        log_payload("student_course_id_dict", student_course_id_dict)
+
+        list_of_attendance_data = get_anthology_attendance_data(
+            anthology_api_key, anthology_base_url, thirty_days_ago_datetime
+        )
+        logging.info(f"len(list_of_attendance_data): {len(list_of_attendance_data)}")
+
+        student_attendance_data = [
+            AttendanceRecord(
+                attendance_date=attendance.AttendanceDate,
+                attended_minutes=attendance.Attended,
+                absent_minutes=attendance.Absent,
+                is_excused_absence=1 if attendance.IsExcusedAbsence else 0,
+                anthology_student_id=course.anthology_student_id,
+                course_name=course.course_name,
+                class_section_id=course.class_section_id,
+            )
+            for attendance in list_of_attendance_data
+            if (course := student_course_id_dict.get(attendance.StudentCourseId)) is not None
+        ]
+
+        log_payload("student_attendance_data", student_attendance_data)
+
+        # add data into staging tables
+        sql_statement_merge_insert_staging_student_course_attendance = """
+            MERGE INTO staging_student_course_attendance AS target 
+            USING (VALUES (%(anthology_student_id)d, %(course_name)s, %(attendance_date)s, %(attended_minutes)d, %(absent_minutes)d, %(is_excused_absence)d, %(class_section_id)d)) AS SOURCE (anthology_student_id, course_name, attendance_date, attended_minutes, absent_minutes, is_excused_absence, class_section_id)
+            ON 
+                target.anthology_student_id = SOURCE.anthology_student_id AND 
+                target.course_name = SOURCE.course_name AND
+                target.attendance_date = SOURCE.attendance_date
+            WHEN NOT MATCHED THEN 
+                INSERT (anthology_student_id, course_name, attendance_date, attended_minutes, absent_minutes, is_excused_absence, class_section_id)
+                VALUES (SOURCE.anthology_student_id, SOURCE.course_name, SOURCE.attendance_date, SOURCE.attended_minutes, SOURCE.absent_minutes, SOURCE.is_excused_absence, SOURCE.class_section_id);
+        """
+
+        # no key_columns, so every row is sent + the MERGE's ON does the matching: attendance_date comes from Anthology
+        # as an ISO string while the table stores a date, so stored + new keys can't be compared client side
+        staging_table = StagingTable(
+            "staging_student_course_attendance", sql_statement_merge_insert_staging_student_course_attendance
+        )
+        with StagingWriter(database_connector, [staging_table]) as writer:
+            writer.write(to_rows(student_attendance_data))
+
+        return get_response({"student_attendance_data": student_attendance_data}, req)
+
+    except Exception as err:
+        logging.exception(err)
+        emit_metrics()
+        return func.HttpResponse(json.dumps(traceback.format_exc(), default=str), status_code=400)
+
+
+#######################################################
+# Scope2 - Part1c - Insert Master Student Tracker Data
+#######################################################
+
+
+@bp.function_name(name="CalculateAndInsertMasterStudentTrackerData")
+@bp.route(route="", auth_level=func.AuthLevel.FUNCTION)
+def calculate_and_insert_master_student_tracker_data(req: func.HttpRequest) -> func.HttpResponse:
+    try:
+        start_invocation("CalculateAndInsertMasterStudentTrackerData")
+        from normalized_payload import get_courses, get_student_lookup
+
+        request = get_request_payload(req, MasterStudentTrackerRequest)
+        database_connector = request.database_connector
+        student_courses = get_courses(request)
+        get_student = get_student_lookup(request)
+
+        master_student_tracker_data = []
+        seen = set()
+        for student_course in student_courses:
+            student = get_student(student_course)
+            if student.anthology_student_id not in seen:
+                master_student_tracker_data.append(
+                    {
+                        "anthology_student_id": student.anthology_student_id,
+                        "sis_link": student.sis_link,
+                        "program": student.program,
+                        "area_of_study": student.area_of_study,
+                        "residency": student.residency,
+                        "location": student.location,
+                        "prep_program": student.prep_program,
+                        "academic_graduation_hold": 1 if student.academic_graduation_hold else 0,
+                        "registration_hold": 1 if student.registration_hold else 0,
+                        "americorp_status": student.americorp_status,
+                        "academic_status": student.academic_status,
+                        "last_date_of_attendance": student.last_date_of_attendance,
+                        "enrollment_date": student.enrollment_date,
+                        "graduation_date": student.graduation_date,
+                    }
+                )
+            seen.add(student.anthology_student_id)
+
+        # add data into staging tables
+        sql_statement_merge_insert_staging_master_student_tracker = """
+            MERGE INTO staging_master_student_tracker AS target 
+
+            USING (VALUES (
+                %(anthology_student_id)d, 
+                %(sis_link)s, 
+                %(program)s, 
+                %(area_of_study)s, 
+                %(residency)s, 
+                %(location)s, 
+                %(prep_program)s, 
+                %(academic_graduation_hold)d, 
+                %(registration_hold)d, 
+                %(americorp_status)s, 
+                %(academic_status)s,
+                %(last_date_of_attendance)s, 
+                %(enrollment_date)s, 
+                %(graduation_date)s
+            )) AS SOURCE (anthology_student_id, sis_link, program, area_of_study, residency, location, prep_program, academic_graduation_hold, registration_hold, americorp_status, academic_status, last_date_of_attendance, enrollment_date, graduation_date)
+            
+            ON target.anthology_student_id = SOURCE.anthology_student_id
+
+            WHEN NOT MATCHED THEN 
+                INSERT (anthology_student_id, sis_link, program, area_of_study, residency, location, prep_program, academic_graduation_hold, registration_hold, americorp_status, academic_status, last_date_of_attendance, enrollment_date, graduation_date)
+                VALUES (source.anthology_student_id, source.sis_link, source.program, source.area_of_study, source.residency, source.location, source.prep_program, source.academic_graduation_hold, source.registration_hold, source.americorp_status, source.academic_status, source.last_date_of_attendance, source.enrollment_date, source.graduation_date);
+        """
+
+        # only the students not in the table yet are sent
+        staging_table = StagingTable(
+            "staging_master_student_tracker",
+            sql_statement_merge_insert_staging_master_student_tracker,
+            key_columns=("anthology_student_id",),
+        )
+        with StagingWriter(database_connector, [staging_table]) as writer:
+            writer.write(master_student_tracker_data)
+
+        return get_response({"master_student_tracker_data": master_student_tracker_data}, req)
+
+    except Exception as err:
+        logging.exception(err)
+        emit_metrics()
+        return func.HttpResponse(json.dumps(traceback.format_exc(), default=str), status_code=400)
@@ -0,0 +1,196 @@
+import logging
+import queue
+import threading
+
+from db_pool import get_connection
+
+
+class StagingTable:
+    # a staging table + the MERGE writing one row to it. key_columns are what the MERGE matches on (starting with
+    # anthology_student_id), update_columns what it sets on a match, none for the insert-only MERGEs. Without
+    # key_columns every row is sent as is
+    def __init__(self, name: str, sql_statement: str, key_columns: tuple = (), update_columns: tuple = ()):
+        self.name = name
+        self.sql_statement = sql_statement
+        self.key_columns = key_columns
+        self.update_columns = update_columns
+
+
+def get_values(row: dict, columns: tuple) -> tuple:
+    return tuple(row[column] for column in columns)
+
+
+def load_stored_rows(cursor, table: StagingTable, student_ids: set, stored_rows: dict) -> None:
+    # adds key -> update column values of the table's rows for student_ids to stored_rows, in one query
+    if not student_ids:
+        return
+
+    cursor.execute(
+        f"SELECT {', '.join(table.key_columns + table.update_columns)} FROM {table.name} "
+        f"WHERE {table.key_columns[0]} IN %s",
+        (tuple(student_ids),),
+    )
+    for row in cursor.fetchall():
+        stored_rows[get_values(row, table.key_columns)] = get_values(row, table.update_columns)
+
+
+def plan_writes(table: StagingTable, rows: list[dict], stored_rows: dict) -> list[dict]:
+    # the rows whose MERGE would change the table: one per key, the one the MERGEs run row by row would have left in
+    # the table, and only when the key is new or its update columns differ from stored_rows. Most of a run's rows are
+    # unchanged from the previous run's, so this is a fraction of them. stored_rows is updated with what's returned,
+    # as that's what the table holds once they're written
+    if not table.key_columns:
+        return rows
+
+    rows_by_key = {}
+    for row in rows:
+        key = get_values(row, table.key_columns)
+        if table.update_columns:
+            # every row is applied over the previous one, the last one stays
+            rows_by_key[key] = row
+        else:
+            # the later rows match the inserted one + are skipped
+            rows_by_key.setdefault(key, row)
+
+    changed_rows = []
+    for key, row in rows_by_key.items():
+        values = get_values(row, table.update_columns)
+        if key not in stored_rows or (table.update_columns and stored_rows[key] != values):
+            changed_rows.append(row)
+            stored_rows[key] = values
+    logging.info(f"{table.name}: writing {len(changed_rows)} of {len(rows)} rows, the rest are unchanged")
+    return changed_rows
+
+
+class StagingWriteError(Exception):
+    def __init__(self, outcomes: dict):
+        # outcomes: table name -> rows committed, or the error that stopped its load
+        summary = "; ".join(
+            f"{name} failed: {outcome!r}" if isinstance(outcome, BaseException) else f"{name} committed {outcome} rows"
+            for name, outcome in outcomes.items()
+        )
+        super().__init__(f"staging load failed: {summary}")
+        self.outcomes = outcomes
+
+
+class TableWriter:
+    # loads one staging table on its own thread + pooled connection. The thread writes whatever has queued up since
+    # its last commit in one go, leaving out the rows plan_writes() finds unchanged. The stored rows are read once per
+    # student: all of student_ids as soon as the connection is open, those of students not in it with their first rows
+    def __init__(self, database_connector: dict, table: StagingTable, student_ids: set = None):
+        self.database_connector = database_connector
+        self.table = table
+        self.student_ids = student_ids or set()
+        # key -> update column values, of the loaded students' rows
+        self.stored_rows = {}
+        self.loaded_student_ids = set()
+        # unbounded: write() is called from the event loop and mustn't block it, the rows are in memory anyway
+        self.queue = queue.Queue()
+        self.error = None
+        self.rows_written = 0
+        self.thread = threading.Thread(target=self.run, name=f"staging-writer-{table.name}", daemon=True)
+        self.thread.start()
+
+    def stop(self) -> None:
+        # waits for the queued rows to be committed
+        self.queue.put(None)
+        self.thread.join()
+
+    def run(self) -> None:
+        try:
+            with get_connection(self.database_connector) as conn:
+                with conn.cursor(as_dict=True) as cursor:
+                    self.load_stored_rows(cursor, self.student_ids)
+                    while (rows := self.get_rows()) is not None:
+                        if self.table.key_columns:
+                            self.load_stored_rows(cursor, {row[self.table.key_columns[0]] for row in rows})
+                        changed_rows = plan_writes(self.table, rows, self.stored_rows)
+                        if changed_rows:
+                            cursor.executemany(self.table.sql_statement, changed_rows)
+                        conn.commit()
+                        self.rows_written += len(changed_rows)
+        except Exception as err:
+            logging.exception(err)
+            self.error = err
+            # keep taking rows until stop() so nothing waits on a dead writer
+            while self.queue.get() is not None:
+                pass
+
+    def load_stored_rows(self, cursor, student_ids: set) -> None:
+        if not self.table.key_columns:
+            return
+        student_ids = student_ids - self.loaded_student_ids
+        load_stored_rows(cursor, self.table, student_ids, self.stored_rows)
+        self.loaded_student_ids |= student_ids
+
+    def get_rows(self) -> list[dict]:
+        # blocks for the next rows, then takes everything else already queued. None once stop() was called
+        rows = self.queue.get()
+        if rows is None:
+            return None
+
+        rows = list(rows)
+        while True:
+            try:
+                more_rows = self.queue.get_nowait()
+            except queue.Empty:
+                return rows
+            if more_rows is None:
+                # write what was taken, then stop at the next get_rows()
+                self.queue.put(None)
+                return rows
+            rows.extend(more_rows)
+
+
+class StagingWriter:
+    # runs the staging MERGEs in the background, so a stage can keep fetching while the rows it already has are
+    # written. Each table is loaded by its own TableWriter, the tables don't depend on each other so the loads run
+    # side by side + a stage's write time is its slowest table's rather than the sum. pymssql has no distributed
+    # transactions, so each table commits on its own: when one fails, the error says which tables were committed
+    # (rerunning the stage is safe, the MERGEs are idempotent)
+    # student_ids: the students the stage will write, when known up front, so their stored rows are read while the
+    # stage is still fetching
+    def __init__(self, database_connector: dict, tables: list[StagingTable], student_ids: set = None):
+        self.table_writers = [TableWriter(database_connector, table, student_ids) for table in tables]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            # the stage failed already (or write() found a failed table), stop the writers without hiding its error
+            self.stop()
+            logging.error(f"staging writer stopped: {self.get_outcomes()}")
+
+    def write(self, rows: list[dict]) -> None:
+        # called from the event loop (fan_out's on_results), so this never waits on the writer threads. A failed table
+        # fails the stage straight away rather than after fetching the rest of it, __exit__ then stops the writers on
+        # the handler's thread
+        outcomes = self.get_outcomes()
+        if any(isinstance(outcome, BaseException) for outcome in outcomes.values()):
+            raise StagingWriteError(outcomes)
+        if rows:
+            for table_writer in self.table_writers:
+                table_writer.queue.put(rows)
+
+    def stop(self) -> None:
+        for table_writer in self.table_writers:
+            table_writer.stop()
+
+    def get_outcomes(self) -> dict:
+        # table name -> rows committed so far, or the error that stopped its load
+        return {
+            table_writer.table.name: table_writer.error or table_writer.rows_written
+            for table_writer in self.table_writers
+        }
+
+    def close(self) -> None:
+        # waits for every table's rows to be committed, raises a StagingWriteError with each table's outcome if any
+        # of them failed
+        self.stop()
+        outcomes = self.get_outcomes()
+        logging.info(f"staging writer: {outcomes}")
+        if any(isinstance(outcome, BaseException) for outcome in outcomes.values()):
+            raise StagingWriteError(outcomes)
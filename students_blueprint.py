@@ -0,0 +1,484 @@
+import azure.functions as func
+import logging
+import json
+import traceback
+
+from codec import (
+    CanvasStudentIdRequest,
+    ListOfStudentsRequest,
+    PrepProgramRequest,
+    StudentEnrichmentRequest,
+    StudentsRequest,
+    TermIdsRequest,
+    loggable,
+)
+from payloads import get_request_payload, get_response
+from http_metrics import emit_metrics, start_invocation
+from payload_logging import log_payload
+from records import StudentRecord
+
+
+bp = func.Blueprint()
+
+
+################################################
+# Scope1 Part1 -- GetAnthologyAndCanvasTermIds
+################################################
+
+
+@bp.function_name(name="GetAnthologyAndCanvasTermIds")
+@bp.route(route="", auth_level=func.AuthLevel.FUNCTION)
+def get_anthology_and_canvas_term_ids(req: func.HttpRequest) -> func.HttpResponse:
+    try:
+        start_invocation("GetAnthologyAndCanvasTermIds")
+        from get_anthology_and_canvas_term_ids import get_term_ids_asynchronously
+        from http_client import run_async
+
+        request = get_request_payload(req, TermIdsRequest)
+        anthology_api_key = request.anthology_api_key
+        canvas_bearer_token = request.canvas_bearer_token
+        anthology_base_url = request.anthology_base_url
+        canvas_base_url = request.canvas_base_url
+        curr_date = request.curr_date
+        exclude_anthology_term_ids = request.exclude_anthology_term_ids
+
+        # the Anthology + Canvas term lists are fetched concurrently, and kept in memory until the next term boundary
+        anthology_term_id, canvas_term_id = run_async(
+            get_term_ids_asynchronously(
+                anthology_api_key,
+                anthology_base_url,
+                canvas_bearer_token,
+                canvas_base_url,
+                curr_date,
+                exclude_anthology_term_ids,
+            )
+        )
+
+        return get_response(
+            {
+                "anthology_term_id": anthology_term_id,
+                "canvas_term_id": canvas_term_id,
+            },
+            req,
+        )
+
+    except Exception as err:
+        logging.exception(err)
+        emit_metrics()
+        return func.HttpResponse(traceback.format_exc(), status_code=400)
+
+
+######################################
+# Scope1 -Part2 - Get List of Students
+######################################
+
+
+@bp.function_name(name="GetListOfStudents")
+@bp.route(route="", auth_level=func.AuthLevel.FUNCTION)
+def get_list_of_students(req: func.HttpRequest) -> func.HttpResponse:
+    try:
+        start_invocation("GetListOfStudents")
+        from get_students import get_school_status_ids, get_students
+        # retrieve payload and initialize variables
+        request = get_request_payload(req, ListOfStudentsRequest)
+        anthology_api_key = request.anthology_api_key
+        log_payload("Request payload", loggable(request))
+
+        anthology_base_url = request.anthology_base_url
+        school_status_codes = set(request.school_status_codes)
+        check_student_enrollment_ids = set(request.check_student_enrollment_ids or {})
+
+        # get school_status_ids of the active groups of students
+        school_status_ids = get_school_status_ids(anthology_base_url, anthology_api_key, school_status_codes)
+
+        # get list of active students by filtering by school_status_ids
+        students = get_students(school_status_ids, anthology_base_url, anthology_api_key)
+
+        # format the students info data into a list[StudentRecord]
+        students_info = [
+            StudentRecord(
+                anthology_student_id=student.get("StudentId"),
+                student_enrollment_period_id=student.get("Id"),
+                sis_link=anthology_base_url + "/#/" + str(student.get("StudentId", "")),
+                status=(student.get("SchoolStatus") or {}).get("Name"),
+                program=student.get("ProgramVersionName"),
+                location=(student.get("Campus") or {}).get("Name"),
+                last_date_of_attendance=student.get("Lda"),
+                enrollment_date=student.get("EnrollmentDate"),
+                graduation_date=student.get("GraduationDate"),
+            )
+            for student in students
+            if not check_student_enrollment_ids or student.get("Id") in check_student_enrollment_ids
+        ]
+
+        return get_response({"students": students_info}, req)
+
+    except Exception as err:
+        logging.exception(err)
+        emit_metrics()
+        return func.HttpResponse(traceback.format_exc(), status_code=400)
+
+
+# ######################################
+# # Scope1 -Part2 - Get List of Students
+# ######################################
+
+
+# @bp.function_name(name="GetListOfStudents")
+# @bp.route(route="", auth_level=func.AuthLevel.FUNCTION)
+# def get_list_of_students(req: func.HttpRequest) -> func.HttpResponse:
+#     try:
+#         # retrieve payload and initialize variables
+#         request = req.get_json()
+#         anthology_api_key = request.pop("anthology_api_key")
+#         logging.info(json.dumps({"Request payload": request}, default=str))
+
+#         anthology_base_url = request["anthology_base_url"]
+#         term_id = request["term_id"]
+#         school_status_codes = set(request["school_status_codes"])
+#         check_student_enrollment_ids = set(request.get("check_student_enrollment_ids") or {})
+
+#         # get school_status_ids of the active groups of students
+#         school_status_ids = get_school_status_ids(anthology_base_url, anthology_api_key, school_status_codes)
+
+#         # get list of active students by filtering by school_status_ids
+#         students = get_students(school_status_ids, anthology_base_url, anthology_api_key)
+
+#         student_ids_and_enrollment_ids_dict = get_student_ids_for_single_vs_multiple_enrollments(
+#             students, check_student_enrollment_ids
+#         )
+
+#         student_ids_and_enrollment_ids = [
+#             {"studentId": k, "studentEnrollmentPeriodId": v, "termId": term_id}
+#             for k, v in student_ids_and_enrollment_ids_dict.items()
+#         ]
+
+#         logging.info(f"student_ids_and_enrollment_ids: {json.dumps(student_ids_and_enrollment_ids, default=str)}")
+
+#         return func.HttpResponse(json.dumps(student_ids_and_enrollment_ids, default=str), status_code=200)
+
+#     except Exception as err:
+#         logging.exception(err)
+#         return func.HttpResponse(traceback.format_exc(), status_code=400)
+
+
+################################################################
+# Scope1 -Part3 - Get Student Number, Email, First + Last Names
+################################################################
+
+
+@bp.function_name(name="GetStudentNumberEmailFirstLastNames")
+@bp.route(route="", auth_level=func.AuthLevel.FUNCTION)
+def get_student_number_in_bulk(req: func.HttpRequest) -> func.HttpResponse:
+    try:
+        start_invocation("GetStudentNumberEmailFirstLastNames")
+        from get_student_number_email_first_last_name import get_student_data_asynchronously
+        from http_client import run_async
+        from fan_out import filter_retry_ids
+        from checkpoints import checkpointed
+
+        request = get_request_payload(req, StudentsRequest)
+        anthology_api_key = request.anthology_api_key
+        log_payload("request", loggable(request))
+        students = filter_retry_ids(request.students, "anthology_student_id", request.retry_ids)
+        anthology_base_url = request.anthology_base_url
+        errors = [] if request.partial_results else None
+
+        with checkpointed(request, result_type=StudentRecord) as run:
+            # Use asyncio + httpx to retrieve student_number, first_name, last_name, email through a faster
+            # asynchronous approach
+            student_data = run_async(
+                get_student_data_asynchronously(
+                    anthology_api_key, anthology_base_url, students, errors=errors, checkpoint=run.checkpoint
+                )
+            )
+
+            # return the student data
+            return run.get_response({"students": student_data}, len(students), req, errors=errors)
+
+    except Exception as err:
+        logging.exception(err)
+        emit_metrics()
+        return func.HttpResponse(traceback.format_exc(), status_code=400)
+
+
+##################################################
+# Scope1 -Part4 - Get Canvas Student Id
+##################################################
+
+
+@bp.function_name(name="GetCanvasStudentId")
+@bp.route(route="", auth_level=func.AuthLevel.FUNCTION)
+def get_canvas_student_id(req: func.HttpRequest) -> func.HttpResponse:
+    try:
+        start_invocation("GetCanvasStudentId")
+        from get_canvas_student_id import (
+            get_canvas_student_ids_from_database,
+            get_canvas_student_ids_asynchronously,
+            insert_student_ids_into_database,
+        )
+        from http_client import run_async
+        from fan_out import filter_retry_ids
+
+        request = get_request_payload(req, CanvasStudentIdRequest)
+        canvas_bearer_token = request.canvas_bearer_token
+        log_payload("request", loggable(request))
+        canvas_base_url = request.canvas_base_url
+        database_connector = request.database_connector
+        students = filter_retry_ids(request.students, "anthology_student_number", request.retry_ids)
+        errors = [] if request.partial_results else None
+
+        anthology_student_numbers = {student.anthology_student_number for student in students}
+
+        # first, get canvas_student_ids from database if the data is present
+        student_ids_from_database = get_canvas_student_ids_from_database(
+            tuple(anthology_student_numbers), database_connector
+        )
+        log_payload("student_ids_from_database", student_ids_from_database)
+
+        anthology_student_numbers_from_database = set(student_ids_from_database.keys())
+
+        # second, get canvas_student_ids from Canvas API if not present in the database
+        student_ids_to_retrieve_from_api = list(anthology_student_numbers - anthology_student_numbers_from_database)
+        log_payload("student_ids_to_retrieve_from_api", student_ids_to_retrieve_from_api)
+
+        student_ids_from_api = run_async(
+            get_canvas_student_ids_asynchronously(
+                canvas_bearer_token, canvas_base_url, student_ids_to_retrieve_from_api, errors=errors
+            )
+        )
+        log_payload("student_ids_from_api", student_ids_from_api)
+
+        # students whose Canvas lookup failed are left out, rather than passed on without a canvas_student_id
+        failed_student_numbers = {error["id"] for error in errors or []}
+
+        # third, insert the Canvas API data into the database
+        if student_ids_from_api:
+            insert_student_ids_into_database(student_ids_from_api, database_connector)
+
+        # combine the database + API data
+        full_student_ids_dict = {**student_ids_from_database, **student_ids_from_api}
+        log_payload("full_student_ids_dict", full_student_ids_dict)
+
+        # generate the final results, with the canvas_student_id field added
+        modified_students_data = [
+            student for student in students if student.anthology_student_number not in failed_student_numbers
+        ]
+        for student in modified_students_data:
+            student.canvas_student_id = full_student_ids_dict.get(student.anthology_student_number, None)
+
+        return get_response({"students": modified_students_data}, req, errors=errors)
+
+    except Exception as err:
+        logging.exception(err)
+        emit_metrics()
+        return func.HttpResponse(json.dumps(traceback.format_exc(), default=str), status_code=400)
+
+
+##########################################
+# Scope1 -Part4.4 - Get AOS and Residency
+##########################################
+
+
+@bp.function_name(name="GetAOSResidency")
+@bp.route(route="", auth_level=func.AuthLevel.FUNCTION)
+def get_aos_residency(req: func.HttpRequest) -> func.HttpResponse:
+    try:
+        start_invocation("GetAOSResidency")
+        from get_aos_residency import get_aos_residency_api_data_asynchronously
+        from http_client import run_async
+        from fan_out import filter_retry_ids
+        from checkpoints import checkpointed
+
+        request = get_request_payload(req, StudentsRequest)
+        anthology_api_key = request.anthology_api_key
+        anthology_base_url = request.anthology_base_url
+        students = filter_retry_ids(request.students, "student_enrollment_period_id", request.retry_ids)
+        errors = [] if request.partial_results else None
+
+        with checkpointed(request, result_type=StudentRecord) as run:
+            # gets the api data + updates the student dictionary with the AOS + residency info
+            modified_students = run_async(
+                get_aos_residency_api_data_asynchronously(
+                    anthology_api_key, anthology_base_url, students, errors=errors, checkpoint=run.checkpoint
+                )
+            )
+
+            return run.get_response({"students": modified_students}, len(students), req, errors=errors)
+
+    except Exception as err:
+        logging.exception(err)
+        emit_metrics()
+        return func.HttpResponse(json.dumps(traceback.format_exc(), default=str), status_code=400)
+
+
+#####################################
+# Scope1 -Part4.5 - Get Prep Program
+#####################################
+
+
+@bp.function_name(name="GetPrepProgram")
+@bp.route(route="", auth_level=func.AuthLevel.FUNCTION)
+def get_prep_program(req: func.HttpRequest) -> func.HttpResponse:
+    try:
+        start_invocation("GetPrepProgram")
+        from get_prep_program import get_filtered_prep_program_dict_asynchronously, get_prep_program_dict
+        from http_client import run_async
+
+        request = get_request_payload(req, PrepProgramRequest)
+        anthology_api_key = request.anthology_api_key
+        anthology_base_url = request.anthology_base_url
+        students = request.students
+        curr_americorp_agency_branch_ids = set(request.curr_americorp_agency_branch_ids)
+        prev_americorp_agency_branch_ids = set(request.prev_americorp_agency_branch_ids)
+
+        americorp_agency_branch_ids = curr_americorp_agency_branch_ids.union(prev_americorp_agency_branch_ids)
+
+        # get data from API and create dictionary of anthology_student_id: prep_program
+        if request.server_side_filter:
+            prep_program_dict = run_async(
+                get_filtered_prep_program_dict_asynchronously(
+                    anthology_api_key,
+                    anthology_base_url,
+                    list({student.anthology_student_id for student in students}),
+                    curr_americorp_agency_branch_ids,
+                    americorp_agency_branch_ids,
+                )
+            )
+        else:
+            prep_program_dict = get_prep_program_dict(
+                anthology_api_key, anthology_base_url, curr_americorp_agency_branch_ids, americorp_agency_branch_ids
+            )
+
+        # add prep_program data in
+        for student in students:
+            student.prep_program = prep_program_dict.get(student.anthology_student_id, {}).get("prep_program")
+            student.americorp_status = prep_program_dict.get(student.anthology_student_id, {}).get("americorp_status")
+
+        return get_response({"students": students}, req)
+
+    except Exception as err:
+        logging.exception(err)
+        emit_metrics()
+        return func.HttpResponse(json.dumps(traceback.format_exc(), indent=2), status_code=400)
+
+
+#######################################################################
+# Scope1 -Part4.6 - Get Academic Graduation Hold and Registration Hold
+#######################################################################
+
+
+@bp.function_name(name="GetAcademicGraduationHoldRegistrationHold")
+@bp.route(route="", auth_level=func.AuthLevel.FUNCTION)
+def get_academic_graduation_hold_registration_hold(req: func.HttpRequest) -> func.HttpResponse:
+    try:
+        start_invocation("GetAcademicGraduationHoldRegistrationHold")
+        from get_academic_graduation_hold_registration_hold import get_graduation_hold_registration_hold_asynchronously
+        from http_client import run_async
+        from fan_out import filter_retry_ids
+        from checkpoints import checkpointed
+
+        request = get_request_payload(req, StudentsRequest)
+        anthology_api_key = request.anthology_api_key
+        anthology_base_url = request.anthology_base_url
+        students = filter_retry_ids(request.students, "anthology_student_id", request.retry_ids)
+        errors = [] if request.partial_results else None
+
+        with checkpointed(request, result_type=StudentRecord) as run:
+            modified_students = run_async(
+                get_graduation_hold_registration_hold_asynchronously(
+                    anthology_api_key, anthology_base_url, students, errors=errors, checkpoint=run.checkpoint
+                )
+            )
+
+            return run.get_response({"students": modified_students}, len(students), req, errors=errors)
+
+    except Exception as err:
+        logging.exception(err)
+        emit_metrics()
+        return func.HttpResponse(json.dumps(traceback.format_exc(), default=str), status_code=400)
+
+
+########################################
+# Scope1 -Part4.7 - Get Academic Status
+########################################
+
+
+@bp.function_name(name="GetAcademicStatus")
+@bp.route(route="", auth_level=func.AuthLevel.FUNCTION)
+def get_academic_status(req: func.HttpRequest) -> func.HttpResponse:
+    try:
+        start_invocation("GetAcademicStatus")
+        from get_academic_status import get_academic_status_asynchronously
+        from http_client import run_async
+        from fan_out import filter_retry_ids
+        from checkpoints import checkpointed
+
+        request = get_request_payload(req, StudentsRequest)
+        # anthology_api_key = request["anthology_api_key"]
+        anthology_api_key = request.anthology_api_key
+        log_payload("request", loggable(request))
+        anthology_base_url = request.anthology_base_url
+        students = filter_retry_ids(request.students, "anthology_student_id", request.retry_ids)
+        errors = [] if request.partial_results else None
+
+        with checkpointed(request, result_type=StudentRecord) as run:
+            modified_students = run_async(
+                get_academic_status_asynchronously(
+                    anthology_api_key, anthology_base_url, students, errors=errors, checkpoint=run.checkpoint
+                )
+            )
+
+            return run.get_response({"students": modified_students}, len(students), req, errors=errors)
+
+    except Exception as err:
+        logging.exception(err)
+        emit_metrics()
+        return func.HttpResponse(traceback.format_exc(), status_code=400)
+
+
+############################################################################
+# Scope1 -Part4.8 - Get Student Enrichment (Parts 3, 4.4, 4.5, 4.6 and 4.7)
+############################################################################
+
+
+@bp.function_name(name="GetStudentEnrichment")
+@bp.route(route="", auth_level=func.AuthLevel.FUNCTION)
+def get_student_enrichment(req: func.HttpRequest) -> func.HttpResponse:
+    try:
+        start_invocation("GetStudentEnrichment")
+        from get_student_enrichment import get_enriched_students_asynchronously
+        from http_client import run_async
+        from fan_out import filter_retry_ids
+
+        request = get_request_payload(req, StudentEnrichmentRequest)
+        anthology_api_key = request.anthology_api_key
+        anthology_base_url = request.anthology_base_url
+        students = filter_retry_ids(request.students, "anthology_student_id", request.retry_ids)
+        errors = [] if request.partial_results else None
+        curr_americorp_agency_branch_ids = set(request.curr_americorp_agency_branch_ids)
+        prev_americorp_agency_branch_ids = set(request.prev_americorp_agency_branch_ids)
+
+        americorp_agency_branch_ids = curr_americorp_agency_branch_ids.union(prev_americorp_agency_branch_ids)
+
+        # runs the student data, AOS/residency, prep program, holds and academic status lookups concurrently, for
+        # the students without a fresh enrichment snapshot
+        modified_students = run_async(
+            get_enriched_students_asynchronously(
+                anthology_api_key,
+                anthology_base_url,
+                students,
+                curr_americorp_agency_branch_ids,
+                americorp_agency_branch_ids,
+                errors=errors,
+                database_connector=request.database_connector,
+                server_side_filter=request.server_side_filter,
+            )
+        )
+
+        return get_response({"students": modified_students}, req, errors=errors)
+
+    except Exception as err:
+        logging.exception(err)
+        emit_metrics()
+        return func.HttpResponse(traceback.format_exc(), status_code=400)
@@ -0,0 +1,103 @@
+import argparse
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+# the function app lives in the repository root, the mock upstream + the fake database in benchmarks/
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+sys.path.insert(0, str(REPO_ROOT / "benchmarks"))
+
+import azure.functions as func  # noqa: E402
+import pymssql  # noqa: E402
+
+import db_pool  # noqa: E402
+import run_benchmarks  # noqa: E402
+from codec import encode_json  # noqa: E402
+from fake_database import FakeDatabase  # noqa: E402
+from mock_upstream import MockConfig  # noqa: E402
+
+
+# small + fast, the tests are about what the handlers do with the upstreams' answers, not how long they take
+MOCK_UPSTREAM_CONFIG = {"students": 60, "latency_ms": 5.0, "latency_sigma": 0.1, "row_latency_us": 0.0}
+DATABASE_CONNECTOR = {"server": "fake"}
+
+
+@pytest.fixture(scope="session")
+def base_url():
+    args = argparse.Namespace(**{**vars(MockConfig()), **MOCK_UPSTREAM_CONFIG})
+    process, base_url = run_benchmarks.start_mock_upstream(args)
+    yield base_url
+    process.terminate()
+
+
+@pytest.fixture(scope="session")
+def functions() -> dict:
+    app = run_benchmarks.app
+    return {function.get_function_name(): function.get_user_function() for function in app.get_functions()}
+
+
+@pytest.fixture(autouse=True)
+def settings(monkeypatch, tmp_path):
+    # every test starts without checkpoints + snapshots, whatever the environment running them has set
+    for setting in ("CHECKPOINT_STORE", "ENRICHMENT_SNAPSHOT_DATABASE_CONNECTOR"):
+        monkeypatch.delenv(setting, raising=False)
+    monkeypatch.setenv("CHECKPOINT_DIRECTORY", str(tmp_path))
+
+
+@pytest.fixture
+def fake_database(monkeypatch) -> FakeDatabase:
+    database = FakeDatabase()
+    monkeypatch.setattr(pymssql, "connect", database.connect)
+    # connections pooled by an earlier test belong to its fake database
+    monkeypatch.setattr(db_pool, "idle_connections", {})
+    return database
+
+
+@pytest.fixture
+def call(functions):
+    # invokes a handler like the host does, -> (status code, decoded body). Some handlers answer a 400 with the
+    # traceback as plain text
+    def call(name: str, payload: dict) -> tuple[int, dict]:
+        response = functions[name](func.HttpRequest("POST", f"/api/{name}", body=encode_json(payload)))
+        try:
+            return response.status_code, json.loads(response.get_body())
+        except ValueError:
+            return response.status_code, response.get_body().decode()
+
+    return call
+
+
+@pytest.fixture(scope="session")
+def course_stage_payloads(base_url, functions) -> dict:
+    # the stages up to GetCanvasCourseName chained like the orchestrator does, -> the payloads of the stages after
+    # them by function name. GetCanvasStudentId needs a database, canvas_student_id is left empty instead
+    context = {"base_url": base_url, "database_connector": DATABASE_CONNECTOR, "normalized": False}
+    payloads = {}
+    for name, build_payload, _, keep in run_benchmarks.get_stages(context):
+        if name == "GetCanvasStudentId":
+            context["students"] = [{**student, "canvas_student_id": None} for student in context["students"]]
+            continue
+        if name in run_benchmarks.DATABASE_STAGES:
+            payloads[name] = build_payload()
+            continue
+
+        response, _, _ = run_benchmarks.invoke(functions[name], name, build_payload(), False)
+        if keep:
+            keep(response)
+    return payloads
+
+
+@pytest.fixture(scope="session")
+def anthology(base_url) -> dict:
+    return {"anthology_api_key": "test", "anthology_base_url": base_url}
+
+
+@pytest.fixture(scope="session")
+def list_of_students(anthology, functions) -> list[dict]:
+    response, _, _ = run_benchmarks.invoke(
+        functions["GetListOfStudents"], "GetListOfStudents", {**anthology, "school_status_codes": ["A", "L"]}, False
+    )
+    return response["students"]
@@ -0,0 +1,85 @@
+import asyncio
+
+import httpx
+import pytest
+
+from canvas_pages import CANVAS_PAGE_CONCURRENCY, get_canvas_pages
+
+
+URL = "http://canvas.test/api/v1/courses"
+PAGES = 8
+
+
+class Canvas:
+    # a Canvas list endpoint of PAGES pages of 2 rows. The earlier pages answer slowest, so concurrent pages finish
+    # out of order
+    def __init__(self, with_last: bool = True, failing_page: int = None):
+        self.with_last = with_last
+        self.failing_page = failing_page
+        self.requested_pages = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def handle(self, request: httpx.Request) -> httpx.Response:
+        page = int(request.url.params.get("page", 1))
+        self.requested_pages.append(page)
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            # the failing page answers straight away, while the pages after it are still in flight
+            await asyncio.sleep(0 if page == self.failing_page else 0.002 * (PAGES - page))
+        finally:
+            self.in_flight -= 1
+        if page == self.failing_page:
+            return httpx.Response(404, request=request)
+
+        links = []
+        if page < PAGES:
+            links.append(f'<{URL}?per_page=2&page={page + 1}>; rel="next"')
+        if self.with_last:
+            links.append(f'<{URL}?per_page=2&page={PAGES}>; rel="last"')
+        return httpx.Response(200, json=[2 * page - 1, 2 * page], headers={"Link": ", ".join(links)})
+
+    def get_rows(self, **kwargs) -> list:
+        async def get_rows() -> list:
+            async with httpx.AsyncClient(transport=httpx.MockTransport(self.handle)) as client:
+                pages = get_canvas_pages(client, URL, {}, {"per_page": 2}, **kwargs)
+                return [row async for page in pages for row in page]
+
+        return asyncio.run(get_rows())
+
+
+def test_pages_are_fetched_concurrently_when_the_last_page_is_known():
+    canvas = Canvas()
+
+    rows = canvas.get_rows()
+
+    # in page order, whichever page finished first
+    assert rows == list(range(1, 2 * PAGES + 1))
+    assert sorted(canvas.requested_pages) == list(range(1, PAGES + 1))
+    assert canvas.max_in_flight == CANVAS_PAGE_CONCURRENCY
+
+
+def test_next_links_are_followed_one_page_at_a_time_without_a_last_page():
+    canvas = Canvas(with_last=False)
+
+    rows = canvas.get_rows()
+
+    assert rows == list(range(1, 2 * PAGES + 1))
+    assert canvas.requested_pages == list(range(1, PAGES + 1))
+    assert canvas.max_in_flight == 1
+
+
+def test_a_failed_page_leaves_no_page_running():
+    canvas = Canvas(failing_page=2)
+
+    async def get_rows() -> None:
+        async with httpx.AsyncClient(transport=httpx.MockTransport(canvas.handle)) as client:
+            pages = get_canvas_pages(client, URL, {}, {"per_page": 2})
+            with pytest.raises(httpx.HTTPStatusError):
+                async for _ in pages:
+                    pass
+            assert asyncio.all_tasks() == {asyncio.current_task()}
+            assert canvas.in_flight == 0
+
+    asyncio.run(get_rows())
@@ -0,0 +1,55 @@
+import os
+import time
+
+import pytest
+
+import checkpoints
+import get_academic_status
+
+
+@pytest.fixture
+def failing_after_first_chunk(monkeypatch, list_of_students):
+    # the first chunk of students is checkpointed, then the stage fails
+    students = list_of_students[:25]
+    failing_student_id = students[-1]["anthology_student_id"]
+    get_academic_status_from_api = get_academic_status.get_academic_status_from_api
+
+    async def get_academic_status_or_fail(anthology_api_key, anthology_base_url, student, client):
+        if student.anthology_student_id == failing_student_id:
+            raise RuntimeError("upstream down")
+        return await get_academic_status_from_api(anthology_api_key, anthology_base_url, student, client)
+
+    monkeypatch.setenv("CHECKPOINT_STORE", "file")
+    monkeypatch.setattr(get_academic_status, "get_academic_status_from_api", get_academic_status_or_fail)
+    return students
+
+
+def test_failed_run_with_a_generated_run_id_deletes_its_checkpoint(
+    call, anthology, failing_after_first_chunk, tmp_path
+):
+    status, _ = call("GetAcademicStatus", {**anthology, "students": failing_after_first_chunk})
+
+    assert status == 400
+    # the caller never got the run id, nothing could continue it
+    assert list(tmp_path.glob("*.checkpoint")) == []
+
+
+def test_failed_run_with_a_run_id_keeps_its_checkpoint(call, anthology, failing_after_first_chunk, tmp_path):
+    status, _ = call("GetAcademicStatus", {**anthology, "students": failing_after_first_chunk, "run_id": "retry-me"})
+
+    assert status == 400
+    assert [path.name for path in tmp_path.glob("*.checkpoint")] == ["GetAcademicStatus-retry-me.checkpoint"]
+
+
+def test_stale_checkpoints_expire(tmp_path, monkeypatch):
+    stale = tmp_path / "GetAcademicStatus-stale.checkpoint"
+    fresh = tmp_path / "GetAcademicStatus-fresh.checkpoint"
+    for path in (stale, fresh):
+        path.write_bytes(b"")
+    day_ago = time.time() - 24 * 3600 - 60
+    os.utime(stale, (day_ago, day_ago))
+
+    monkeypatch.setattr(checkpoints, "last_expired_at", None)
+    checkpoints.expire_checkpoints(checkpoints.FileCheckpointStore(str(tmp_path)))
+
+    assert [path.name for path in tmp_path.glob("*.checkpoint")] == [fresh.name]
@@ -0,0 +1,130 @@
+import httpx
+import pytest
+
+import circuit_breaker
+from circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError, is_upstream_failure
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch) -> Clock:
+    clock = Clock()
+    monkeypatch.setattr(circuit_breaker, "time", clock)
+    return clock
+
+
+def get_breaker(**kwargs) -> CircuitBreaker:
+    settings = {"failure_rate": 0.5, "min_requests": 4, "window_seconds": 10.0, "open_seconds": 5.0}
+    return CircuitBreaker("http://upstream.test", **{**settings, **kwargs})
+
+
+def record(breaker: CircuitBreaker, *failed: bool) -> None:
+    for result in failed:
+        breaker.before_request()
+        breaker.record_result(result)
+
+
+def get_open_breaker(**kwargs) -> CircuitBreaker:
+    breaker = get_breaker(**kwargs)
+    record(breaker, True, True, True, True)
+    assert breaker.state == OPEN
+    return breaker
+
+
+def test_opens_only_after_min_requests_at_the_failure_rate(clock):
+    breaker = get_breaker()
+    # every request failed, but too few of them to tell
+    record(breaker, True, True, True)
+    assert breaker.state == CLOSED
+
+    # 3 of 4 failed
+    record(breaker, False)
+    assert breaker.state == OPEN
+
+    breaker = get_breaker()
+    record(breaker, False, False, False, True, True)
+    assert breaker.state == CLOSED
+    # 3 of 6 is the failure rate exactly
+    record(breaker, True)
+    assert breaker.state == OPEN
+
+
+def test_outcomes_expire_from_the_window(clock):
+    breaker = get_breaker()
+    record(breaker, True, True, True)
+
+    clock.now += 11.0
+    # the earlier failures are out of the window, 1 of 4 failed
+    record(breaker, True, False, False, False)
+    assert breaker.state == CLOSED
+    assert len(breaker.outcomes) == 4
+    assert breaker.failures == 1
+
+
+def test_fails_fast_while_open_then_lets_a_few_probes_through(clock):
+    breaker = get_open_breaker(half_open_probes=2)
+
+    with pytest.raises(CircuitOpenError) as error:
+        breaker.before_request()
+    assert error.value.retry_in == pytest.approx(5.0)
+
+    clock.now += 5.0
+    breaker.before_request()
+    assert breaker.state == HALF_OPEN
+    breaker.before_request()
+    with pytest.raises(CircuitOpenError):
+        breaker.before_request()
+
+    breaker.record_result(False)
+    assert breaker.state == HALF_OPEN
+    breaker.record_result(False)
+    assert breaker.state == CLOSED
+    breaker.before_request()
+
+
+def test_a_failed_probe_reopens_the_breaker(clock):
+    breaker = get_open_breaker(half_open_probes=2)
+    clock.now += 5.0
+    breaker.before_request()
+    breaker.before_request()
+
+    breaker.record_result(False)
+    breaker.record_result(True)
+
+    assert breaker.state == OPEN
+    with pytest.raises(CircuitOpenError) as error:
+        breaker.before_request()
+    assert error.value.retry_in == pytest.approx(5.0)
+
+
+def test_a_cancelled_probe_gives_its_slot_back(clock):
+    breaker = get_open_breaker(half_open_probes=1)
+    clock.now += 5.0
+    breaker.before_request()
+    with pytest.raises(CircuitOpenError):
+        breaker.before_request()
+
+    breaker.record_cancelled()
+
+    breaker.before_request()
+    assert breaker.state == HALF_OPEN
+
+
+@pytest.mark.parametrize(
+    "status_code, failed", [(200, False), (400, False), (404, False), (429, False), (500, True), (503, True)]
+)
+def test_only_5xx_responses_are_upstream_failures(status_code, failed):
+    assert is_upstream_failure(httpx.Response(status_code)) == failed
+
+
+def test_only_transport_errors_are_upstream_failures():
+    assert is_upstream_failure(error=httpx.ConnectError("refused"))
+    assert is_upstream_failure(error=httpx.ReadTimeout("timed out"))
+    assert not is_upstream_failure(error=ValueError("bad payload"))
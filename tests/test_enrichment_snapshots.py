@@ -0,0 +1,152 @@
+import pytest
+
+import get_student_enrichment
+import http_metrics
+from conftest import DATABASE_CONNECTOR
+from enrichment_snapshots import (
+    SNAPSHOT_TABLE,
+    SNAPSHOT_TTL_HOURS,
+    get_fresh_attributes,
+    get_snapshot_key,
+    get_snapshot_rows,
+)
+from records import StudentRecord
+
+
+ATTRIBUTES = {
+    "student_data": {"anthology_student_number": 1001, "first_name": "a", "last_name": "b", "email": "a@example.com"},
+    "aos_residency": {"area_of_study": "Nursing", "residency": "In State"},
+    "holds": {"academic_graduation_hold": False, "registration_hold": False},
+    "academic_status": {"academic_status": "Good Standing"},
+}
+
+
+def get_student(**fields) -> StudentRecord:
+    return StudentRecord(
+        **{"anthology_student_id": 1, "student_enrollment_period_id": 10, "status": "A", "program": "BSN", **fields}
+    )
+
+
+def get_snapshots(students: list[StudentRecord], age_hours: float = 0.0) -> dict:
+    # the stored snapshots of students, as load_snapshots() returns them
+    snapshots = {}
+    for group, attributes in ATTRIBUTES.items():
+        fetched_attributes = {get_snapshot_key(student, group): attributes for student in students}
+        for row in get_snapshot_rows(students, group, fetched_attributes):
+            key = (row["anthology_student_id"], row["student_enrollment_period_id"], group)
+            snapshots[key] = {**row, "age_seconds": age_hours * 3600}
+    return snapshots
+
+
+def test_fresh_snapshots_are_used_as_they_are():
+    student = get_student()
+
+    fresh_attributes = get_fresh_attributes([student], get_snapshots([student], age_hours=1.0))
+
+    assert fresh_attributes == {
+        "student_data": {1: ATTRIBUTES["student_data"]},
+        "aos_residency": {10: ATTRIBUTES["aos_residency"]},
+        "holds": {1: ATTRIBUTES["holds"]},
+        "academic_status": {1: ATTRIBUTES["academic_status"]},
+    }
+
+
+def test_expired_snapshots_are_looked_up_again(monkeypatch):
+    student = get_student()
+
+    # past the holds + academic status TTL, within the names + AOS one
+    snapshots = get_snapshots([student], age_hours=SNAPSHOT_TTL_HOURS["holds"] + 1)
+    fresh_attributes = get_fresh_attributes([student], snapshots)
+    assert {group for group, attributes in fresh_attributes.items() if attributes} == {"student_data", "aos_residency"}
+
+    monkeypatch.setenv("ENRICHMENT_SNAPSHOT_TTL_HOURS", "student_data=0.5")
+    fresh_attributes = get_fresh_attributes([student], get_snapshots([student], age_hours=1.0))
+    assert fresh_attributes["student_data"] == {}
+    assert fresh_attributes["holds"] == {1: ATTRIBUTES["holds"]}
+
+
+def test_a_changed_enrollment_is_looked_up_again():
+    snapshots = get_snapshots([get_student()])
+
+    fresh_attributes = get_fresh_attributes([get_student(program="MSN")], snapshots)
+    assert fresh_attributes == {group: {} for group in ATTRIBUTES}
+
+    # last_date_of_attendance isn't part of the fingerprint, it moves with every class attended
+    fresh_attributes = get_fresh_attributes([get_student(last_date_of_attendance="2026-10-01")], snapshots)
+    assert all(fresh_attributes.values())
+
+
+def test_student_lookups_need_every_enrollment_period_fresh():
+    first, second = get_student(), get_student(student_enrollment_period_id=11)
+    snapshots = get_snapshots([first, second])
+
+    graduated = get_student(student_enrollment_period_id=11, status="G")
+    fresh_attributes = get_fresh_attributes([first, graduated], snapshots)
+
+    # the first enrollment period's AOS is still fresh, the student-level lookups aren't
+    assert fresh_attributes["aos_residency"] == {10: ATTRIBUTES["aos_residency"]}
+    assert fresh_attributes["student_data"] == {}
+
+
+@pytest.fixture
+def enrichment_payload(anthology, list_of_students) -> dict:
+    return {
+        **anthology,
+        "curr_americorp_agency_branch_ids": [100, 101],
+        "prev_americorp_agency_branch_ids": [102],
+        "students": list_of_students[:20],
+        "database_connector": DATABASE_CONNECTOR,
+        "partial_results": True,
+    }
+
+
+@pytest.fixture
+def request_counts(monkeypatch) -> list:
+    # the upstream requests of each invocation
+    counts = []
+    monkeypatch.setattr(
+        http_metrics,
+        "exporters",
+        [lambda summary: counts.append(sum(endpoint["requests"] for endpoint in summary["endpoints"].values()))],
+    )
+    return counts
+
+
+def test_enrichment_skips_the_lookups_of_fresh_snapshots(call, enrichment_payload, fake_database, request_counts):
+    status, first = call("GetStudentEnrichment", enrichment_payload)
+    assert status == 200
+    assert first["errors"] == []
+    assert len(fake_database.get_rows(SNAPSHOT_TABLE)) == 4 * len(enrichment_payload["students"])
+
+    status, second = call("GetStudentEnrichment", enrichment_payload)
+    assert status == 200
+
+    assert second["students"] == first["students"]
+    # only the prep program's, which isn't snapshotted
+    assert request_counts[0] > len(enrichment_payload["students"]) * 4
+    assert request_counts[1] == 1
+
+
+def test_failed_students_are_not_snapshotted(call, enrichment_payload, fake_database, monkeypatch):
+    get_holds = get_student_enrichment.get_graduation_hold_registration_hold_asynchronously
+    failed_student_id = enrichment_payload["students"][0]["anthology_student_id"]
+
+    async def get_holds_failing_the_first_student(api_key, base_url, students, client, errors):
+        errors.append({"id": students[0].anthology_student_id, "error": "HTTPStatusError", "retryable": True})
+        return await get_holds(api_key, base_url, students[1:], client, errors)
+
+    monkeypatch.setattr(
+        get_student_enrichment,
+        "get_graduation_hold_registration_hold_asynchronously",
+        get_holds_failing_the_first_student,
+    )
+
+    status, body = call("GetStudentEnrichment", enrichment_payload)
+
+    assert status == 200
+    assert [(error["id"], error["stage"]) for error in body["errors"]] == [(failed_student_id, "holds")]
+    assert failed_student_id not in {student["anthology_student_id"] for student in body["students"]}
+    # none of its lookups are stored, a retry with retry_ids looks it all up again
+    snapshot_rows = fake_database.get_rows(SNAPSHOT_TABLE)
+    assert len(snapshot_rows) == 4 * (len(enrichment_payload["students"]) - 1)
+    assert failed_student_id not in {row["anthology_student_id"] for row in snapshot_rows}
@@ -0,0 +1,75 @@
+import asyncio
+
+import httpx
+import pytest
+
+from hedging import MIN_LATENCY_SAMPLES, send_hedged
+from http_client import InstrumentedAsyncClient
+from http_metrics import get_endpoint_name, start_invocation
+
+
+URL = "http://upstream.test/slow"
+
+
+@pytest.fixture
+def metrics(monkeypatch):
+    # hedge anything slower than the median, which is 10 ms
+    monkeypatch.setenv("HEDGED_REQUESTS_PERCENTILE", "50")
+    monkeypatch.setenv("HEDGED_REQUESTS_MAX_RATE", "1")
+    metrics = start_invocation("test_hedging")
+    for _ in range(MIN_LATENCY_SAMPLES):
+        metrics.record_request(get_endpoint_name(URL), 10.0, "200")
+    return metrics
+
+
+def get_client(delays: list, cancelled: list) -> InstrumentedAsyncClient:
+    # each request sleeps the next of delays, the index of a request cancelled while sleeping goes to cancelled
+    attempts = iter(range(len(delays)))
+
+    async def handle(request: httpx.Request) -> httpx.Response:
+        attempt = next(attempts)
+        try:
+            await asyncio.sleep(delays[attempt])
+        except asyncio.CancelledError:
+            cancelled.append(attempt)
+            raise
+        return httpx.Response(200, json={"attempt": attempt})
+
+    return InstrumentedAsyncClient(transport=httpx.MockTransport(handle))
+
+
+def get_statuses(metrics) -> dict:
+    return metrics.endpoints[get_endpoint_name(URL)].status_codes
+
+
+def test_hedged_request_records_the_cancelled_loser(metrics):
+    cancelled = []
+
+    async def send() -> httpx.Response:
+        async with get_client([1.0, 0.0], cancelled) as client:
+            response = await send_hedged(lambda: client.get(URL), URL)
+            # the loser has unwound by the time send_hedged returns, not just when the loop shuts down
+            assert cancelled == [0]
+            return response
+
+    response = asyncio.run(send())
+
+    assert response.json() == {"attempt": 1}
+    # the loser took longer than the hedge delay, that goes into the next delays too
+    assert get_statuses(metrics) == {"200": MIN_LATENCY_SAMPLES + 1, "cancelled": 1}
+    assert metrics.endpoints[get_endpoint_name(URL)].latencies_ms[-1] >= 10.0
+    assert metrics.endpoints[get_endpoint_name(URL)].errors == 0
+
+
+def test_cancelling_the_caller_cancels_the_first_attempt(metrics):
+    cancelled = []
+
+    async def send() -> None:
+        async with get_client([1.0], cancelled) as client:
+            # times out before the hedge delay, while send_hedged still waits on the first attempt alone
+            with pytest.raises(asyncio.TimeoutError):
+                await asyncio.wait_for(send_hedged(lambda: client.get(URL), URL), timeout=0.001)
+            assert cancelled == [0]
+            assert get_statuses(metrics)["cancelled"] == 1
+
+    asyncio.run(send())
@@ -0,0 +1,20 @@
+import asyncio
+
+from http_client import get_async_client
+
+
+def test_named_pools_get_their_own_client():
+    async def get_clients() -> list:
+        return [
+            get_async_client("http://upstream.test/a"),
+            get_async_client("http://upstream.test/b"),
+            get_async_client("http://upstream.test/a", pool="holds"),
+            get_async_client("http://upstream.test/b", pool="holds"),
+            get_async_client("http://upstream.test/a", pool="academic_status"),
+        ]
+
+    default, same_host, holds, same_pool, academic_status = asyncio.run(get_clients())
+
+    assert same_host is default
+    assert same_pool is holds
+    assert len({id(default), id(holds), id(academic_status)}) == 3
@@ -0,0 +1,35 @@
+from codec import AttendanceRow, StudentCourseRow
+from odata import decode_odata_page
+
+
+def test_decode_odata_page_puts_up_with_odd_rows():
+    body = b"""{
+        "value": [
+            {"AttendanceDate": "2026-09-01T00:00:00", "Attended": 60, "Absent": 0, "IsExcusedAbsence": false,
+             "StudentCourseId": 1},
+            {"AttendanceDate": "2026-09-02T00:00:00", "Attended": "30.5", "Absent": "0", "IsExcusedAbsence": null,
+             "StudentCourseId": "2"},
+            {"AttendanceDate": "2026-09-03T00:00:00", "Attended": 0, "StudentCourseId": null},
+            {"AttendanceDate": "2026-09-04T00:00:00", "Attended": "n/a", "StudentCourseId": 3}
+        ],
+        "@odata.nextLink": "next"
+    }"""
+
+    page = decode_odata_page(body, AttendanceRow)
+
+    # numbers sent as strings are converted, null + missing fields are None, the row that doesn't fit is skipped
+    assert page.value == [
+        AttendanceRow("2026-09-01T00:00:00", 60, 0, False, 1),
+        AttendanceRow("2026-09-02T00:00:00", 30.5, 0, None, 2),
+        AttendanceRow("2026-09-03T00:00:00", 0, None, None, None),
+    ]
+    assert page.next_link == "next"
+
+
+def test_decode_odata_page_keeps_rows_with_null_ids():
+    body = b'{"value": [{"Id": 1, "StudentId": null, "ClassSectionId": 5}]}'
+
+    page = decode_odata_page(body, StudentCourseRow)
+
+    assert page.value == [StudentCourseRow(Id=1, StudentId=None, StudentEnrollmentPeriodId=None, ClassSectionId=5)]
+    assert page.next_link is None
@@ -0,0 +1,36 @@
+from payloads import from_columnar, to_columnar
+from records import StudentRecord
+
+
+def test_columnar_round_trip_keeps_missing_columns_missing():
+    payload = {
+        "students": [
+            {"anthology_student_id": 1, "email": None, "first_name": "a"},
+            {"anthology_student_id": 2},
+            {"anthology_student_id": 3, "email": "c@example.com"},
+        ],
+        "term_id": 7,
+    }
+
+    columnar_payload = to_columnar(payload)
+
+    assert columnar_payload["students"]["__missing__"] == {"email": [1], "first_name": [1, 2]}
+    # an explicit null stays a null, a missing column stays missing
+    assert from_columnar(columnar_payload) == payload
+
+
+def test_columnar_round_trip_of_records_leaves_unset_fields_out():
+    students = [StudentRecord(anthology_student_id=1, email="a@example.com"), StudentRecord(anthology_student_id=2)]
+
+    rows = from_columnar(to_columnar({"students": students}))["students"]
+
+    assert rows[0]["email"] == "a@example.com"
+    assert "email" not in rows[1]
+
+
+def test_from_columnar_accepts_tables_without_a_missing_mask():
+    payload = {"students": {"__columns__": {"anthology_student_id": [1, 2], "email": ["a", None]}}}
+
+    assert from_columnar(payload) == {
+        "students": [{"anthology_student_id": 1, "email": "a"}, {"anthology_student_id": 2, "email": None}]
+    }
@@ -0,0 +1,137 @@
+import asyncio
+import email.utils
+import time
+
+import httpx
+import pytest
+
+import retry_policy
+from http_metrics import get_endpoint_name, start_invocation
+from retry_policy import (
+    MIN_RETRY_BUDGET,
+    RetryPolicy,
+    get_retry_after,
+    send_with_retries,
+    send_with_retries_asynchronously,
+)
+
+
+URL = "http://upstream.test/students"
+
+
+@pytest.fixture
+def metrics(monkeypatch):
+    # the delays are checked on their own, the retries don't wait for them
+    async def sleep(delay: float) -> None:
+        pass
+
+    monkeypatch.setattr(retry_policy.time, "sleep", lambda delay: None)
+    monkeypatch.setattr(retry_policy.asyncio, "sleep", sleep)
+    return start_invocation("test_retry_policy")
+
+
+def get_response(status_code: int, headers: dict = None) -> httpx.Response:
+    return httpx.Response(status_code, headers=headers, request=httpx.Request("GET", URL))
+
+
+def get_send(*outcomes):
+    # send() returning (or raising) the next of outcomes, -> (send, the number of calls so far)
+    calls = []
+
+    def send() -> httpx.Response:
+        outcome = outcomes[min(len(calls), len(outcomes) - 1)]
+        calls.append(outcome)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    return send, calls
+
+
+def test_decorrelated_jitter_stays_within_the_policy_bounds():
+    policy = RetryPolicy(base_delay=0.05, max_delay=5.0)
+
+    for previous_delay in (0.05, 0.5, 3.0, 50.0):
+        delays = [policy.get_delay(previous_delay) for _ in range(1000)]
+        assert all(policy.base_delay <= delay <= policy.max_delay for delay in delays)
+        # up to 3x the previous delay, so the delays spread out rather than all landing on the bounds
+        assert max(delays) <= min(policy.max_delay, previous_delay * 3)
+
+    assert len({policy.get_delay(1.0) for _ in range(100)}) > 1
+
+
+def test_retry_after_in_seconds_is_capped():
+    policy = RetryPolicy(max_retry_after=60.0)
+
+    assert get_retry_after(get_response(429, {"Retry-After": "2"})) == 2.0
+    assert policy.get_delay(0.05, get_response(429, {"Retry-After": "2"})) == 2.0
+    assert policy.get_delay(0.05, get_response(429, {"Retry-After": "120"})) == 60.0
+
+
+def test_retry_after_as_an_http_date():
+    in_30_seconds = email.utils.formatdate(time.time() + 30, usegmt=True)
+    an_hour_ago = email.utils.formatdate(time.time() - 3600, usegmt=True)
+    in_an_hour = email.utils.formatdate(time.time() + 3600, usegmt=True)
+
+    assert 28.0 <= get_retry_after(get_response(503, {"Retry-After": in_30_seconds})) <= 30.0
+    assert get_retry_after(get_response(503, {"Retry-After": an_hour_ago})) == 0.0
+    assert RetryPolicy(max_retry_after=60.0).get_delay(0.05, get_response(503, {"Retry-After": in_an_hour})) == 60.0
+    assert get_retry_after(get_response(503, {"Retry-After": "soon"})) is None
+
+
+@pytest.mark.parametrize(
+    "outcome, error_type",
+    [
+        (get_response(404), httpx.HTTPStatusError),
+        (get_response(400), httpx.HTTPStatusError),
+        (httpx.UnsupportedProtocol("ftp"), httpx.UnsupportedProtocol),
+        (ValueError("not an upstream error"), ValueError),
+    ],
+)
+def test_non_retryable_failures_are_raised_on_the_first_attempt(metrics, outcome, error_type):
+    send, calls = get_send(outcome)
+
+    with pytest.raises(error_type):
+        send_with_retries(send, URL)
+
+    assert len(calls) == 1
+    assert metrics.retries == 0
+
+
+def test_retryable_failures_are_retried_up_to_max_attempts(metrics):
+    send, calls = get_send(httpx.ConnectTimeout("timed out"), get_response(503), get_response(200))
+    assert send_with_retries(send, URL).status_code == 200
+    assert len(calls) == 3
+
+    send, calls = get_send(get_response(503))
+    with pytest.raises(httpx.HTTPStatusError):
+        send_with_retries(send, URL, RetryPolicy(max_attempts=3))
+    assert len(calls) == 3
+
+
+def test_spent_retry_budget_stops_retrying(metrics):
+    endpoint = get_endpoint_name(URL)
+    for _ in range(MIN_RETRY_BUDGET):
+        metrics.record_retry(endpoint)
+
+    send, calls = get_send(get_response(503), get_response(200))
+    with pytest.raises(httpx.HTTPStatusError):
+        send_with_retries(send, URL)
+
+    assert len(calls) == 1
+    assert metrics.endpoints[endpoint].retries_denied == 1
+    assert metrics.retries == MIN_RETRY_BUDGET
+
+
+def test_asynchronous_retries_follow_the_same_policy(metrics):
+    send, calls = get_send(get_response(502), get_response(404))
+
+    async def send_asynchronously() -> httpx.Response:
+        return send()
+
+    with pytest.raises(httpx.HTTPStatusError):
+        asyncio.run(send_with_retries_asynchronously(send_asynchronously, URL))
+
+    # the 502 is retried, the 404 isn't
+    assert len(calls) == 2
+    assert metrics.retries == 1
@@ -0,0 +1,76 @@
+import checkpoints
+
+
+def get_rows(fake_database, table: str) -> list[dict]:
+    return sorted(fake_database.get_rows(table), key=lambda row: sorted(row.items(), key=str))
+
+
+def test_course_score_grade_link_skips_unchanged_rows(call, course_stage_payloads, fake_database):
+    payload = course_stage_payloads["GetCourseScoreGradeLink"]
+    student_courses = payload["student_courses"]
+    student_ids = {course["anthology_student_id"] for course in student_courses}
+
+    status, first = call("GetCourseScoreGradeLink", payload)
+    assert status == 200
+    # staging_student_info gets one row per student, not one per course
+    assert fake_database.rows_sent["staging_student_info"] == len(student_ids)
+    # the stored rows are read once per table, not once per chunk of students
+    assert fake_database.selects["staging_student_info"] == 1
+    assert fake_database.selects["staging_student_course_performance"] == 1
+    sent = dict(fake_database.rows_sent)
+
+    status, second = call("GetCourseScoreGradeLink", payload)
+    assert status == 200
+    assert second == first
+    assert fake_database.rows_sent == sent
+
+
+def test_course_score_grade_link_resumes_from_checkpoint(call, course_stage_payloads, fake_database, monkeypatch):
+    payload = course_stage_payloads["GetCourseScoreGradeLink"]
+    status, expected = call("GetCourseScoreGradeLink", payload)
+    assert status == 200
+    expected_rows = get_rows(fake_database, "staging_student_course_performance")
+    fake_database.tables.clear()
+
+    # each invocation runs out of time after two chunks of students
+    def deadline_reached(checkpoint) -> bool:
+        checkpoint.chunks = getattr(checkpoint, "chunks", 0) + 1
+        checkpoint.stopped = checkpoint.stopped or checkpoint.chunks > 2
+        return checkpoint.stopped
+
+    monkeypatch.setenv("CHECKPOINT_STORE", "file")
+    monkeypatch.setattr(checkpoints.Checkpoint, "deadline_reached", deadline_reached)
+
+    continuations = 0
+    status, body = call("GetCourseScoreGradeLink", {**payload, "run_id": "resume"})
+    while status == 202:
+        continuations += 1
+        status, body = call("GetCourseScoreGradeLink", {**payload, "continuation_token": body["continuation_token"]})
+
+    assert status == 200
+    assert continuations >= 2
+    assert body["student_courses"] == expected["student_courses"]
+    assert get_rows(fake_database, "staging_student_course_performance") == expected_rows
+
+
+def test_attendance_and_tracker_stages_write_their_tables(call, course_stage_payloads, fake_database):
+    status, body = call("GetAttendanceData", course_stage_payloads["GetAttendanceData"])
+    assert status == 200
+    assert fake_database.rows_sent["staging_student_course_attendance"] == len(body["student_attendance_data"])
+
+    status, body = call(
+        "CalculateAndInsertMasterStudentTrackerData",
+        course_stage_payloads["CalculateAndInsertMasterStudentTrackerData"],
+    )
+    assert status == 200
+    assert len(fake_database.get_rows("staging_master_student_tracker")) == len(body["master_student_tracker_data"])
+
+
+def test_course_score_grade_link_fails_on_a_writer_error(call, course_stage_payloads, fake_database):
+    fake_database.failing_tables.add("staging_student_info")
+
+    status, body = call("GetCourseScoreGradeLink", course_stage_payloads["GetCourseScoreGradeLink"])
+
+    assert status == 400
+    assert "StagingWriteError" in body
+    assert "staging_student_info failed" in body
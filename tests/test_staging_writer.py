@@ -0,0 +1,112 @@
+import time
+
+import pytest
+
+from conftest import DATABASE_CONNECTOR
+from staging_writer import StagingTable, StagingWriteError, StagingWriter
+
+
+SQL_MERGE_UPSERT = """
+    MERGE INTO upserted AS target
+    USING (VALUES (%(anthology_student_id)d, %(name)s)) AS SOURCE (anthology_student_id, name)
+    ON target.anthology_student_id = SOURCE.anthology_student_id
+    WHEN MATCHED THEN UPDATE SET target.name = SOURCE.name
+    WHEN NOT MATCHED THEN INSERT (anthology_student_id, name) VALUES (SOURCE.anthology_student_id, SOURCE.name);
+"""
+
+SQL_MERGE_INSERT = """
+    MERGE INTO inserted AS target
+    USING (VALUES (%(anthology_student_id)d, %(name)s)) AS SOURCE (anthology_student_id, name)
+    ON target.anthology_student_id = SOURCE.anthology_student_id
+    WHEN NOT MATCHED THEN INSERT (anthology_student_id, name) VALUES (SOURCE.anthology_student_id, SOURCE.name);
+"""
+
+
+def get_upserted_table() -> StagingTable:
+    return StagingTable("upserted", SQL_MERGE_UPSERT, key_columns=("anthology_student_id",), update_columns=("name",))
+
+
+def get_inserted_table() -> StagingTable:
+    return StagingTable("inserted", SQL_MERGE_INSERT, key_columns=("anthology_student_id",))
+
+
+def write(tables: list[StagingTable], rows: list[dict]) -> None:
+    with StagingWriter(DATABASE_CONNECTOR, tables) as writer:
+        writer.write(rows)
+
+
+def test_plan_writes_sends_new_and_changed_rows_only(fake_database):
+    write([get_upserted_table()], [{"anthology_student_id": 1, "name": "a"}, {"anthology_student_id": 2, "name": "b"}])
+    assert fake_database.rows_sent["upserted"] == 2
+
+    write(
+        [get_upserted_table()],
+        [
+            # unchanged
+            {"anthology_student_id": 1, "name": "a"},
+            # updated
+            {"anthology_student_id": 2, "name": "c"},
+            # inserted, the last row of a key is the one the per-row MERGEs would have left
+            {"anthology_student_id": 3, "name": "d"},
+            {"anthology_student_id": 3, "name": "e"},
+        ],
+    )
+    assert fake_database.rows_sent["upserted"] == 4
+    assert sorted(fake_database.get_rows("upserted"), key=lambda row: row["anthology_student_id"]) == [
+        {"anthology_student_id": 1, "name": "a"},
+        {"anthology_student_id": 2, "name": "c"},
+        {"anthology_student_id": 3, "name": "e"},
+    ]
+
+
+def test_plan_writes_skips_stored_keys_of_insert_only_tables(fake_database):
+    write([get_inserted_table()], [{"anthology_student_id": 1, "name": "a"}, {"anthology_student_id": 1, "name": "b"}])
+    write([get_inserted_table()], [{"anthology_student_id": 1, "name": "c"}, {"anthology_student_id": 2, "name": "d"}])
+
+    # the first row of a key is the one an insert-only MERGE keeps, a stored key isn't sent again
+    assert fake_database.rows_sent["inserted"] == 2
+    assert sorted(fake_database.get_rows("inserted"), key=lambda row: row["anthology_student_id"]) == [
+        {"anthology_student_id": 1, "name": "a"},
+        {"anthology_student_id": 2, "name": "d"},
+    ]
+
+
+def test_writer_error_reports_each_tables_outcome(fake_database):
+    fake_database.failing_tables.add("upserted")
+
+    with pytest.raises(StagingWriteError) as error:
+        write([get_inserted_table(), get_upserted_table()], [{"anthology_student_id": 1, "name": "a"}])
+
+    assert error.value.outcomes["inserted"] == 1
+    assert isinstance(error.value.outcomes["upserted"], Exception)
+    assert fake_database.get_rows("inserted") == [{"anthology_student_id": 1, "name": "a"}]
+
+
+def test_write_fails_fast_without_waiting_on_the_other_tables(fake_database):
+    fake_database.failing_tables.add("upserted")
+    fake_database.row_latency_s = 0.05
+    rows = [{"anthology_student_id": id, "name": "a"} for id in range(20)]
+
+    with pytest.raises(StagingWriteError):
+        with StagingWriter(DATABASE_CONNECTOR, [get_inserted_table(), get_upserted_table()]) as writer:
+            writer.write(rows)
+            while not isinstance(writer.get_outcomes()["upserted"], Exception):
+                time.sleep(0.01)
+
+            # "inserted" has about a second of writing left, write() mustn't wait for it
+            start = time.perf_counter()
+            try:
+                writer.write(rows)
+            finally:
+                assert time.perf_counter() - start < 0.5
+
+    # stopping the writers did let "inserted" commit what it had
+    assert len(fake_database.get_rows("inserted")) == 20
+
+
+def test_writers_reuse_pooled_connections(fake_database):
+    for name in "abc":
+        write([get_inserted_table(), get_upserted_table()], [{"anthology_student_id": 1, "name": name}])
+
+    # one connection per table for the first writer, the later ones take them from the pool
+    assert fake_database.connections_opened == 2
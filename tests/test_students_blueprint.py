@@ -0,0 +1,44 @@
+import pytest
+
+import checkpoints
+
+
+def stop_after_one_chunk(monkeypatch) -> None:
+    # each invocation runs out of time after one chunk of students
+    def deadline_reached(checkpoint) -> bool:
+        checkpoint.chunks = getattr(checkpoint, "chunks", 0) + 1
+        checkpoint.stopped = checkpoint.stopped or checkpoint.chunks > 1
+        return checkpoint.stopped
+
+    monkeypatch.setenv("CHECKPOINT_STORE", "file")
+    monkeypatch.setattr(checkpoints.Checkpoint, "deadline_reached", deadline_reached)
+
+
+@pytest.mark.parametrize(
+    "name",
+    ["GetStudentNumberEmailFirstLastNames", "GetAcademicGraduationHoldRegistrationHold", "GetAcademicStatus"],
+)
+def test_checkpointed_stages_keep_every_enrollment_period(name, call, anthology, list_of_students, monkeypatch):
+    # the first student also has a second enrollment period, the checkpoint mustn't merge the two
+    students = list_of_students[:25]
+    enrollment_period_id = students[0]["student_enrollment_period_id"]
+    second_enrollment_period = {**students[0], "student_enrollment_period_id": -enrollment_period_id}
+    students = [*students, second_enrollment_period]
+    payload = {**anthology, "students": students}
+
+    status, expected = call(name, payload)
+    assert status == 200
+
+    stop_after_one_chunk(monkeypatch)
+    continuations = 0
+    status, body = call(name, {**payload, "run_id": f"{name}-duplicates"})
+    while status == 202:
+        continuations += 1
+        status, body = call(name, {**payload, "continuation_token": body["continuation_token"]})
+
+    assert status == 200
+    assert continuations >= 2
+    assert [student["student_enrollment_period_id"] for student in body["students"]] == [
+        student["student_enrollment_period_id"] for student in students
+    ]
+    assert body["students"] == expected["students"]
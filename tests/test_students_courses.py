@@ -0,0 +1,39 @@
+import asyncio
+
+import pytest
+
+import get_students_courses
+from codec import StudentCourseRow
+
+
+class ChunkFailed(Exception):
+    pass
+
+
+def test_failed_chunk_cancels_the_other_workers(monkeypatch):
+    # the chunk of student 0 fails on its first page, the others page slowly + count the queries they send
+    queries = []
+
+    async def get_odata_pages(client, url, headers, params, **kwargs):
+        queries.append(params["$filter"])
+        if "StudentId in (0," in params["$filter"]:
+            raise ChunkFailed()
+        while True:
+            await asyncio.sleep(0.01)
+            yield [StudentCourseRow(Id=1, StudentId=1, ClassSectionId=1)]
+
+    monkeypatch.setattr(get_students_courses, "get_odata_pages", get_odata_pages)
+    student_ids = list(range(get_students_courses.STUDENT_ID_FILTER_CHUNK_SIZE * 4))
+
+    async def join() -> None:
+        with pytest.raises(ChunkFailed):
+            await get_students_courses.join_students_courses_asynchronously(
+                "key", "http://upstream.test", 1, student_ids, lambda student_course: student_course
+            )
+        # the 400 leaves nothing running: no worker sends another query
+        sent = len(queries)
+        await asyncio.sleep(0.05)
+        assert len(queries) == sent
+        assert asyncio.all_tasks() == {asyncio.current_task()}
+
+    asyncio.run(join())